@@ -0,0 +1,7 @@
+"""
+Benchmarks for the SDF CLI.
+
+Each module is runnable from the repository root, e.g.::
+
+    python -m benchmarks.bench_stream_import --help
+"""
@@ -0,0 +1,57 @@
+"""
+Fixed against adaptive upload batches with a server slowing down with batch size.
+
+The fake coact server takes ``--per-job`` seconds per job of a request, and
+the client gives up after ``--timeout`` seconds, so the fixed ``--batch``
+times out. The adaptive run starts from the same size, shrinks the batches
+on failures and latency, and retries the failed ones in halves; the jobs
+that still fail are counted as dead letters.
+
+    python -m benchmarks.bench_adaptive_batch --rows 200000 --batch 150000
+"""
+
+import os
+import tempfile
+from timeit import default_timer as timer
+
+import click
+from gql import Client
+from gql.transport.aiohttp import AIOHTTPTransport
+
+from modules.upload import AdaptiveBatchSize, Bisector, DeadLetterFile
+from tests.fake_coact import FakeCoactServer
+from tests.synthetic import sacct_lines
+from tests.test_slurm_import import make_importer
+
+
+def upload(label: str, jobs: list, batch: int, per_job: float, timeout: int, adaptive: bool, tmp: str) -> None:
+    importer = make_importer()
+    if adaptive:
+        importer.sizes = AdaptiveBatchSize(batch, target_latency=timeout / 4)
+        importer.bisector = Bisector(DeadLetterFile(os.path.join(tmp, "dead")))
+    with FakeCoactServer(latency=lambda payload: per_job * len(payload["variables"]["jobs"])) as server:
+        importer.back_channel = Client(transport=AIOHTTPTransport(url=server.url), execute_timeout=timeout)
+        s = timer()
+        importer.output(iter(jobs), "upload", batch)
+        duration = timer() - s
+        # requests answered before the client gave up
+        sizes = [len(r["variables"]["jobs"]) for r in server.requests]
+    dead = importer.bisector.dead_letters.count if importer.bisector else 0
+    click.echo(f"{label:>9}: {len(sizes):>3} requests, {importer.failed_batches} failed batches, "
+               f"{dead:,} dead letters, {duration:6.2f}s, batch sizes {sizes[:6]}{'...' if len(sizes) > 6 else ''}")
+
+
+@click.command()
+@click.option('--rows', default=200000, help='Number of synthetic jobs')
+@click.option('--batch', default=150000, help='Initial jobs per batch')
+@click.option('--per-job', default=0.00005, help='Seconds the fake server takes per job')
+@click.option('--timeout', default=5, help='Client timeout in seconds')
+def main(rows, batch, per_job, timeout):
+    jobs = list(make_importer().iter_jobs(sacct_lines(rows)))
+    with tempfile.TemporaryDirectory() as tmp:
+        upload("fixed", jobs, batch, per_job, timeout, False, tmp)
+        upload("adaptive", jobs, batch, per_job, timeout, True, tmp)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""
+Allocation id lookups per second: linear scan versus the bisect index.
+
+The linear scan reproduces the previous ``get_alloc_id`` behaviour, which
+compared a pendulum DateTime against every allocation period of the key.
+
+    python -m benchmarks.bench_alloc_lookup --allocations 24 --lookups 200000
+"""
+
+import random
+from timeit import default_timer as timer
+
+import click
+import pendulum as pdl
+from loguru import logger
+
+from modules.coact import SlurmImporter
+from tests.synthetic import DEFAULT_DAY_START, StaticBackChannel, metadata_response
+
+
+def linear_alloc_id(allocid: dict, facility: str, repo: str, cluster: str, time) -> str:
+    key = (facility, repo, cluster)
+    if key in allocid:
+        for t, _id in allocid[key].items():
+            logger.trace(f"Matching {t[0].isoformat()} <= {time.isoformat()} < {t[1].isoformat()}?")
+            if time >= t[0] and time < t[1]:
+                return _id
+    raise Exception(f"could not determine alloc_id for {facility}:{repo} at {cluster} at timestamp {time}")
+
+
+@click.command()
+@click.option('--allocations', default=24, help='Allocation periods per (facility, repo, cluster)')
+@click.option('--lookups', default=200000, help='Number of lookups to time')
+def main(allocations, lookups):
+    logger.remove()
+    importer = SlurmImporter(username="bench", password_file="bench")
+    importer.back_channel = StaticBackChannel(metadata_response(allocations_per_repo=allocations))
+    importer.get_metadata()
+
+    rng = random.Random(0)
+    keys = list(importer._allocid)
+    queries = [(*rng.choice(keys), DEFAULT_DAY_START + rng.randint(0, 86399)) for _ in range(lookups)]
+    click.echo(f"{len(keys)} keys with {allocations} allocation periods each, {lookups:,} lookups")
+
+    s = timer()
+    for f, r, c, epoch in queries:
+        linear_alloc_id(importer._allocid, f, r, c, pdl.from_timestamp(epoch, tz=pdl.now().timezone))
+    linear = timer() - s
+    click.echo(f"   linear: {lookups / linear:>12,.0f} lookups/s")
+
+    s = timer()
+    for f, r, c, epoch in queries:
+        importer.get_alloc_id(f, r, c, epoch)
+    indexed = timer() - s
+    click.echo(f"   bisect: {lookups / indexed:>12,.0f} lookups/s ({linear / indexed:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Size and replay throughput of the Arrow IPC archive against the text dump.
+
+Writes the same synthetic days as a pipe-delimited text dump and as an
+archive, then times reading the rows back and replaying them through the
+importer's conversion. Archives are read with only the columns the importer
+uses, as ``slurmimport`` does.
+
+    python -m benchmarks.bench_archive --rows 1000000 --days 3
+"""
+
+import os
+import tempfile
+from timeit import default_timer as timer
+
+import click
+
+from modules import archive
+from modules.coact import SlurmImporter, split_rows
+from tests.synthetic import DEFAULT_DAY_START, sacct_lines
+from tests.test_slurm_import import make_importer
+
+
+def measure(label: str, fx, rows: int, baseline: float = None) -> float:
+    s = timer()
+    count = fx()
+    duration = timer() - s
+    assert count == rows, (label, count, rows)
+    speedup = f" ({baseline / duration:.2f}x)" if baseline else ""
+    click.echo(f"{label:>16}: {rows / duration:>10,.0f} rows/s in {duration:6.2f}s{speedup}")
+    return duration
+
+
+def count(iterable) -> int:
+    return sum(1 for _ in iterable)
+
+
+def text_rows(paths):
+    for path in paths:
+        with open(path) as f:
+            yield from split_rows(f)
+
+
+def archive_rows(paths):
+    for path in paths:
+        yield from archive.read_rows(path, columns=SlurmImporter.FIELDS)
+
+
+@click.command()
+@click.option('--rows', default=1000000, help='Number of synthetic sacct rows per day')
+@click.option('--days', default=3, help='Number of days')
+def main(rows, days):
+    if not archive.available():
+        raise click.UsageError("pyarrow is not installed")
+    importer = make_importer()
+    total = rows * days
+    with tempfile.TemporaryDirectory() as tmp:
+        texts, archives = [], []
+        for day in range(days):
+            text = os.path.join(tmp, f"day{day}")
+            arrow = f"{text}.arrow"
+            with open(text, "w") as f, archive.ArchiveWriter(arrow) as writer:
+                for line in sacct_lines(rows, seed=day, day_start=DEFAULT_DAY_START + day * 86400):
+                    f.write(line)
+                    writer.write_line(line)
+            texts.append(text)
+            archives.append(arrow)
+
+        text_size = sum(os.path.getsize(p) for p in texts)
+        archive_size = sum(os.path.getsize(p) for p in archives)
+        click.echo(f"text: {text_size / 1e6:,.1f} MB, archive: {archive_size / 1e6:,.1f} MB ({text_size / archive_size:.1f}x smaller)")
+
+        baseline = measure("read text", lambda: count(text_rows(texts)), total)
+        measure("read archive", lambda: count(archive_rows(archives)), total, baseline)
+        baseline = measure("convert text", lambda: count(importer.convert_rows(text_rows(texts))), total)
+        measure("convert archive", lambda: count(importer.convert_rows(archive_rows(archives))), total, baseline)
+
+        from modules.columnar import ColumnarConverter, available
+        if available():
+            converter = ColumnarConverter(importer)
+            baseline = measure("numpy text", lambda: count(converter.iter_row_jobs(text_rows(texts))), total)
+            measure("numpy archive", lambda: count(converter.iter_row_jobs(archive_rows(archives))), total, baseline)
+
+
+if __name__ == '__main__':
+    main()
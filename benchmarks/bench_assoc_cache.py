@@ -0,0 +1,59 @@
+"""
+Overage evaluations reading the hold states from sacctmgr every time versus from the cache.
+
+Runs ``--cycles`` daemon evaluations for ``--facilities`` facilities on
+``--clusters`` clusters against a local fake coact server and a fake
+sacctmgr that takes ``--connect`` seconds per run for reaching slurmdbd.
+The cached run reads sacctmgr on its first evaluation only.
+
+    python -m benchmarks.bench_assoc_cache --cycles 10 --connect 0.2
+"""
+
+import os
+import tempfile
+from timeit import default_timer as timer
+
+import click
+from gql import Client
+from gql.transport.aiohttp import AIOHTTPTransport
+from loguru import logger
+
+from benchmarks.bench_overage_daemon import WINDOWS, handler
+from modules.assoc_state import AssocStateCache
+from modules.coact import FacilityUsage, evaluate_overage
+from modules.utils.graphql import PersistentSession
+from tests.fake_coact import FakeCoactServer
+from tests.fake_sacctmgr import install
+
+
+def cycles(label: str, server: FakeCoactServer, count: int, cache: AssocStateCache = None) -> None:
+    usages = FacilityUsage(username="u", password_file="/dev/null", windows=WINDOWS, threshold=100.0, dry_run=True, metadata_ttl=3600, assoc_cache=cache)
+    usages.back_channel = PersistentSession(Client(transport=AIOHTTPTransport(url=server.url), execute_timeout=300))
+    durations = []
+    for _ in range(count):
+        s = timer()
+        evaluate_overage(usages, "2026-04-15", dry_run=True)
+        durations.append(timer() - s)
+    usages.back_channel.close()
+    steady = sum(durations[1:]) / (count - 1)
+    click.echo(f"{label:>9}: first {durations[0] * 1000:7.1f} ms, then {steady * 1000:7.1f} ms per evaluation")
+
+
+@click.command()
+@click.option('--cycles', 'count', default=10, help='Evaluations per mode')
+@click.option('--facilities', default=100, help='Number of facilities')
+@click.option('--clusters', default=20, help='Number of clusters per facility')
+@click.option('--connect', default=0.2, help='Seconds sacctmgr takes to connect per run')
+def main(count, facilities, clusters, connect):
+    logger.remove()
+    with tempfile.TemporaryDirectory() as tmp:
+        install(tmp, {f"fac{f:03d}:_regular_@cluster{c:02d}": 10 for f in range(facilities) for c in range(clusters)})
+        os.environ["PATH"] = f"{tmp}{os.pathsep}{os.environ['PATH']}"
+        os.environ["FAKE_SACCTMGR_CONNECT"] = str(connect)
+        with FakeCoactServer(handler=handler(facilities, clusters)) as server:
+            cycles("sacctmgr", server, count)
+            cycles("cached", server, count, AssocStateCache())
+
+
+if __name__ == '__main__':
+    main()
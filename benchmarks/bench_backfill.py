@@ -0,0 +1,71 @@
+"""
+Wall clock of slurmbackfill over a range of days at different worker counts.
+
+Each day is dumped from the synthetic sacct stand-in (with latency) and
+uploaded to a local stand-in GraphQL server (with latency), so most of a
+day's time is spent waiting, as it is against slurmdbd and coact.
+
+    python -m benchmarks.bench_backfill --days 8 --rows 5000
+"""
+
+import os
+import tempfile
+from timeit import default_timer as timer
+
+import click
+import pendulum as pdl
+from loguru import logger
+
+from modules.coact import SlurmBackfill
+from modules.utils import graphql
+from tests.fake_coact import FakeCoactServer, jobs_import_handler
+from tests.fake_sacct import FAKE_SACCT
+from tests.synthetic import DEFAULT_DAY_START, metadata_response
+
+
+def handler(payload: dict) -> dict:
+    if "jobsImport" in payload["query"]:
+        return jobs_import_handler(payload)
+    if "jobsAggregateForDate" in payload["query"]:
+        return {"jobsAggregateForDate": {"status": True}}
+    return metadata_response()
+
+
+@click.command()
+@click.option('--days', default=8, help='Number of days to backfill')
+@click.option('--rows', default=5000, help='Number of synthetic sacct rows per day')
+@click.option('--sacct-latency', default=0.5, help='Seconds of sacct latency per thousand rows')
+@click.option('--latency', default=1.0, help='Injected server latency per request (seconds)')
+@click.option('--batch', default=2000, help='Batch upload size')
+@click.option('--concurrency', 'levels', multiple=True, type=int, default=[1, 4], help='Worker counts to compare')
+def main(days, rows, sacct_latency, latency, batch, levels):
+    logger.remove()
+    dates = [pdl.from_timestamp(DEFAULT_DAY_START).add(days=i).format('YYYY-MM-DD') for i in range(days)]
+    os.environ["FAKE_SACCT_ROWS"] = str(rows)
+    os.environ["FAKE_SACCT_LATENCY"] = str(sacct_latency)
+
+    with FakeCoactServer(latency=latency, handler=handler) as server, tempfile.TemporaryDirectory() as tmp:
+        os.environ["SDF_COACT_URI"] = graphql.SDF_COACT_URI = server.url
+        password_file = os.path.join(tmp, "password")
+        with open(password_file, "w") as f:
+            f.write("bench")
+
+        baseline = None
+        for concurrency in levels:
+            backfill = SlurmBackfill(
+                username="bench",
+                password_file=password_file,
+                manifest=os.path.join(tmp, f"manifest-{concurrency}.json"),
+                concurrency=concurrency,
+                day_options={"sacct_bin_path": FAKE_SACCT, "batch_size": batch}
+            )
+            s = timer()
+            assert backfill.run(dates)
+            duration = timer() - s
+            baseline = baseline or duration
+            jobs = sum(d["jobs"] for d in backfill.days.values())
+            click.echo(f"concurrency={concurrency}: {days} days, {jobs:,} jobs in {duration:6.2f}s ({baseline / duration:.2f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+"""
+Rows per second of the scalar and NumPy columnar conversion engines.
+
+    python -m benchmarks.bench_columnar --rows 500000
+"""
+
+from timeit import default_timer as timer
+
+import click
+from loguru import logger
+
+from modules.coact import SlurmImporter
+from modules.columnar import ColumnarConverter
+from tests.synthetic import StaticBackChannel, metadata_response, sacct_lines
+
+
+@click.command()
+@click.option('--rows', default=500000, help='Number of synthetic sacct rows')
+@click.option('--chunk-size', default=65536, help='Rows per columnar chunk')
+def main(rows, chunk_size):
+    logger.remove()
+    importer = SlurmImporter(username="bench", password_file="bench")
+    importer.back_channel = StaticBackChannel(metadata_response())
+    importer.get_metadata()
+    lines = list(sacct_lines(rows))
+
+    s = timer()
+    scalar = list(importer.iter_jobs(lines))
+    scalar_time = timer() - s
+    click.echo(f"  scalar: {rows / scalar_time:>10,.0f} rows/s")
+
+    s = timer()
+    columnar = list(ColumnarConverter(importer, chunk_size=chunk_size).iter_jobs(lines))
+    columnar_time = timer() - s
+    click.echo(f"columnar: {rows / columnar_time:>10,.0f} rows/s ({scalar_time / columnar_time:.2f}x)")
+
+    assert columnar == scalar, "engines disagree"
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""
+Request bytes and upload time of plain and gzip-compressed jobsImport batches.
+
+Uploads the same jobs to a local fake coact server, once through the
+transport's own JSON encoding and once with ``RequestEncoder``. Bytes are
+measured as received by the server. A local server has no bandwidth limit,
+so the time saved on a real link is not shown; the time spent encoding is.
+
+    python -m benchmarks.bench_compact_upload --rows 300000 --batch 150000
+"""
+
+from timeit import default_timer as timer
+
+import click
+from gql import Client
+from gql.transport.aiohttp import AIOHTTPTransport
+
+from modules.upload import RequestEncoder
+from tests.fake_coact import FakeCoactServer
+from tests.synthetic import sacct_lines
+from tests.test_slurm_import import make_importer
+
+
+def upload(label: str, jobs: list, batch: int, encoder: RequestEncoder = None, target_bytes: int = None) -> None:
+    importer = make_importer()
+    importer.encoder = encoder
+    importer.batch_bytes = target_bytes
+    with FakeCoactServer() as server:
+        importer.back_channel = Client(transport=AIOHTTPTransport(url=server.url), execute_timeout=300)
+        s = timer()
+        importer.output(iter(jobs), "upload", batch)
+        duration = timer() - s
+    total = sum(server.body_bytes)
+    click.echo(f"{label:>10}: {len(server.requests):>3} requests, {total / 1e6:8.1f} MB, {duration:6.2f}s")
+
+
+@click.command()
+@click.option('--rows', default=300000, help='Number of synthetic jobs')
+@click.option('--batch', default=150000, help='Jobs per batch')
+@click.option('--batch-bytes', default=4 << 20, help='Target request bytes for the sized run')
+def main(rows, batch, batch_bytes):
+    jobs = list(make_importer().iter_jobs(sacct_lines(rows)))
+    upload("plain", jobs, batch)
+    upload("gzip", jobs, batch, RequestEncoder())
+    upload("gzip+size", jobs, batch, RequestEncoder(), batch_bytes)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""
+Steady-state import cycles with and without the dedup store.
+
+Each cycle converts the same day of jobs and uploads them to a local fake
+coact server, as the import loop does every couple of minutes once the day's
+jobs have finished. With ``--dedup-store`` only the first cycle uploads.
+
+    python -m benchmarks.bench_dedup --rows 300000 --cycles 3
+"""
+
+import os
+import tempfile
+from timeit import default_timer as timer
+
+import click
+from gql import Client
+from gql.transport.aiohttp import AIOHTTPTransport
+
+from modules.dedup import DedupStore
+from tests.fake_coact import FakeCoactServer
+from tests.synthetic import sacct_lines
+from tests.test_slurm_import import make_importer
+
+
+def cycles(label: str, lines: list, server: FakeCoactServer, count: int, store: str = None) -> None:
+    importer = make_importer()
+    importer.concurrency = 2
+    importer.back_channel = Client(transport=AIOHTTPTransport(url=server.url), execute_timeout=300)
+    for cycle in range(count):
+        importer.dedup = DedupStore(store) if store else None
+        requests = len(server.requests)
+        s = timer()
+        uploaded = importer.output(importer.iter_jobs(lines), "upload", 50000)
+        duration = timer() - s
+        if importer.dedup:
+            importer.dedup.close()
+        click.echo(f"{label:>8} cycle {cycle}: {uploaded:>9,} jobs in {len(server.requests) - requests} requests, {duration:6.2f}s")
+
+
+@click.command()
+@click.option('--rows', default=300000, help='Number of synthetic sacct rows')
+@click.option('--cycles', 'count', default=3, help='Number of import cycles')
+@click.option('--latency', default=0.5, help='Seconds the fake server takes per request')
+def main(rows, count, latency):
+    lines = list(sacct_lines(rows))
+    with tempfile.TemporaryDirectory() as tmp, FakeCoactServer(latency=latency) as server:
+        cycles("plain", lines, server, count)
+        cycles("dedup", lines, server, count, store=os.path.join(tmp, "dedup.sqlite"))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Per-evaluation latency of ``coact overage`` run from a shell loop versus ``--daemon``.
+
+The shell loop pays for a Python start-up, a new GraphQL client and the
+facility and allocation metadata on every evaluation; the daemon keeps one
+session open and reuses the metadata within its TTL. The start-up is timed
+by importing the CLI in a fresh interpreter, the evaluations against a local
+fake coact server answering for ``--facilities`` facilities on
+``--clusters`` clusters. sacctmgr is replaced by a script that prints
+nothing, so the hold-state lookup only costs a process spawn.
+
+    python -m benchmarks.bench_overage_daemon --cycles 10 --latency 0.05
+"""
+
+import os
+import re
+import subprocess
+import sys
+import tempfile
+from timeit import default_timer as timer
+
+import click
+from gql import Client
+from gql.transport.aiohttp import AIOHTTPTransport
+from loguru import logger
+
+from modules.coact import FacilityUsage, evaluate_overage
+from modules.utils.graphql import PersistentSession
+from tests.fake_coact import FakeCoactServer
+
+WINDOWS = [5, 15, 60, 180, 1440]
+
+
+def handler(facilities: int, clusters: int):
+    names = [f"fac{f:03d}" for f in range(facilities)]
+    clusternames = [f"cluster{c:02d}" for c in range(clusters)]
+
+    def respond(payload: dict) -> dict:
+        query = payload["query"]
+        result = {}
+        for alias in re.findall(r"(_\d+): facilityRecentComputeUsage", query):
+            result[alias] = [{"facility": f, "cluster": c, "percentUsed": (i * 7) % 120} for i, (f, c) in enumerate((f, c) for f in names for c in clusternames)]
+        if "facilities(" in query:
+            result["facilities"] = [{"name": f, "computepurchases": [{"clustername": c, "purchased": 10} for c in clusternames]} for f in names]
+            result["repos"] = [{"facility": f, "allocs": [{"cluster": c, "start": "2026-01-01", "end": "2027-01-01"} for c in clusternames]} for f in names]
+        return result
+    return respond
+
+
+def cycles(label: str, server: FakeCoactServer, count: int, daemon: bool) -> float:
+    usages = FacilityUsage(username="u", password_file="/dev/null", windows=WINDOWS, threshold=100.0, dry_run=True, metadata_ttl=3600 if daemon else 0)
+    if daemon:
+        usages.back_channel = PersistentSession(Client(transport=AIOHTTPTransport(url=server.url), execute_timeout=300))
+    durations = []
+    for _ in range(count):
+        if not daemon:
+            usages = FacilityUsage(username="u", password_file="/dev/null", windows=WINDOWS, threshold=100.0, dry_run=True)
+            usages.back_channel = Client(transport=AIOHTTPTransport(url=server.url), execute_timeout=300)
+        s = timer()
+        evaluate_overage(usages, "2026-04-15", dry_run=True)
+        durations.append(timer() - s)
+    if daemon:
+        usages.back_channel.close()
+    # the first daemon evaluation fetches the metadata like every shell loop run does
+    steady = sum(durations[1:]) / (count - 1)
+    click.echo(f"{label:>10}: first {durations[0] * 1000:7.1f} ms, then {steady * 1000:7.1f} ms per evaluation")
+    return steady
+
+
+@click.command()
+@click.option('--cycles', 'count', default=10, help='Evaluations per mode')
+@click.option('--facilities', default=100, help='Number of facilities')
+@click.option('--clusters', default=20, help='Number of clusters per facility')
+@click.option('--latency', default=0.05, help='Seconds the fake server takes per query')
+def main(count, facilities, clusters, latency):
+    logger.remove()
+    s = timer()
+    subprocess.run([sys.executable, "-c", "import modules.coact"], check=True)
+    startup = timer() - s
+    click.echo(f"{'start-up':>10}: {startup * 1000:7.1f} ms")
+    with tempfile.TemporaryDirectory() as tmp:
+        sacctmgr = os.path.join(tmp, "sacctmgr")
+        with open(sacctmgr, "w") as f:
+            f.write("#!/bin/sh\nexit 0\n")
+        os.chmod(sacctmgr, 0o755)
+        os.environ["PATH"] = f"{tmp}{os.pathsep}{os.environ['PATH']}"
+        with FakeCoactServer(latency=latency, handler=handler(facilities, clusters)) as server:
+            loop = cycles("shell loop", server, count, daemon=False) + startup
+            daemon = cycles("daemon", server, count, daemon=True)
+    click.echo(f"shell loop incl. start-up {loop * 1000:.1f} ms vs daemon {daemon * 1000:.1f} ms per evaluation ({loop / daemon:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
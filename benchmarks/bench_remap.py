@@ -0,0 +1,45 @@
+"""
+Rows per second of the legacy if/elif remap functions and the rule table.
+
+    python -m benchmarks.bench_remap --rows 500000
+"""
+
+from timeit import default_timer as timer
+
+import click
+from loguru import logger
+
+from modules.remap import RemapRules
+from tests.test_remap import legacy_remap_job, legacy_remap_job_pre2024, recorded_jobs
+
+
+def measure(label: str, fx, jobs: list, baseline: float = None) -> float:
+    copies = [dict(d) for d in jobs]
+    s = timer()
+    for d in copies:
+        try:
+            fx(d)
+        except Exception:
+            pass
+    duration = timer() - s
+    speedup = f" ({baseline / duration:.2f}x)" if baseline else ""
+    click.echo(f"{label:>16}: {len(jobs) / duration:>12,.0f} rows/s{speedup}")
+    return duration
+
+
+@click.command()
+@click.option('--rows', default=500000, help='Number of synthetic jobs')
+def main(rows):
+    logger.remove()
+    rules = RemapRules.load()
+    jobs = recorded_jobs(rows)
+    baseline = measure("legacy current", legacy_remap_job, jobs)
+    measure("rules current", rules.era("current").remap, jobs, baseline)
+    baseline = measure("legacy pre2024", legacy_remap_job_pre2024, jobs)
+    measure("rules pre2024", rules.era("pre2024").remap, jobs, baseline)
+    measure("rules default", rules.remap, jobs)
+    measure("rules by start", RemapRules.load(by_start=True).remap, jobs)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+Throughput of slurmremap over a large day file, before and after remapping split rows in place.
+
+The "before" loop reproduces the previous ``SlurmRemapper.run``: a dict per
+row, the rules applied to the dict, the output rebuilt from the header
+order and written with one ``click.echo`` per line. Output goes to
+/dev/null.
+
+    python -m benchmarks.bench_remap_stream --rows 2000000
+"""
+
+import os
+import tempfile
+from contextlib import redirect_stdout
+from timeit import default_timer as timer
+
+import click
+
+from modules.coact import SlurmRemapper
+from tests.synthetic import write_sacct_file
+
+
+def legacy_run(remapper: SlurmRemapper, data) -> None:
+    first = True
+    index = {}
+    order = []
+    for line in data:
+        if line:
+            parts = line.split("|")
+            if first:
+                index = {s: idx for idx, s in enumerate(parts)}
+                order = parts
+                first = False
+                click.echo(f"{line.strip()}")
+            else:
+                d = remapper.remap_job({field: parts[idx] for field, idx in index.items()})
+                if d:
+                    click.echo("|".join(d[i] for i in order).strip())
+
+
+def measure(label: str, fx, path: str, rows: int, baseline: float = None) -> float:
+    with open(path) as data, open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        s = timer()
+        fx(data)
+        duration = timer() - s
+    speedup = f" ({baseline / duration:.2f}x)" if baseline else ""
+    click.echo(f"{label:>6}: {rows / duration:>10,.0f} rows/s in {duration:6.2f}s{speedup}")
+    return duration
+
+
+@click.command()
+@click.option('--rows', default=2000000, help='Number of synthetic sacct rows')
+def main(rows):
+    remapper = SlurmRemapper()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = write_sacct_file(os.path.join(tmp, "day"), rows)
+        baseline = measure("before", lambda data: legacy_run(remapper, data), path, rows)
+        measure("after", remapper.run, path, rows, baseline)
+
+
+if __name__ == '__main__':
+    main()
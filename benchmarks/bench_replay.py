@@ -0,0 +1,62 @@
+"""
+Throughput of replaying a sacct dump: the text reader against the mmap reader.
+
+"read" only produces the rows; "convert" also converts them to jobs, with
+the mmap reader in one process and in ``--workers`` processes. Worker
+processes only help with as many cores.
+
+    python -m benchmarks.bench_replay --rows 2000000 --workers 4
+"""
+
+import os
+import tempfile
+from timeit import default_timer as timer
+
+import click
+
+from modules.coact import SlurmImporter, split_rows
+from modules.replay import ReplayReader, replay_jobs
+from tests.synthetic import write_sacct_file
+from tests.test_slurm_import import make_importer
+
+
+def measure(label: str, fx, baseline: float = None) -> float:
+    s = timer()
+    count = fx()
+    duration = timer() - s
+    speedup = f" ({baseline / duration:.2f}x)" if baseline else ""
+    click.echo(f"{label:>20}: {count / duration:>10,.0f} rows/s in {duration:6.2f}s{speedup}")
+    return duration
+
+
+def count(iterable) -> int:
+    return sum(1 for _ in iterable)
+
+
+def text_rows(path):
+    with open(path) as f:
+        yield from split_rows(f.readlines())
+
+
+def mmap_rows(path):
+    with ReplayReader(path, fields=SlurmImporter.FIELDS) as reader:
+        yield from reader.rows()
+
+
+@click.command()
+@click.option('--rows', default=2000000, help='Number of synthetic sacct rows')
+@click.option('--workers', default=os.cpu_count(), help='Number of conversion processes')
+def main(rows, workers):
+    importer = make_importer()
+    click.echo(f"{rows:,} rows, {os.cpu_count()} cpus")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = write_sacct_file(os.path.join(tmp, "day"), rows)
+        baseline = measure("read text", lambda: count(text_rows(path)))
+        measure("read mmap", lambda: count(mmap_rows(path)), baseline)
+        baseline = measure("convert text", lambda: count(importer.convert_rows(text_rows(path))))
+        measure("convert mmap", lambda: count(replay_jobs(importer, path)), baseline)
+        measure(f"convert mmap x{workers}", lambda: count(replay_jobs(importer, path, workers)), baseline)
+
+
+if __name__ == '__main__':
+    main()
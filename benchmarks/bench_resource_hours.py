@@ -0,0 +1,103 @@
+"""
+Per-job allocations of calc_resource_hours before and after precomputing capacity records.
+
+The "before" function reproduces the previous implementation, which copied
+the cluster dict and formatted its log messages for every job. Allocations
+are measured with tracemalloc as the peak traced memory of a single call,
+averaged over the synthetic jobs.
+
+    python -m benchmarks.bench_resource_hours --rows 20000
+"""
+
+import tracemalloc
+from timeit import default_timer as timer
+
+import click
+from loguru import logger
+
+from modules.coact import SlurmImporter, kilos_to_int, parse_alloc_tres
+from tests.synthetic import StaticBackChannel, metadata_response, sacct_lines
+
+
+def legacy_calc_resource_hours(importer, startTs, endTs, tres, cluster, alloc_nodes, ncpus, nodelist):
+    elapsed_secs = float(endTs - startTs)
+    if elapsed_secs <= 0:
+        elapsed_secs = 1.0
+    used = {}
+    if alloc_nodes > 0:
+        for k, v in zip(("cpu", "gpu", "mem"), parse_alloc_tres(tres)):
+            if v is not None:
+                used[k] = v * 1.0 / alloc_nodes
+    adjusted_cluster = cluster.copy()
+    high_mem_node = importer.high_memory_node(nodelist)
+    if high_mem_node:
+        mem_gb = importer.HIGH_MEMORY_NODES[high_mem_node]
+        adjusted_cluster["mem"] = mem_gb * 1073741824
+        logger.info(f"    Adjusted memory for high-mem node {high_mem_node}: {mem_gb}GB")
+    ratios = {}
+    max_ratio = 0
+    for resource in ("cpu", "gpu", "mem"):
+        if resource in used:
+            ratios[resource] = used[resource] / adjusted_cluster[resource]
+            if ratios[resource] > max_ratio:
+                max_ratio = ratios[resource]
+            logger.debug(f"    {resource}: used {used[resource]} / {adjusted_cluster[resource]} -> {ratios[resource]:.5}")
+    compute_time = elapsed_secs * ncpus / 3600.0
+    resource_time = elapsed_secs * alloc_nodes * max_ratio * adjusted_cluster["cpu"] / 3600.0
+    if importer.verbose:
+        click.echo(f"  calc time: {elapsed_secs}s compute_hours: {resource_time:.5} core_hours: {compute_time:.5}")
+    return resource_time, elapsed_secs
+
+
+def measure(label: str, calls: list) -> list:
+    # warm the parser caches so that only per-job work is measured
+    results = [fx() for fx in calls]
+    s = timer()
+    for fx in calls:
+        fx()
+    duration = timer() - s
+
+    tracemalloc.start()
+    total = 0
+    for fx in calls:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        fx()
+        total += tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    click.echo(f"{label:>7}: {total / len(calls):8.1f} bytes allocated per job, {len(calls) / duration:>10,.0f} jobs/s")
+    return results
+
+
+@click.command()
+@click.option('--rows', default=20000, help='Number of synthetic jobs')
+def main(rows):
+    # a handler at INFO level, as slurmimport runs by default
+    logger.remove()
+    logger.add(lambda m: None, level="INFO")
+
+    importer = SlurmImporter(username="bench", password_file="bench")
+    importer.back_channel = StaticBackChannel(metadata_response())
+    importer.get_metadata()
+
+    lines = list(sacct_lines(rows))
+    index = {f: i for i, f in enumerate(lines[0].split("|"))}
+    jobs = []
+    for line in lines[1:]:
+        d = {f: v for f, v in zip(index, line.split("|"))}
+        jobs.append((int(d["Start"]), int(d["End"]), d["AllocTRES"], d["Partition"],
+                     kilos_to_int(d["AllocNodes"]), int(d["NCPUS"]), d["NodeList"]))
+
+    before = measure("before", [
+        (lambda j=j: legacy_calc_resource_hours(importer, j[0], j[1], j[2], importer._clusters[j[3]], j[4], j[5], j[6]))
+        for j in jobs
+    ])
+    after = measure("after", [
+        (lambda j=j: importer.calc_resource_hours(j[0], j[1], j[2], importer._capacity[(j[3], None)], j[4], j[5], j[6]))
+        for j in jobs
+    ])
+    assert before == after, "implementations disagree"
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Overage usage windows rescanned from the jobs every evaluation versus kept in local prefix sums.
+
+Generates ``--jobs-per-day`` jobs a day over the longest window for the
+synthetic facilities and clusters, then runs ``--cycles`` evaluations
+``--interval`` seconds apart. The rescan sums the overlap of every job with
+every window, as the server does for ``facilityRecentComputeUsage``; the
+local windows add the jobs that finished since the previous evaluation to a
+``UsageWindows`` and read each window from its cumulative sums. sacct and the
+job conversion are left out of both.
+
+    python -m benchmarks.bench_rolling_usage --jobs-per-day 20000 --cycles 10
+"""
+
+import random
+from timeit import default_timer as timer
+
+import click
+from loguru import logger
+
+from modules.usage_windows import MINUTE, UsageWindows
+from tests.synthetic import CLUSTERS, DEFAULT_DAY_START, FACILITIES
+
+WINDOWS = [15, 60, 10080, 43800]
+
+
+def jobs(count: int, start: int, end: int, seed: int = 0) -> list:
+    """``count`` jobs as (end, start, facility, cluster, hours), sorted by end."""
+    rng = random.Random(seed)
+    out = []
+    for _ in range(count):
+        finished = rng.randint(start, end)
+        elapsed = rng.randint(1, 6 * 3600)
+        cpus = rng.choice((1, 4, 16, 120))
+        out.append((finished, finished - elapsed, rng.choice(list(FACILITIES)), rng.choice(CLUSTERS)[0], cpus * elapsed / 3600))
+    out.sort()
+    return out
+
+
+def rescan(finished: list, now: int, windows: list) -> dict:
+    result = {}
+    hi = (now // MINUTE + 1) * MINUTE
+    for minutes in windows:
+        lo = hi - minutes * MINUTE
+        sums = {}
+        for end, start, f, c, hours in finished:
+            overlap = min(end, hi) - max(start, lo)
+            if overlap > 0:
+                sums[(f, c)] = sums.get((f, c), 0.0) + hours * overlap / max(end - start, 1)
+        result[minutes] = sums
+    return result
+
+
+def local(usage: UsageWindows, new: list, now: int, windows: list) -> dict:
+    usage.advance(now)
+    for end, start, f, c, hours in new:
+        usage.add(f, c, start, end, hours)
+    return {minutes: {key: usage.window(*key, minutes) for key in usage.keys()} for minutes in windows}
+
+
+@click.command()
+@click.option('--jobs-per-day', default=20000, help='Jobs finishing per day')
+@click.option('--cycles', default=10, help='Evaluations per mode')
+@click.option('--interval', default=300, help='Seconds between evaluations')
+@click.option('--windows', type=int, multiple=True, default=WINDOWS, help='Usage windows in minutes')
+def main(jobs_per_day, cycles, interval, windows):
+    logger.remove()
+    longest = max(windows)
+    now = DEFAULT_DAY_START + longest * MINUTE
+    end = now + cycles * interval
+    all_jobs = jobs(jobs_per_day * (end - DEFAULT_DAY_START) // 86400, DEFAULT_DAY_START, end)
+    click.echo(f"{len(all_jobs):,} jobs over {longest:,} minutes, windows {', '.join(map(str, windows))}")
+
+    usage = UsageWindows(minutes=longest)
+    usage.advance(now)
+    s = timer()
+    local(usage, [j for j in all_jobs if j[0] <= now], now, windows)
+    click.echo(f"   local fill: {(timer() - s) * 1000:9.1f} ms")
+
+    rescans, locals_ = [], []
+    polled = now
+    for cycle in range(1, cycles + 1):
+        t = now + cycle * interval
+        finished = [j for j in all_jobs if j[0] <= t]
+        s = timer()
+        expected = rescan(finished, t, windows)
+        rescans.append(timer() - s)
+        s = timer()
+        got = local(usage, [j for j in finished if j[0] > polled], t, windows)
+        locals_.append(timer() - s)
+        polled = t
+        for minutes in windows:
+            for key, value in expected[minutes].items():
+                assert abs(got[minutes][key] - value) <= 1e-6 * max(value, 1), (minutes, key, got[minutes][key], value)
+    click.echo(f"       rescan: {sum(rescans) / cycles * 1000:9.1f} ms per evaluation")
+    click.echo(f"local windows: {sum(locals_) / cycles * 1000:9.1f} ms per evaluation")
+
+
+if __name__ == '__main__':
+    main()
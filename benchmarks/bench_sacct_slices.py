@@ -0,0 +1,44 @@
+"""
+Wall clock of run_sacct with the day split into concurrent time slices.
+
+Uses the synthetic sacct stand-in with ``FAKE_SACCT_LATENCY`` so that, as
+with slurmdbd, the time of a query grows with the number of jobs it returns.
+
+    python -m benchmarks.bench_sacct_slices --rows 5000 --latency 2.0
+"""
+
+import os
+from timeit import default_timer as timer
+
+import click
+from loguru import logger
+
+from modules.coact import run_sacct
+from tests.fake_sacct import FAKE_SACCT
+
+
+@click.command()
+@click.option('--rows', default=5000, help='Number of synthetic sacct rows per day')
+@click.option('--latency', default=2.0, help='Seconds of sacct latency per thousand rows')
+@click.option('--date', default='2024-01-01', help='Date to dump')
+@click.option('--workers', default=8, help='Concurrent sacct queries')
+@click.option('--slices', 'levels', multiple=True, type=int, default=[1, 2, 4, 8], help='Slice counts to compare')
+def main(rows, latency, date, workers, levels):
+    logger.remove()
+    os.environ["FAKE_SACCT_ROWS"] = str(rows)
+    os.environ["FAKE_SACCT_LATENCY"] = str(latency)
+
+    baseline = None
+    expected = None
+    for slices in levels:
+        s = timer()
+        lines = list(run_sacct(sacct_bin_path=FAKE_SACCT, date=date, slices=slices, workers=workers))
+        duration = timer() - s
+        baseline = baseline or duration
+        expected = expected or sorted(lines)
+        assert sorted(lines) == expected, f"{slices} slices returned different jobs"
+        click.echo(f"slices={slices}: {len(lines) - 1:,} jobs in {duration:6.2f}s ({baseline / duration:.2f}x)")
+
+
+if __name__ == '__main__':
+    main()
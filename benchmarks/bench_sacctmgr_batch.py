@@ -0,0 +1,57 @@
+"""
+Applying job blocking changes one sacctmgr at a time versus in one sacctmgr script.
+
+Models a mass change, such as the start of an allocation period, where
+``--changes`` allocations flip at once. sacctmgr is a local stand-in that
+sleeps ``--connect`` seconds per run for connecting to slurmdbd and
+``--latency`` seconds per command for its round trip.
+
+    python -m benchmarks.bench_sacctmgr_batch --changes 40 --connect 0.1 --latency 0.05
+"""
+
+import os
+import tempfile
+from timeit import default_timer as timer
+
+import click
+from loguru import logger
+
+from modules.coact import JobBlockingBatch, OveragePoint, toggle_job_blocking
+from tests.fake_sacctmgr import install
+
+
+def points(count: int) -> list:
+    return [OveragePoint(facility=f"fac{i:03d}", cluster="ada", qos="regular", window_mins=60, percentages=[], percent_used=120,
+                         held=False, over=True, change=True, purchased_nodes=10) for i in range(count)]
+
+
+@click.command()
+@click.option('--changes', default=40, help='Number of allocations changing their blocking state')
+@click.option('--connect', default=0.1, help='Seconds sacctmgr takes to connect per run')
+@click.option('--latency', default=0.05, help='Seconds sacctmgr takes per command')
+def main(changes, connect, latency):
+    logger.remove()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["PATH"] = f"{tmp}{os.pathsep}{os.environ['PATH']}"
+        os.environ["FAKE_SACCTMGR_CONNECT"] = str(connect)
+        os.environ["FAKE_SACCTMGR_LATENCY"] = str(latency)
+
+        install(tmp, {f"fac{i:03d}:_regular_@ada": 10 for i in range(changes)})
+        s = timer()
+        for point in points(changes):
+            toggle_job_blocking(point, execute=True)
+        single = timer() - s
+        click.echo(f"{'single':>8}: {changes} sacctmgr runs in {single:6.2f}s")
+
+        install(tmp, {f"fac{i:03d}:_regular_@ada": 10 for i in range(changes)})
+        batch = JobBlockingBatch(execute=True)
+        for point in points(changes):
+            batch.add(point)
+        s = timer()
+        failed = batch.apply()
+        batched = timer() - s
+        click.echo(f"{'batched':>8}: 1 sacctmgr run in {batched:6.2f}s, {len(failed)} failed ({single / batched:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
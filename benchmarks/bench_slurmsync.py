@@ -0,0 +1,73 @@
+"""
+Wall clock of the import-jobs.sh shell pipeline versus the single-process slurmsync command.
+
+Both variants run as real ``sdf_click.py`` processes against the synthetic
+sacct stand-in and a local stand-in GraphQL server, writing the raw and
+remapped archives as import-jobs.sh does.
+
+    python -m benchmarks.bench_slurmsync --rows 200000
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+from timeit import default_timer as timer
+
+import click
+
+from tests.fake_coact import FakeCoactServer, jobs_import_handler
+from tests.fake_sacct import FAKE_SACCT
+from tests.synthetic import metadata_response
+
+CLI = f"{sys.executable} {os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'sdf_click.py')}"
+
+
+def handler(payload: dict) -> dict:
+    if "jobsImport" in payload["query"]:
+        return jobs_import_handler(payload)
+    return metadata_response()
+
+
+def run(label: str, command: str, env: dict, baseline: float = None) -> float:
+    s = timer()
+    subprocess.run(command, shell=True, check=True, env=env, stdout=subprocess.DEVNULL)
+    duration = timer() - s
+    speedup = f" ({baseline / duration:.2f}x)" if baseline else ""
+    click.echo(f"{label:>8}: {duration:6.2f}s{speedup}")
+    return duration
+
+
+@click.command()
+@click.option('--rows', default=200000, help='Number of synthetic sacct rows per day')
+@click.option('--date', default='2024-01-01', help='Date to import')
+@click.option('--batch', default=50000, help='Batch upload size')
+def main(rows, date, batch):
+    with FakeCoactServer(handler=handler) as server, tempfile.TemporaryDirectory() as tmp:
+        password_file = os.path.join(tmp, "password")
+        with open(password_file, "w") as f:
+            f.write("bench")
+        env = dict(os.environ, SDF_COACT_URI=server.url, FAKE_SACCT_ROWS=str(rows))
+        auth = f"--username bench --password-file {password_file}"
+
+        pipeline = (
+            f"{CLI} coact slurmdump --date {date} --sacct '{FAKE_SACCT}'"
+            f" | tee {tmp}/raw-pipe"
+            f" | {CLI} coact slurmremap"
+            f" | tee {tmp}/remapped-pipe"
+            f" | {CLI} coact slurmimport {auth} --batch {batch} --output upload"
+        )
+        sync = (
+            f"{CLI} coact slurmsync --date {date} --sacct '{FAKE_SACCT}' {auth} --batch {batch} --output upload"
+            f" --raw-archive {tmp}/raw-sync --remapped-archive {tmp}/remapped-sync"
+        )
+        baseline = run("pipeline", pipeline, env)
+        run("slurmsync", sync, env, baseline)
+
+        for name in ("raw", "remapped"):
+            with open(f"{tmp}/{name}-pipe") as a, open(f"{tmp}/{name}-sync") as b:
+                assert a.read() == b.read(), f"{name} archives differ"
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Import time with and without the durable spool, and resuming a failed run.
+
+Uploads the same jobs to a local fake coact server directly and through a
+spool. The third run fails every upload after the first chunk, as when
+coact goes away mid-import, and the fourth drains what the third left in the
+spool without converting anything again.
+
+    python -m benchmarks.bench_spool --rows 300000 --batch 50000
+"""
+
+import os
+import tempfile
+from timeit import default_timer as timer
+
+import click
+from gql import Client
+from gql.transport.aiohttp import AIOHTTPTransport
+
+from modules.spool import Spool
+from tests.fake_coact import FakeCoactServer, jobs_import_handler
+from tests.synthetic import sacct_lines
+from tests.test_slurm_import import make_importer
+
+
+def run(label: str, lines: list, batch: int, latency: float, spool: Spool = None, handler=jobs_import_handler) -> None:
+    uploaded = []
+
+    def counting(payload):
+        result = handler(payload)
+        uploaded.extend(payload["variables"]["jobs"])
+        return result
+
+    importer = make_importer()
+    importer.spool = spool
+    with FakeCoactServer(latency=latency, handler=counting) as server:
+        importer.back_channel = Client(transport=AIOHTTPTransport(url=server.url), execute_timeout=300)
+        s = timer()
+        converted = importer.output(importer.iter_jobs(lines), "upload", batch)
+        duration = timer() - s
+    queued = f", {spool.depth()[0]:,} left in the spool" if spool else ""
+    click.echo(f"{label:>8}: {converted:>9,} converted, {len(uploaded):>9,} uploaded in {len(server.requests)} requests, {duration:6.2f}s{queued}")
+
+
+@click.command()
+@click.option('--rows', default=300000, help='Number of synthetic sacct rows')
+@click.option('--batch', default=50000, help='Jobs per batch')
+@click.option('--latency', default=0.5, help='Seconds the fake server takes per request')
+def main(rows, batch, latency):
+    lines = list(sacct_lines(rows))
+    requests = []
+
+    def failing(payload):
+        requests.append(payload)
+        if len(requests) > 1:
+            raise RuntimeError("coact went away")
+        return jobs_import_handler(payload)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        run("direct", lines, batch, latency)
+        run("spooled", lines, batch, latency, spool=Spool(os.path.join(tmp, "spooled")))
+        resumed = Spool(os.path.join(tmp, "resumed"))
+        run("failed", lines, batch, latency, spool=resumed, handler=failing)
+        run("resumed", [], batch, latency, spool=resumed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Memory and throughput of slurmimport against a large synthetic sacct dump.
+
+Compares the streaming importer with the previous behaviour of reading the
+whole file with ``readlines()`` first. Each mode runs in its own child
+process so that peak RSS is measured independently.
+
+    python -m benchmarks.bench_stream_import --rows 5000000
+"""
+
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+from timeit import default_timer as timer
+
+import click
+from loguru import logger
+
+from modules.coact import SlurmImporter
+from tests.synthetic import StaticBackChannel, metadata_response, write_sacct_file
+
+
+class CountingImporter(SlurmImporter):
+    """Importer that discards batches instead of uploading them."""
+
+    jobs = 0
+    batches = 0
+
+    def connect_graph_ql(self, *args, **kwargs):
+        return StaticBackChannel(metadata_response())
+
+    def generate_output(self, jobs: list, destination: str):
+        self.jobs += len(jobs)
+        self.batches += 1
+
+
+def run_mode(path: str, mode: str, batch: int) -> None:
+    logger.remove()
+    importer = CountingImporter(username="bench", password_file="bench")
+    s = timer()
+    with open(path) as data:
+        source = data.readlines() if mode == "readlines" else data
+        importer.run(source, "json", batch)
+    duration = timer() - s
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    click.echo(f"{mode:>10}: {importer.jobs:>10,} jobs in {importer.batches:>4} batches, "
+               f"{duration:8.2f}s, {importer.jobs / duration:>10,.0f} jobs/s, peak RSS {peak_mb:,.0f} MB")
+
+
+@click.command()
+@click.option('--rows', default=5_000_000, help='Number of synthetic sacct rows')
+@click.option('--batch', default=150000, help='Batch upload size')
+@click.option('--data', type=click.Path(exists=True), default=None, help='Use an existing sacct dump instead of generating one')
+@click.option('--mode', type=click.Choice(['streaming', 'readlines']), default=None, help='Run a single mode in this process')
+def main(rows, batch, data, mode):
+    if mode:
+        return run_mode(data, mode, batch)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if data is None:
+            data = os.path.join(tmp, "sacct.txt")
+            s = timer()
+            write_sacct_file(data, rows)
+            click.echo(f"generated {rows:,} rows ({os.path.getsize(data) / 1e6:,.0f} MB) in {timer() - s:.1f}s")
+        for m in ("streaming", "readlines"):
+            subprocess.run([sys.executable, "-m", "benchmarks.bench_stream_import",
+                            "--data", data, "--batch", str(batch), "--mode", m], check=True)
+
+
+if __name__ == '__main__':
+    main()
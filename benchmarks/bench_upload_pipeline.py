@@ -0,0 +1,55 @@
+"""
+Synchronous versus pipelined jobsImport uploads against a slow server.
+
+Runs the full slurmimport path (parse, convert, upload) over synthetic sacct
+rows against a local stand-in GraphQL server with injected latency.
+
+    python -m benchmarks.bench_upload_pipeline --rows 50000 --batch 5000 --latency 1.0
+"""
+
+from timeit import default_timer as timer
+
+import click
+from gql import Client
+from gql.transport.aiohttp import AIOHTTPTransport
+from loguru import logger
+
+from modules.coact import SlurmImporter
+from tests.fake_coact import FakeCoactServer, jobs_import_handler
+from tests.synthetic import metadata_response, sacct_lines
+
+
+def handler(payload: dict) -> dict:
+    if "jobsImport" in payload["query"]:
+        return jobs_import_handler(payload)
+    return metadata_response()
+
+
+@click.command()
+@click.option('--rows', default=50000, help='Number of synthetic sacct rows')
+@click.option('--batch', default=5000, help='Batch upload size')
+@click.option('--latency', default=1.0, help='Injected server latency per request (seconds)')
+@click.option('--concurrency', 'levels', multiple=True, type=int, default=[1, 2, 4], help='Concurrency levels to compare')
+def main(rows, batch, latency, levels):
+    logger.remove()
+    lines = list(sacct_lines(rows))
+    with FakeCoactServer(latency=latency, handler=handler) as server:
+
+        class Importer(SlurmImporter):
+            def connect_graph_ql(self, *args, **kwargs):
+                return Client(transport=AIOHTTPTransport(url=server.url), execute_timeout=300)
+
+        baseline = None
+        for concurrency in levels:
+            importer = Importer(username="bench", password_file="bench", concurrency=concurrency)
+            before = len(server.requests)
+            s = timer()
+            importer.run(iter(lines), "upload", batch)
+            duration = timer() - s
+            baseline = baseline or duration
+            click.echo(f"concurrency={concurrency}: {len(server.requests) - before - 1:>3} batches in {duration:6.2f}s "
+                       f"({rows / duration:,.0f} rows/s, {baseline / duration:.2f}x)")
+
+
+if __name__ == '__main__':
+    main()
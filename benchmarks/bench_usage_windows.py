@@ -0,0 +1,109 @@
+"""
+Cumulative multi-window usage of ``--facilities`` facilities on ``--clusters`` clusters over a year.
+
+Replays a year of ``--jobs-per-day`` jobs into a ``UsageWindows`` keeping
+``--minutes`` minutes and ``--hours`` hours, then times every window of
+every allocation, the percentages and projections of an evaluation with five
+more minutes of jobs, and saving and loading the sums. For comparison the
+windows are also summed from a year of minute buckets of one allocation.
+
+    python -m benchmarks.bench_usage_windows --facilities 100 --clusters 20
+"""
+
+import os
+import random
+import tempfile
+from array import array
+from timeit import default_timer as timer
+
+import click
+from loguru import logger
+
+from modules.usage_windows import MINUTE, UsageWindows
+
+YEAR = 365 * 1440
+
+WINDOWS = [15, 60, 1440, 10080, 43800, YEAR]
+
+# 2025-01-01T00:00:00Z
+START = 1735689600
+
+
+def jobs(rng: random.Random, keys: list, count: int, start: int, end: int) -> list:
+    """``count`` jobs as (facility, cluster, start, end, hours) finishing within ``[start, end)``."""
+    out = []
+    for _ in range(count):
+        finished = rng.randrange(start, end)
+        elapsed = rng.randint(1, 6 * 3600)
+        out.append((*rng.choice(keys), finished - elapsed, finished, rng.choice((1, 4, 16, 120)) * elapsed / 3600))
+    return out
+
+
+def evaluate(usage: UsageWindows, keys: list) -> int:
+    values = 0
+    for f, c in keys:
+        for minutes in WINDOWS:
+            usage.percent(f, c, minutes, 1200)
+            values += 1
+        usage.exhaustion(f, c, 10080, 1200)
+    return values
+
+
+@click.command()
+@click.option('--facilities', default=100, help='Number of facilities')
+@click.option('--clusters', default=20, help='Number of clusters per facility')
+@click.option('--jobs-per-day', default=5000, help='Jobs finishing per day')
+@click.option('--minutes', default=43800, help='Minutes kept at minute resolution')
+@click.option('--hours', default=8785, help='Hours kept at hour resolution')
+def main(facilities, clusters, jobs_per_day, minutes, hours):
+    logger.remove()
+    rng = random.Random(0)
+    keys = [(f"fac{f:03d}", f"cluster{c:02d}") for f in range(facilities) for c in range(clusters)]
+    usage = UsageWindows(minutes=minutes, hours=hours)
+    usage.advance(START)
+
+    s = timer()
+    for day in range(365):
+        usage.advance(START + (day + 1) * 86400 - 1)
+        for job in jobs(rng, keys, jobs_per_day, START + day * 86400, START + (day + 1) * 86400):
+            usage.add(*job)
+    added = timer() - s
+    s = timer()
+    usage.fold()
+    folded = timer() - s
+    size = sum(len(v) * v.itemsize for v in usage._minute.values()) + sum(len(v) * v.itemsize for v in usage._hour.values())
+    click.echo(f"{len(keys):,} allocations, {365 * jobs_per_day:,} jobs, {size / 2**20:,.0f} MiB of sums")
+    click.echo(f"        add a year: {added:9.2f} s, fold: {folded:.2f} s")
+
+    s = timer()
+    values = evaluate(usage, keys)
+    elapsed = timer() - s
+    click.echo(f"           windows: {elapsed * 1000:9.1f} ms for {values:,} windows and {len(keys):,} projections, {elapsed / values * 1e9:,.0f} ns each")
+
+    head = usage.head * MINUTE
+    s = timer()
+    usage.advance(head + 5 * MINUTE)
+    for job in jobs(rng, keys, jobs_per_day * 5 // 1440, head, head + 5 * MINUTE):
+        usage.add(*job)
+    evaluate(usage, keys)
+    click.echo(f"   next evaluation: {(timer() - s) * 1000:9.1f} ms, five more minutes of jobs included")
+
+    buckets = array("d", (rng.random() for _ in range(YEAR)))
+    s = timer()
+    for minutes in WINDOWS:
+        sum(buckets[-minutes:])
+    elapsed = timer() - s
+    click.echo(f"       bucket sums: {elapsed * 1000:9.1f} ms for the {len(WINDOWS)} windows of one allocation, {elapsed * len(keys):.1f} s for all")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "usage")
+        s = timer()
+        usage.save(path)
+        saved = timer() - s
+        s = timer()
+        UsageWindows.load(path)
+        click.echo(f"        save, load: {saved:9.2f} s, {timer() - s:.2f} s for {os.path.getsize(path) / 2**20:,.0f} MiB")
+
+
+if __name__ == '__main__':
+    main()
@@ -3,8 +3,9 @@
 export PATH=$PATH:/opt/slurm/slurm-curr/bin
 export SDF_COACT_URI=coact.slac.stanford.edu:443/graphql-service
 
+# overage keeps running and evaluates every 300s itself; restart it if it exits
 while [ 1 ]; do
     date
-    ./venv/bin/python3  ./sdf_click.py coact overage --password-file ./etc/.secrets/password --grouper-password-file ./etc/.secrets/grouper_password --windows 5 --windows 15 --windows 60 --windows 180 --windows 1440 --verbose --influxdb-url=https://influxdb.slac.stanford.edu:443
-    sleep 300
+    ./venv/bin/python3  ./sdf_click.py coact overage --password-file ./etc/.secrets/password --windows 5 --windows 15 --windows 60 --windows 180 --windows 1440 --verbose --influxdb-url=https://influxdb.slac.stanford.edu:443 --daemon --interval 300
+    sleep 60
 done
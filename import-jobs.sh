@@ -5,10 +5,20 @@ export SDF_COACT_URI=coact.slac.stanford.edu:443/graphql-service
 
 PASSWORD_FILE=./etc/.secrets/password
 
+mkdir -p ../slurm-job-state
+# only upload jobs whose record changed since it was last uploaded
+DEDUP="--dedup-store ../slurm-job-state/uploaded.sqlite"
+# retry failed batches in halves, keeping the jobs that still fail
+RETRY="--dead-letter ../slurm-job-state/dead-letter.jsonl"
+# upload from a spool on disk, so that the jobs converted by a run that dies are uploaded by the next
+SPOOL="--spool ../slurm-job-state/spool"
+
 if [ ! -z $1 ]; then
   DATE=$@
 else
   DATE=$(date +"%Y-%m-%d")
+  # repeated runs for the current day only dump and upload jobs since the last run
+  STATE="--state ../slurm-job-state/import.json"
 fi
 
 # deal with first few minutes of new day; need to do full import of previous day before running it
@@ -17,22 +27,44 @@ NOW=$(date "+%s")
 DIFF=$(( ($NOW - $MIDNIGHT) ))
 if [[ $DIFF -lt 300 ]]; then
   DATE=$(date -d 'yesterday' +"%Y-%m-%d")
+  # the state is for today; the previous day is dumped and imported in full, picking up records slurmdbd wrote late
+  STATE=""
 fi
 
 echo ">" $DATE" ("$(date)")"
 
+# ../slurm-job-history/$DATE and ../slurm-job-remapped/$DATE hold the whole day: full runs and,
+# for the current day, a full dump in the first minutes of every hour rewrite them. The incremental
+# runs in between only hold the jobs since the last run and overlap each other, so they are not kept.
+DUMP_STATE=$STATE
+HISTORY=/dev/null
+REMAPPED=/dev/null
+if [ -z "$STATE" ] || [ $(date +"%-M") -lt 5 ]; then
+  DUMP_STATE=""
+  HISTORY=../slurm-job-history/$DATE.part
+  REMAPPED=../slurm-job-remapped/$DATE.part
+fi
+
 # full
-./venv/bin/python3 ./sdf_click.py coact slurmdump --date $DATE \
-    | tee ../slurm-job-history/$DATE \
+./venv/bin/python3 ./sdf_click.py coact slurmdump --date $DATE $DUMP_STATE \
+    | tee $HISTORY \
     | ./venv/bin/python3 ./sdf_click.py coact slurmremap \
-    | tee ../slurm-job-remapped/$DATE \
-    | ./venv/bin/python3 ./sdf_click.py coact slurmimport --password-file $PASSWORD_FILE --output=upload >/dev/null
+    | tee $REMAPPED \
+    | ./venv/bin/python3 ./sdf_click.py coact slurmimport --password-file $PASSWORD_FILE --output=upload --date $DATE $STATE $DEDUP $RETRY $SPOOL >/dev/null
+STATUS=("${PIPESTATUS[@]}")
+
+# replace the day's archives only once the dump and remap are complete
+if [ "$HISTORY" != /dev/null ] && [ ${STATUS[0]} -eq 0 ] && [ ${STATUS[2]} -eq 0 ]; then
+  mv $HISTORY ../slurm-job-history/$DATE
+  mv $REMAPPED ../slurm-job-remapped/$DATE
+fi
 
+# replays of a day, from the archives of its last full dump
 # just for 2023 imports
-#cat ../slurm-job-remapped/$DATE | ./sdf.py coact slurmimport --password-file $PASSWORD_FILE --output=upload >/dev/null
+#cat ../slurm-job-remapped/$DATE | ./venv/bin/python3 ./sdf_click.py coact slurmimport --password-file $PASSWORD_FILE --output=upload >/dev/null
 
 # don't pull data from slurm
-#cat ../slurm-job-history/$DATE | ./sdf.py coact slurmremap | tee ../slurm-job-remapped/$DATE | ./sdf.py coact slurmimport --password-file $PASSWORD_FILE --output=upload >/dev/null
+#cat ../slurm-job-history/$DATE | ./venv/bin/python3 ./sdf_click.py coact slurmremap | tee ../slurm-job-remapped/$DATE | ./venv/bin/python3 ./sdf_click.py coact slurmimport --password-file $PASSWORD_FILE --output=upload >/dev/null
 
 ###
 # recalculate summaries
@@ -0,0 +1,135 @@
+"""
+Columnar Arrow IPC archives of sacct dumps.
+
+``import-jobs.sh`` keeps every day's raw and remapped sacct output as
+pipe-delimited text, which every replay has to decode and split again. An
+archive holds the same rows as a compressed Arrow IPC file with one string
+column per sacct field. Reading it memory-maps the file, and the columns of
+each record batch are used without another parse.
+
+Archives are lossless: rows read back are the split text rows, so they can
+be handed to the same conversion code as ``split_rows`` output.
+
+pyarrow is an optional dependency, see ``available()``.
+"""
+
+from typing import Iterator, Optional
+
+from loguru import logger
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+except ImportError:  # pragma: no cover - depends on the environment
+    pa = None
+
+# the first bytes of an Arrow IPC file
+ARROW_MAGIC = b"ARROW1"
+
+
+def available() -> bool:
+    """True if pyarrow could be imported."""
+    return pa is not None
+
+
+def is_archive(path: str) -> bool:
+    """True if ``path`` is an Arrow IPC file rather than a text dump."""
+    with open(path, "rb") as f:
+        return f.read(len(ARROW_MAGIC)) == ARROW_MAGIC
+
+
+class ArchiveWriter:
+    """
+    Write sacct lines or split rows to an Arrow IPC archive, a record batch at a time.
+
+    Example usage:
+        with ArchiveWriter(path) as archive:
+            for line in run_sacct(...):
+                archive.write_line(line)
+    """
+
+    def __init__(self, path: str, batch_rows: int = 65536, compression: Optional[str] = "zstd"):
+        if not available():
+            raise RuntimeError("archives require pyarrow")
+        self.path = path
+        self.batch_rows = batch_rows
+        self.compression = compression
+        self.fields = None
+        self.rows = 0
+        self.skipped = 0
+        self._columns = None
+        self._writer = None
+
+    def __enter__(self) -> "ArchiveWriter":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write_line(self, line: str) -> None:
+        """Write a pipe-delimited line; the first one is the header."""
+        line = line.rstrip("\n")
+        if not line:
+            return
+        parts = line.split("|")
+        if self.fields is None:
+            self.write_header(parts)
+        elif parts != self.fields:
+            self.write_row(parts)
+
+    def write_header(self, fields: list) -> None:
+        self.fields = list(fields)
+        self._columns = [[] for _ in self.fields]
+        schema = pa.schema([(f, pa.string()) for f in self.fields])
+        options = ipc.IpcWriteOptions(compression=self.compression)
+        self._writer = ipc.new_file(self.path, schema, options=options)
+
+    def write_row(self, parts) -> None:
+        if len(parts) != len(self.fields):
+            self.skipped += 1
+            logger.warning(f"not archiving row with {len(parts)} of {len(self.fields)} fields: {parts}")
+            return
+        for column, value in zip(self._columns, parts):
+            column.append(value)
+        self.rows += 1
+        if len(self._columns[0]) >= self.batch_rows:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._columns and self._columns[0]:
+            arrays = [pa.array(column, type=pa.string()) for column in self._columns]
+            self._writer.write_batch(pa.record_batch(arrays, names=self.fields))
+            self._columns = [[] for _ in self.fields]
+
+    def close(self) -> None:
+        if self._writer is None:
+            return
+        self.flush()
+        self._writer.close()
+        self._writer = None
+        logger.info(f"archived {self.rows:,} rows to {self.path}")
+
+
+def open_archive(path: str) -> "ipc.RecordBatchFileReader":
+    """Memory-map an archive for column access."""
+    if not available():
+        raise RuntimeError("archives require pyarrow")
+    return ipc.open_file(pa.memory_map(path, "r"))
+
+
+def read_rows(path: str, columns: Optional[list] = None) -> Iterator[tuple[dict, tuple]]:
+    """Yield ``(index, parts)`` for every row of an archive, as ``split_rows`` does for text.
+
+    With ``columns``, only those columns are read and the rows hold just
+    them, in the order of ``columns``; columns missing from the archive are
+    left out.
+    """
+    reader = open_archive(path)
+    names = reader.schema.names
+    if columns is not None:
+        names = [c for c in columns if c in names]
+    index = {field: idx for idx, field in enumerate(names)}
+    for i in range(reader.num_record_batches):
+        batch = reader.get_batch(i)
+        for parts in zip(*(batch.column(name).to_pylist() for name in names)):
+            yield index, parts
@@ -0,0 +1,96 @@
+"""
+Cache of the job blocking state of the slurm associations.
+
+Every overage evaluation asks sacctmgr whether each facility's regular
+association is held (``GrpNodes`` of 0). That state only changes when we
+change it, so ``AssocStateCache`` keeps it between evaluations: it is
+updated with the outcome of our own job blocking changes and only read from
+slurm again every ``reconcile_interval`` seconds, for associations it does
+not know yet, or once drift is suspected, such as after a change that
+sacctmgr did not confirm.
+
+With a ``path`` the cache is also kept in a JSON file, so that it survives
+restarts and can be shared by the runs of a shell loop.
+"""
+
+import json
+import os
+import time
+from typing import Optional
+
+from loguru import logger
+
+
+class AssocStateCache:
+    """
+    Held state per association account, e.g. ``lcls:_regular_@ada``.
+
+    Example usage:
+        cache = AssocStateCache(path, reconcile_interval=3600)
+        if cache.stale(accounts):
+            cache.update(accounts, read_from_sacctmgr(accounts))
+        held = cache.held
+    """
+
+    def __init__(self, path: Optional[str] = None, reconcile_interval: float = 3600):
+        self.path = path
+        self.reconcile_interval = reconcile_interval
+        # None for the accounts slurm has no association for
+        self.held: dict[str, Optional[bool]] = {}
+        # wall clock time of the last read from slurm
+        self.read_at: Optional[float] = None
+        self.drift = False
+        if path and os.path.exists(path):
+            self.load()
+
+    def load(self) -> None:
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            self.held = data["held"]
+            self.read_at = data["read_at"]
+            self.drift = data.get("drift", False)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"ignoring unreadable association state cache {self.path}: {e}")
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"read_at": self.read_at, "drift": self.drift, "held": self.held}, f)
+        os.replace(tmp, self.path)
+
+    def stale(self, accounts: list) -> bool:
+        """Whether the state of ``accounts`` has to be read from slurm again."""
+        if self.drift:
+            logger.debug("association state drift suspected; reading it from slurm")
+            return True
+        if self.read_at is None or time.time() - self.read_at >= self.reconcile_interval:
+            return True
+        unknown = [account for account in accounts if account not in self.held]
+        if unknown:
+            logger.debug(f"association state of {len(unknown)} accounts unknown, e.g. {unknown[0]}; reading it from slurm")
+            return True
+        return False
+
+    def update(self, accounts: list, held: dict) -> None:
+        """Replace the state of ``accounts`` with ``held`` as just read from slurm."""
+        held = {account: held.get(account) for account in accounts}
+        changed = {account for account, state in held.items() if account in self.held and self.held[account] != state}
+        if changed and self.read_at is not None:
+            logger.warning(f"association state changed outside of overage for {', '.join(sorted(changed))}")
+        self.held = held
+        self.read_at = time.time()
+        self.drift = False
+        self.save()
+
+    def record(self, account: str, held: bool) -> None:
+        """Record the outcome of a job blocking change we made."""
+        self.held[account] = held
+        self.save()
+
+    def suspect(self) -> None:
+        """Read the state from slurm next time, e.g. after a change that may not have been applied."""
+        self.drift = True
+        self.save()
@@ -6,16 +6,24 @@ registers subcommands using click decorators instead of cliff's CommandManager.
 """
 
 from loguru import logger
-from typing import Any, Iterator, Optional, Sequence, TypedDict
-from functools import wraps
+from typing import TYPE_CHECKING, Any, Iterator, NamedTuple, Optional, Sequence, TypedDict
+from functools import lru_cache, wraps
+from contextlib import ExitStack, nullcontext
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from bisect import bisect_right
+from dataclasses import dataclass
 from string import Template
 import re
 import math
+import os
+import queue
 import sys
+import threading
 
 import click
 import json
 import subprocess
+from time import gmtime, strftime
 from timeit import default_timer as timer
 
 import pendulum as pdl
@@ -26,7 +34,19 @@ from urllib.parse import urlparse
 
 # Import base classes from modules.base
 from .base import GraphQlMixin, common_options, graphql_options, configure_logging_from_verbose
-from .utils.graphql import GraphQlClient
+from .utils.graphql import GraphQlClient, PersistentSession
+from .upload import JOBS_IMPORT_GQL, AdaptiveBatchSize, Bisector, DeadLetterFile, PipelinedUploader, RequestEncoder, execute_args, upload_summary
+from .hostlist import HostSet
+from .assoc_state import AssocStateCache
+from .dedup import DEFAULT_RETENTION_DAYS, DedupStore
+from .incremental import DEFAULT_OVERLAP, IncrementalState
+from .remap import RemapRules
+from .scheduler import Scheduler
+from .spool import Spool, SpoolDrainer
+from . import archive
+
+if TYPE_CHECKING:
+    from .rolling_usage import LocalUsage
 
 # get local timezone
 _now = pdl.now()
@@ -54,6 +74,25 @@ class FacilityNodeUsage(TypedDict):
     cluster: str
     nodes: int
 
+@dataclass(frozen=True, slots=True)
+class ClusterCapacity:
+    """Per-node capacity of a partition, optionally for a class of high-memory nodes."""
+    name: str
+    cpu: float
+    gpu: float
+    mem: float
+
+    def get(self, resource: str) -> float:
+        return getattr(self, resource)
+
+class AllocationIndex(NamedTuple):
+    """Allocation periods of one (facility, repo, cluster), sorted by start epoch."""
+    starts: list[float]
+    ends: list[float]
+    # running maximum of ends, so overlapping periods can still be found
+    max_ends: list[float]
+    ids: list[str]
+
 
 def parse_datetime(value: Any, timezone=_now.timezone, force_tz: bool = False):
     """Parse various datetime formats into pendulum DateTime objects."""
@@ -75,6 +114,76 @@ def datetime_converter(o: Any) -> Optional[str]:
     return None
 
 
+@lru_cache(maxsize=4096)
+def _utc_date_prefix(days: int) -> str:
+    return strftime("%Y-%m-%dT", gmtime(days * 86400))
+
+
+def format_epoch_utc(epoch: int) -> str:
+    """Format an integer epoch as ``YYYY-MM-DDTHH:MM:SS.000Z``.
+
+    Produces the same string as converting the epoch to a pendulum DateTime in
+    UTC, but only computes the date part once per day.
+    """
+    days, secs = divmod(epoch, 86400)
+    hours, secs = divmod(secs, 3600)
+    minutes, secs = divmod(secs, 60)
+    return f"{_utc_date_prefix(days)}{hours:02d}:{minutes:02d}:{secs:02d}.000Z"
+
+
+KILOS_PATTERN = re.compile(r"(^[0-9.]+)([KMG])?")
+KILOS_MULTIPLIERS = {"K": math.pow(2, 10), "M": math.pow(2, 20), "G": math.pow(2, 30)}
+
+
+@lru_cache(maxsize=4096)
+def kilos_to_int(s: str) -> int:
+    """Convert a slurm quantity such as ``16G`` or ``512M`` to an integer."""
+    m = KILOS_PATTERN.match(s.upper())
+    if m:
+        g = m.group(2)
+        mul = KILOS_MULTIPLIERS[g] if g else 1
+        return int(float(m.group(1)) * mul)
+    else:
+        raise Exception("Can't parse %s" % s)
+
+
+@lru_cache(maxsize=16384)
+def parse_alloc_tres(tres: str) -> tuple[Optional[int], Optional[int], Optional[int]]:
+    """Parse an AllocTRES string into its (cpu, gpu, mem) amounts.
+
+    Any ``gres/gpu*`` component counts as gpu; a resource that is not
+    present is returned as None. Jobs share a small number of distinct
+    AllocTRES strings, so results are cached by the raw string.
+    """
+    used = {}
+    if tres != "":
+        for x in tres.split(","):
+            k, v = x.split("=")
+            if "gpu" in k:
+                k = "gpu"
+            used[k] = kilos_to_int(v)
+    return used.get("cpu"), used.get("gpu"), used.get("mem")
+
+
+def log_parser_cache_stats() -> None:
+    """Log hit/miss statistics of the cached slurm field parsers."""
+    for fx in (parse_alloc_tres, kilos_to_int):
+        info = fx.cache_info()
+        lookups = info.hits + info.misses
+        logger.debug(
+            f"{fx.__name__} cache: hits={info.hits:,} misses={info.misses:,} "
+            f"size={info.currsize:,}/{info.maxsize:,} hit rate={info.hits / lookups if lookups else 0:.1%}"
+        )
+
+
+def conv(s, fx, default=None):
+    """Apply ``fx`` to ``s``, returning ``default`` if it fails."""
+    try:
+        return fx(s)
+    except:
+        return default
+
+
 def time_function(level="INFO"):
     """Decorator to time function execution and log the duration."""
     def decorator(func):
@@ -104,39 +213,86 @@ def coact(ctx):
 # SlurmDump Command
 # ============================================================================
 
+def sacct_options(f):
+    """Options splitting the sacct query into concurrent time slices and clusters."""
+    f = click.option('--sacct-workers', 'workers', default=4, type=click.IntRange(min=1), help='Number of sacct queries run concurrently')(f)
+    f = click.option('--cluster', 'clusters', multiple=True, help='Query each of these clusters separately instead of --allclusters (repeatable)')(f)
+    f = click.option('--slices', default=1, type=click.IntRange(min=1), help='Number of time slices to split the sacct query into')(f)
+    return f
+
+
+def archive_option(f):
+    """Option to also write a command's output as an Arrow IPC archive."""
+    return click.option(
+        '--archive', 'archive_path',
+        type=click.Path(dir_okay=False, writable=True),
+        default=None,
+        help='Also write the output to this compressed Arrow IPC archive (requires pyarrow)'
+    )(f)
+
+
+def archive_writer(path: Optional[str]):
+    """An ``ArchiveWriter`` for ``path``, or a null context when no archive was asked for."""
+    if not path:
+        return nullcontext(None)
+    if not archive.available():
+        raise click.UsageError("--archive requires pyarrow to be installed")
+    return archive.ArchiveWriter(path)
+
+
 @coact.command(name='slurmdump')
 @common_options
 @click.option('--date', default='2023-10-18', help='Import jobs from this date')
 @click.option('--starttime', default='00:00:00', help='Start time of job imports')
 @click.option('--endtime', default='23:59:59', help='End time of job imports')
+@click.option('--sacct', 'sacct_bin_path', default='sacct', help='Path to the sacct binary')
+@click.option('--state', type=click.Path(dir_okay=False), default=None, help='Incremental state file; only dump jobs since the last import recorded in it')
+@click.option('--overlap', default=DEFAULT_OVERLAP, type=click.IntRange(min=0), help='Seconds before the last imported end time to query again in incremental mode')
+@sacct_options
+@archive_option
 @click.pass_context
-def slurm_dump(ctx, verbose, date, starttime, endtime):
+def slurm_dump(ctx, verbose, date, starttime, endtime, sacct_bin_path, state, overlap, slices, clusters, workers, archive_path):
     """Dumps data from slurm into flat files for later ingestion."""
     configure_logging_from_verbose(verbose)
     ctx.obj['verbose'] = verbose
 
-    for line in run_sacct(
-        date=date,
-        start_time=starttime,
-        end_time=endtime,
-        verbose=verbose > 0
-    ):
-        click.echo(line)
+    if state:
+        starttime = IncrementalState(state, date, overlap=overlap).start_time(starttime)
+        logger.info(f"incremental dump of {date} from {starttime}")
+
+    with archive_writer(archive_path) as arch:
+        for line in run_sacct(
+            sacct_bin_path=sacct_bin_path,
+            date=date,
+            start_time=starttime,
+            end_time=endtime,
+            verbose=verbose > 0,
+            slices=slices,
+            clusters=clusters,
+            workers=workers
+        ):
+            click.echo(line)
+            if arch:
+                arch.write_line(line)
 
 
-def run_sacct(
+SACCT_FORMAT = "JobID,User,UID,Account,Partition,QOS,Submit,Start,End,Elapsed,NCPUS,AllocNodes,AllocTRES,CPUTimeRAW,NodeList,Reservation,ReservationId,State"
+
+
+def sacct_command(
     sacct_bin_path: str = "sacct",
     date: str = "2023-10-12",
     start_time: str = "00:00:00",
     end_time: str = "23:59:59",
-    verbose: bool = False
-) -> Any:
-    """Run sacct command and yield output lines."""
-    commandstr = f"""SLURM_TIME_FORMAT=%s {sacct_bin_path} --allusers --duplicates --allclusters --allocations --starttime="{date}T{start_time}" --endtime="{date}T{end_time}" --truncate --parsable2 --format=JobID,User,UID,Account,Partition,QOS,Submit,Start,End,Elapsed,NCPUS,AllocNodes,AllocTRES,CPUTimeRAW,NodeList,Reservation,ReservationId,State"""
+    cluster: Optional[str] = None
+) -> str:
+    """Build the sacct command line for one window, across all clusters unless ``cluster`` is given."""
+    clusters = f"--clusters={cluster}" if cluster else "--allclusters"
+    return f"""SLURM_TIME_FORMAT=%s {sacct_bin_path} --allusers --duplicates {clusters} --allocations --starttime="{date}T{start_time}" --endtime="{date}T{end_time}" --truncate --parsable2 --format={SACCT_FORMAT}"""
 
-    if verbose:
-        logger.info(f"cmd: {commandstr}")
 
+def sacct_lines(commandstr: str) -> Iterator[str]:
+    """Run a sacct command and yield its header and job lines."""
     index = 0
 
     process = subprocess.Popen(commandstr, shell=True, stdout=subprocess.PIPE)
@@ -149,6 +305,151 @@ def run_sacct(
             logger.warning(
                 f"skipping ({len(fields)}, {int(fields[7])} < {int(fields[8])}) {line}"
             )
+    if process.wait() != 0:
+        raise Exception(f"sacct exited with status {process.returncode}: {commandstr}")
+
+
+# lines read ahead per concurrent sacct query
+SACCT_BUFFER_LINES = 10000
+
+
+def time_slices(start_time: str, end_time: str, slices: int) -> list[tuple[str, str]]:
+    """Split ``HH:MM:SS`` bounds into ``slices`` consecutive windows sharing their boundary second."""
+    def secs(t: str) -> int:
+        h, m, s = (int(p) for p in t.split(":"))
+        return h * 3600 + m * 60 + s
+
+    def fmt(t: int) -> str:
+        return f"{t // 3600:02d}:{t % 3600 // 60:02d}:{t % 60:02d}"
+
+    start, end = secs(start_time), secs(end_time)
+    slices = max(1, min(slices, end - start))
+    bounds = [start + (end - start) * i // slices for i in range(slices + 1)]
+    return [(fmt(a), fmt(b)) for a, b in zip(bounds, bounds[1:])]
+
+
+def run_sacct(
+    sacct_bin_path: str = "sacct",
+    date: str = "2023-10-12",
+    start_time: str = "00:00:00",
+    end_time: str = "23:59:59",
+    verbose: bool = False,
+    slices: int = 1,
+    clusters: Sequence[str] = (),
+    workers: int = 4
+) -> Any:
+    """Run sacct command and yield output lines.
+
+    With more than one time slice or with ``clusters``, the window is split
+    into one query per slice and cluster. Up to ``workers`` of them run
+    concurrently; their output is streamed in slice order. Jobs still
+    running at the end of a slice are returned again by the next one, with
+    a later Elapsed and maybe End and State, so their rows are held back
+    and only the row of the latest slice returning the same (JobID, Start)
+    is kept.
+    """
+    if slices <= 1 and not clusters:
+        commandstr = sacct_command(sacct_bin_path, date, start_time, end_time)
+        if verbose:
+            logger.info(f"cmd: {commandstr}")
+        yield from sacct_lines(commandstr)
+        return
+
+    tz = pdl.local_timezone()
+    queries = [
+        (pdl.parse(f"{date}T{end}", tz=tz).int_timestamp, cluster, sacct_command(sacct_bin_path, date, start, end, cluster=cluster))
+        for start, end in time_slices(start_time, end_time, slices)
+        for cluster in (clusters or (None,))
+    ]
+    logger.debug(f"running {len(queries)} sacct queries with {workers} workers")
+    if verbose:
+        for _, _, commandstr in queries:
+            logger.info(f"cmd: {commandstr}")
+
+    closed = threading.Event()
+
+    def stream(commandstr: str, lines: queue.Queue) -> None:
+        # a bounded queue per query, so that queries ahead of the merge only buffer SACCT_BUFFER_LINES
+        def put(item) -> bool:
+            while not closed.is_set():
+                try:
+                    lines.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+        if closed.is_set():
+            return
+        try:
+            for line in sacct_lines(commandstr):
+                if not put(line):
+                    return
+        except Exception as e:
+            put(e)
+            return
+        put(None)
+
+    header = None
+    # lines of the jobs still running at the end of the previous and of the current slice, by (cluster, JobID, Start);
+    # they are held back, as the next slice returns the same jobs with a later Elapsed, End or State
+    held, holding, boundary = {}, {}, None
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        streams = []
+        for end, cluster, commandstr in queries:
+            lines = queue.Queue(maxsize=SACCT_BUFFER_LINES)
+            pool.submit(stream, commandstr, lines)
+            streams.append((end, cluster, lines))
+        try:
+            for end, cluster, lines in streams:
+                if end != boundary:
+                    # jobs of the previous slice that this one did not return again
+                    for kept in held.values():
+                        yield from kept
+                    held, holding, boundary = holding, {}, end
+                first = True
+                while (line := lines.get()) is not None:
+                    if isinstance(line, Exception):
+                        raise line
+                    if first:
+                        first = False
+                        if header is None:
+                            header = line
+                            fields = header.split("|")
+                            i_job, i_start, i_end = fields.index("JobID"), fields.index("Start"), fields.index("End")
+                            yield header
+                        continue
+                    parts = line.split("|")
+                    key = (cluster, parts[i_job], parts[i_start])
+                    # the row of the latest slice replaces those of the previous one
+                    held.pop(key, None)
+                    job_end = parts[i_end]
+                    if not job_end.isdigit() or int(job_end) >= end:
+                        holding.setdefault(key, []).append(line)
+                        continue
+                    yield line
+            for kept in list(held.values()) + list(holding.values()):
+                yield from kept
+        finally:
+            closed.set()
+
+
+def split_rows(lines) -> Iterator[tuple[dict, list]]:
+    """Split pipe-delimited sacct lines, yielding ``(index, parts)`` for every row after the header.
+
+    ``index`` maps each header field to its column and is shared by all rows.
+    Repeats of the header line are skipped.
+    """
+    index = None
+    header = None
+    for line in lines:
+        if line:
+            parts = line.split("|")
+            if index is None:
+                index = {field: idx for idx, field in enumerate(parts)}
+                header = parts
+            elif parts != header:
+                # appended incremental dumps repeat the header
+                yield index, parts
 
 
 # ============================================================================
@@ -163,321 +464,185 @@ def run_sacct(
     default='-',
     help='Data to read from (default: stdin)'
 )
+@click.option('--rules', type=click.Path(exists=True, dir_okay=False), default=None, help='Remap rule table (default: modules/remap_rules.json)')
+@click.option('--era-by-start', is_flag=True, default=False, help='Apply the era of rules matching each job\'s start time instead of the current rules (changes the accounts of jobs started before 2024)')
+@archive_option
 @click.pass_context
-def slurm_remap(ctx, verbose, data):
+def slurm_remap(ctx, verbose, data, rules, era_by_start, archive_path):
     """Remaps/patches the slurm job data to prepare for import."""
     configure_logging_from_verbose(verbose)
     ctx.obj['verbose'] = verbose
 
-    remapper = SlurmRemapper(verbose=verbose > 0)
-    remapper.run(data)
+    remapper = SlurmRemapper(verbose=verbose > 0, rules=RemapRules.load(rules, by_start=era_by_start))
+    with archive_writer(archive_path) as arch:
+        remapper.run(data, archive=arch)
+
+
+class BufferedLineWriter:
+    """
+    Collects output lines and writes them to ``stream`` in large chunks.
+
+    ``click.echo`` writes and flushes every line, which dominates the time
+    of remapping a large dump.
+    """
+
+    def __init__(self, stream, size: int = 1 << 20):
+        self.stream = stream
+        self.size = size
+        self._lines = []
+        self._pending = 0
+
+    def __enter__(self) -> "BufferedLineWriter":
+        return self
+
+    def __exit__(self, *args):
+        self.flush()
+
+    def write(self, line: str) -> None:
+        self._lines.append(line)
+        self._pending += len(line) + 1
+        if self._pending >= self.size:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._lines:
+            self._lines.append("")
+            self.stream.write("\n".join(self._lines))
+            self._lines = []
+            self._pending = 0
+        self.stream.flush()
 
 
 class SlurmRemapper:
     """Handles the slurm remap logic."""
 
-    def __init__(self, verbose: bool = False):
+    def __init__(self, verbose: bool = False, rules: Optional[RemapRules] = None):
         self.verbose = verbose
-
-    def run(self, data):
-        """Run the remap process."""
-        first = True
-        index = {}
-        order = []
-        for line in data.readlines():
-            if line:
-                parts = line.split("|")
-                if first:
-                    index = {s: idx for idx, s in enumerate(parts)}
-                    order = parts
-                    first = False
-                    click.echo(f"{line.strip()}")
-                else:
-                    out = self.convert(index, parts, order)
-                    if out:
-                        click.echo(f"{out}")
+        self.rules = rules or RemapRules.load()
+        self._index = None
+        self._remap_row = None
+
+    def run(self, data, archive=None):
+        """Run the remap process, also writing the remapped lines to ``archive`` if given."""
+        remap_row = None
+        with BufferedLineWriter(sys.stdout) as out:
+            for line in data:
+                if line:
+                    if remap_row is None:
+                        remap_row = self.binding({s: idx for idx, s in enumerate(line.rstrip("\n").split("|"))})
+                        # the columns after the last one the rules use are passed through unsplit
+                        maxsplit = remap_row.max_column + 1
+                        line = line.strip()
+                    else:
+                        parts = line.split("|", maxsplit)
+                        if not remap_row(parts):
+                            continue
+                        line = "|".join(parts).strip()
+                    out.write(line)
+                    if archive:
+                        archive.write_line(line)
+
+    def binding(self, index: dict):
+        """The rules compiled for rows split with the columns of ``index``, cached for the last index seen."""
+        if index is not self._index:
+            self._index = index
+            self._remap_row = self.rules.bind(index)
+        return self._remap_row
 
     def convert(self, index, parts, order) -> Optional[str]:
-        d = {field: parts[idx] for field, idx in index.items()}
-        d = self.remap_job(d)
-        if d:
-            out = []
-            for i in order:
-                out.append(d[i])
+        out = self.remap_parts(index, parts, order)
+        if out:
             return "|".join(out).strip()
         return None
 
+    def remap_parts(self, index, parts, order) -> Optional[list]:
+        """Remap a split sacct row, returning its fields in ``order`` or None if the job is dropped."""
+        parts = self.binding(index)(list(parts))
+        if parts:
+            return [parts[index[i]] for i in order]
+        return None
+
+    def remap_rows(self, rows) -> Iterator[tuple[dict, list]]:
+        """Remap ``(index, parts)`` rows from ``split_rows`` in place, dropping filtered jobs."""
+        for index, parts in rows:
+            if self.binding(index)(parts):
+                yield index, parts
+
     def remap_job(self, d) -> Optional[dict]:
-        """Remap job data to fix account info."""
-        if (
-            d["Account"] in ("shared", "shared:default")
-            or d["Account"].startswith("shared")
-            or d["User"] in ("jonl", "vanilla", "yemi", "yangw", "pav", "root", "reranna", "ppascual", "renata",)
-            or d["Partition"] in ("fermi-transfer")
-        ):
-            return None
+        """Remap job data to fix account info, with the rules of the era the job started in."""
+        return self.rules.remap(d)
 
-        if "," in d["Partition"]:
-            a = d["Partition"].split(",")[0]
-            d["Partition"] = a
+    def remap_job_pre2024(self, d) -> Optional[dict]:
+        """deal with old jobs with wrong account info"""
+        return self.rules.era("pre2024").remap(d)
 
-        if "@" in d["Account"]:
-            d["Account"], _ = d["Account"].split("@")
 
-        if d["QOS"] in ("Unknown",):
-            d["QOS"] = "normal"
+# ============================================================================
+# SlurmImport Command
+# ============================================================================
 
-        return d
+def dedup_options(f):
+    """Options skipping the upload of jobs whose record is unchanged since it was last uploaded."""
+    f = click.option('--full-resync', is_flag=True, default=False, help='Upload every job regardless of --dedup-store, recording them in it')(f)
+    f = click.option('--dedup-retention', 'dedup_retention_days', default=DEFAULT_RETENTION_DAYS, type=click.IntRange(min=1), help='Days of jobs kept in --dedup-store, counted back from the latest start in it')(f)
+    f = click.option('--dedup-store', 'dedup_store_path', type=click.Path(dir_okay=False), default=None, help='SQLite store of uploaded job digests; only jobs whose record changed are output')(f)
+    return f
 
-    def remap_job_pre2024(self, d):
-        """deal with old jobs with wrong account info"""
-        # self.logger.info(f"in: {d}")
-        if d["User"] in ("lsstsvc1") and d["Account"] in ("rubin", "shared", ""):
-            d["Account"] = "rubin:production"
-        elif d["Account"] in ("shared", "shared:default") or d["User"] in (
-            "jonl",
-            "vanilla",
-            "yemi",
-            "yangw",
-            "pav",
-            "root",
-            "reranna",
-            "ppascual",
-            "renata",
-        ):
-            return None
-        elif d["User"] in (
-            "csaunder",
-            "elhoward",
-            "mrawls",
-            "brycek",
-            "mfl",
-            "digel",
-            "wguan",
-            "laurenma",
-            "smau",
-            "bos",
-            "erykoff",
-            "ebellm",
-            "mccarthy",
-            "yesw",
-            "abrought",
-            "shuang92",
-            "aconnoll",
-            "daues",
-            "aheinze",
-            "zhaoyu",
-            "dagoret",
-            "kannawad",
-            "kherner",
-            "eske",
-            "cslater",
-            "sierrav",
-            "jmeyers3",
-            "lskelvin",
-            "jchiang",
-            "yanny",
-            "ktl",
-            "jneveu",
-            "hchiang2",
-            "snyder18",
-            "fred3m",
-            "brycek",
-            "eiger",
-            "esteves",
-            "mxk",
-            "yusra",
-            "mrabus",
-            "ryczano",
-            "mgower",
-            "yoachim",
-            "scichris",
-            "jcheval",
-            "richard",
-            "tguillem",
-        ) and d["Account"] in ("", "milano", "roma", "rubin"):
-            d["Account"] = "rubin:developers"
-            if d["Partition"] == "ampere":
-                d["Partition"] = "milano"
-        elif d["User"] == "kocevski" or (
-            d["User"]
-            in (
-                "burnett",
-                "horner",
-                "mdimauro",
-                "burnett",
-                "laviron",
-                "omodei",
-                "tyrelj",
-                "echarles",
-                "bruel",
-            )
-            and d["Account"] in ("", "latba", "ligo", "repository", "burnett")
-        ):
-            d["Account"] = "fermi:users"
-        elif d["User"] in ("glastraw",):
-            d["Account"] = "fermi:l1"
-        elif d["User"] in ("vossj",):
-            d["Partition"] = "roma"
-        elif d["User"] in (
-            "dcesar",
-            "jytang",
-            "rafimah",
-        ):
-            d["Account"] = "ad:beamphysics"
-        elif d["User"] in (
-            "kterao",
-            "kvtsang",
-            "anoronyo",
-            "bkroul",
-            "zhulcher",
-            "koh0207",
-            "drielsma",
-            "lkashur",
-            "dcarber",
-            "amogan",
-            "cyifan",
-            "yjwa",
-            "aj14",
-            "jdyer",
-            "sindhuk",
-            "justinjm",
-            "mrmooney",
-            "bearc",
-            "fuhaoji",
-            "sfogarty",
-            "carsmith",
-            "yuntse",
-        ) and not d["Account"] in (
-            "neutrino:ml-dev",
-            "neutrino:icarus-ml",
-            "neutrino:slacube",
-            "neutrino:dune-ml",
-        ):
-            d["Account"] = "neutrino:default"
-            d["Partition"] = "ampere"
-        elif d["User"] in (
-            "dougl215",
-            "zhezhang",
-        ):  # and d['Account'] in ('ampere:default',):
-            # self.logger.error("HERE")
-            d["Account"] = "mli:default"
-            d["Account"] = "neutrino:default"
-            d["Partition"] = "ampere"
-        elif d["User"] in (
-            "dougl215",
-            "zhezhang",
-        ):  # and d['Account'] in ('ampere:default',):
-            # self.logger.error("HERE")
-            d["Account"] = "mli:default"
-        elif d["User"] in (
-            "jfkern",
-            "taisgork",
-            "valmar",
-            "tgrant",
-            "arijit01",
-            "mmdoyle",
-            "fpoitevi",
-            "ashojaei",
-            "monarin",
-            "claussen",
-            "batyuk",
-            "kevinkgu",
-            "tfujit27",
-            "haoyuan",
-            "aliang",
-            "jshenoy",
-            "dorlhiac",
-            "xjql",
-        ):  # and d['Account'] in ('','milano', 'roma'):
-            d["Account"] = "lcls:default"
-        elif d["User"] in (
-            "psdatmgr",
-            "xiangli",
-            "sachsm",
-            "hekstra",
-            "snelson",
-            "cwang31",
-            "espov",
-            "thorsten",
-            "wilko",
-            "snelson",
-            "melchior",
-            "cpo",
-            "wilko",
-            "mshankar",
-        ) and d["Account"] in (
-            "",
-            "lcls:xpp",
-            "lcls:psmfx",
-            "lcls:data",
-            "ampere",
-            "roma",
-            "rubin",
-            "lcls-xpp1234",
-            "lcls:xpptut15",
-            "lcls:xpptut16",
-            "s3dfadmin",
-        ):
-            d["Account"] = "lcls:default"
-        elif d["User"] in ("lsstccs", "rubinmgr"):
-            d["Account"] = "rubin:commissioning"
-        elif d["User"] in (
-            "majernik",
-            "knetsch",
-        ):
-            d["Account"] = "facet:default"
-        elif d["User"] in ("jberger",):
-            d["Account"] = "epptheory:default"
-        elif d["User"] in ("tabel",):
-            d["Account"] = "kipac:kipac"
-        elif d["User"] in (
-            "vnovati",
-            "owwen",
-            "melwan",
-            "zatschls",
-            "yanliu",
-            "cartaro",
-            "aditi",
-            "emichiel",
-        ):
-            d["Account"] = "supercdms:default"
 
-        if d["Account"] == "":
-            raise Exception(f"could not determine account for {d}")
+def encoding_options(f):
+    """Options serializing the upload requests ourselves, to compress them and size them in bytes."""
+    f = click.option('--batch-bytes', default=None, type=click.IntRange(min=1), help='Size upload batches to about this many request bytes, up to --batch jobs')(f)
+    f = click.option('--compress', is_flag=True, default=False, help='gzip the upload request bodies (the server must accept Content-Encoding: gzip)')(f)
+    return f
 
-        if "," in d["Partition"]:
-            a = d["Partition"].split(",")[0]
-            d["Partition"] = a
-        elif d["Partition"] in ("testweka",):
-            return None
 
-        if not ":" in d["Account"]:
-            d["Account"] = d["Account"] + ":default"
+def retry_options(f):
+    """Options adapting the upload batch size and retrying failed batches."""
+    f = click.option('--dead-letter', type=click.Path(dir_okay=False, writable=True), default=None, help='Retry failed upload batches in halves, appending the jobs that still fail to this file')(f)
+    f = click.option('--target-latency', default=None, type=click.FloatRange(min=1), help='Adapt the batch size, starting at --batch and up to 4 times it, so that uploads take about this many seconds')(f)
+    return f
 
-        if d["QOS"] in ("Unknown",):
-            d["QOS"] = "preemptable"
-        elif d["QOS"] in ("expedite",):
-            d["QOS"] = "normal"
 
-        # self.logger.info(f"out: {d}")
-        return d
+def spool_option(f):
+    """Option writing the converted jobs to a durable spool that is uploaded from, so that a failed run can be resumed."""
+    return click.option('--spool', 'spool_path', type=click.Path(file_okay=False), default=None, help='Spool directory the converted jobs are written to and uploaded from; jobs left by a failed run are uploaded first')(f)
 
 
-# ============================================================================
-# SlurmImport Command
-# ============================================================================
+def upload_settings(batch: int, compress: bool, batch_bytes: Optional[int], target_latency: Optional[float], dead_letter: Optional[str]) -> dict:
+    """``SlurmImporter`` arguments for the ``encoding_options`` and ``retry_options``."""
+    if batch_bytes and target_latency:
+        raise click.UsageError("--batch-bytes and --target-latency both size the batches; use one of them")
+    return {
+        'encoder': RequestEncoder(compress=compress) if compress or batch_bytes else None,
+        'batch_bytes': batch_bytes,
+        'sizes': AdaptiveBatchSize(batch, target_latency=target_latency) if target_latency else None,
+        'bisector': Bisector(DeadLetterFile(dead_letter)) if dead_letter else None,
+    }
+
+
+def dedup_store(path: Optional[str], full_resync: bool, retention_days: int = DEFAULT_RETENTION_DAYS) -> Optional[DedupStore]:
+    if full_resync and not path:
+        raise click.UsageError("--full-resync requires --dedup-store")
+    return DedupStore(path, full_resync=full_resync, retention_days=retention_days) if path else None
+
 
 @coact.command(name='slurmimport')
 @click.option('--print', 'print_output', is_flag=True, help='Verbose output')
 @click.option('--debug', is_flag=True, help='Debug output')
 @graphql_options
 @click.option('--batch', default=150000, type=int, help='Batch upload size')
+@click.option('--concurrency', default=1, type=click.IntRange(min=1), help='Number of upload batches kept in flight (1 uploads synchronously)')
+@click.option(
+    '--engine',
+    type=click.Choice(['scalar', 'numpy']),
+    default='scalar',
+    help='Conversion engine; numpy computes resource hours in vectorised chunks'
+)
 @click.option(
     '--data',
-    type=click.File('r'),
+    type=click.Path(exists=True, dir_okay=False, allow_dash=True),
     default='-',
-    help='Data to read from (default: stdin)'
+    help='Text dump or Arrow IPC archive to read from (default: stdin)'
 )
 @click.option(
     '--output',
@@ -491,8 +656,15 @@ class SlurmRemapper:
     default=False,
     help='Terminate if cannot parse data'
 )
+@click.option('--state', type=click.Path(dir_okay=False), default=None, help='Incremental state file; only output jobs that are new or changed since the last import')
+@click.option('--date', default=lambda: pdl.now().format('YYYY-MM-DD'), help='Date of the dump, used with --state (default: today)')
+@click.option('--workers', default=1, type=click.IntRange(min=1), help='Number of processes converting a --data file')
+@dedup_options
+@encoding_options
+@retry_options
+@spool_option
 @click.pass_context
-def slurm_import(ctx, print_output, debug, username, password_file, batch, data, output, exit_on_error):
+def slurm_import(ctx, print_output, debug, username, password_file, batch, concurrency, engine, data, output, exit_on_error, state, date, workers, dedup_store_path, full_resync, dedup_retention_days, compress, batch_bytes, target_latency, dead_letter, spool_path):
     """Reads sacctmgr info from slurm and translates it to coact accounting stats."""
     if debug:
         configure_logging_from_verbose(2)
@@ -500,14 +672,39 @@ def slurm_import(ctx, print_output, debug, username, password_file, batch, data,
     ctx.obj['verbose'] = print_output
     ctx.obj['exit_on_error'] = exit_on_error
 
+    if engine == 'numpy':
+        from .columnar import available
+        if not available():
+            raise click.UsageError("--engine numpy requires numpy to be installed")
+
     importer = SlurmImporter(
         username=username,
         password_file=password_file,
         verbose=print_output,
-        exit_on_error=exit_on_error
+        debug=debug,
+        exit_on_error=exit_on_error,
+        concurrency=concurrency,
+        engine=engine,
+        state=IncrementalState(state, date) if state else None,
+        dedup=dedup_store(dedup_store_path, full_resync, dedup_retention_days),
+        spool=Spool(spool_path) if spool_path else None,
+        **upload_settings(batch, compress, batch_bytes, target_latency, dead_letter)
     )
 
-    importer.run(data, output, batch)
+    if workers > 1 and data == '-':
+        raise click.UsageError("--workers requires a --data file")
+
+    if data != '-' and archive.is_archive(data):
+        if not archive.available():
+            raise click.UsageError(f"{data} is an Arrow IPC archive, which requires pyarrow to be installed")
+        importer.replay(archive.read_rows(data, columns=SlurmImporter.FIELDS), output, batch)
+    elif data != '-' and not print_output:
+        importer.replay_file(data, output, batch, workers=workers)
+    else:
+        with click.open_file(data, 'r') as f:
+            importer.run(f, output, batch)
+    if importer.dedup:
+        importer.dedup.close()
 
 
 class SlurmImporter(GraphQlMixin):
@@ -524,16 +721,68 @@ class SlurmImporter(GraphQlMixin):
         "sdfmilan272": 1920,
     }
 
-    def __init__(self, username: str, password_file: str, verbose: bool = False, exit_on_error: bool = False):
+    # the sacct fields read by convert
+    FIELDS = ["JobID", "User", "Account", "Partition", "QOS", "Start", "End", "NCPUS", "AllocNodes", "AllocTRES", "NodeList"]
+
+    def __init__(self, username: str, password_file: str, verbose: bool = False, exit_on_error: bool = False, concurrency: int = 1, engine: str = "scalar", debug: bool = False, state: Optional[IncrementalState] = None, dedup: Optional[DedupStore] = None, encoder: Optional[RequestEncoder] = None, batch_bytes: Optional[int] = None, sizes: Optional[AdaptiveBatchSize] = None, bisector: Optional[Bisector] = None, spool: Optional[Spool] = None):
         self.username = username
         self.password_file = password_file
         self.verbose = verbose
+        # per-job debug logging is only formatted when requested
+        self.debug = debug
         self.exit_on_error = exit_on_error
+        self.concurrency = concurrency
+        self.engine = engine
+        self.state = state
+        self.dedup = dedup
+        # uploads are serialized by the encoder, in batches of about batch_bytes if given
+        self.encoder = encoder
+        self.batch_bytes = batch_bytes
+        # adapts the size of the upload batches to their latency
+        self.sizes = sizes
+        # retries failed uploads in halves, down to the jobs that fail on their own
+        self.bisector = bisector
+        # converted jobs are written here and uploaded from it
+        self.spool = spool
+        self._uploaded = None
+        self.failed_batches = 0
+        self._high_memory_hosts = HostSet(self.HIGH_MEMORY_NODES)
         self._allocid = {}
+        self._alloc_index = {}
         self._clusters = {}
+        self._capacity = {}
 
     def run(self, data, output_format: str, batch_size: int) -> None:
-        """Run the import process."""
+        """Run the import process.
+
+        The input is consumed line by line and converted lazily, so at most
+        ``batch_size`` converted jobs are held in memory at any one time
+        regardless of how large the sacct dump is.
+        """
+        if self.verbose:
+            data = self.echo_lines(data)
+        self.replay(split_rows(data), output_format, batch_size)
+
+    def replay(self, rows, output_format: str, batch_size: int) -> None:
+        """Run the import process over ``(index, parts)`` rows, from ``split_rows`` or an archive."""
+        self.connect()
+        self.output(self.convert_row_jobs(rows), output_format, batch_size)
+
+    def replay_file(self, path: str, output_format: str, batch_size: int, workers: int = 1) -> None:
+        """Run the import process over a text dump, read through mmap and converted in ``workers`` processes."""
+        from .replay import replay_jobs
+        self.connect()
+        self.output(replay_jobs(self, path, workers), output_format, batch_size)
+
+    def convert_row_jobs(self, rows) -> Iterator[dict]:
+        """Lazily convert ``(index, parts)`` rows into job dictionaries with the configured engine."""
+        if self.engine == "numpy":
+            from .columnar import ColumnarConverter
+            return ColumnarConverter(self).iter_row_jobs(rows)
+        return self.convert_rows(rows)
+
+    def connect(self) -> None:
+        """Connect to the GraphQL service and fetch the metadata needed for conversion."""
         self.back_channel = self.connect_graph_ql(
             username=self.username,
             password_file=self.password_file,
@@ -541,32 +790,120 @@ class SlurmImporter(GraphQlMixin):
         )
         self.get_metadata()
 
-        first = True
-        index = {}
-        buffer = []
+    def output(self, jobs, output_format: str, batch_size: int) -> int:
+        """Batch converted jobs and send them to ``output_format``; returns the number of jobs."""
         s = timer()
+        self.failed_batches = 0
+        if self.state:
+            jobs = self.state.filter(jobs)
+        if self.dedup:
+            jobs = self.dedup.changed(jobs)
+        if output_format == "upload" and self.spool:
+            count, failed = self.output_spooled(jobs, batch_size)
+        else:
+            count, failed = self.send(jobs, output_format, batch_size)
 
-        for line in data.readlines():
-            if self.verbose:
-                click.echo(f"\n{line.strip()}")
-            if line:
-                parts = line.split("|")
-                if first:
-                    index = {field: idx for idx, field in enumerate(parts)}
-                    first = False
-                else:
-                    job = self.convert(index, parts)
-                    if job:
-                        buffer.append(job)
-                        if len(buffer) >= batch_size:
-                            self.generate_output(buffer, output_format)
-                            buffer = []
-
-        if len(buffer) > 0:
-            self.generate_output(buffer, output_format)
-
+        self.failed_batches = failed
         duration = timer() - s
-        logger.info(f"upload completed in {duration:,.02f}")
+        logger.info(f"upload of {count:,} jobs completed in {duration:,.02f}")
+        log_parser_cache_stats()
+        if self.state:
+            if output_format != "upload":
+                logger.info(f"{output_format} output; not advancing the incremental state")
+            elif failed:
+                logger.warning(f"{failed} batches failed; not advancing the incremental state")
+            else:
+                self.state.commit()
+        return count
+
+    def output_spooled(self, jobs, batch_size: int) -> tuple[int, int]:
+        """Append the jobs to the spool while a thread uploads it; returns the jobs spooled and the failed batches."""
+        count = 0
+        writing = threading.Event()
+        writing.set()
+        drainer = SpoolDrainer(self.spool, lambda chunk: self.send(chunk, "upload", batch_size)[1], chunk_records=batch_size * self.concurrency)
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            drained = pool.submit(drainer.run, writing)
+            try:
+                for job in jobs:
+                    self.spool.append(job)
+                    count += 1
+            finally:
+                self.spool.sync()
+                writing.clear()
+            failed = drained.result()
+        self.spool.close()
+        return count, failed
+
+    def send(self, jobs, output_format: str, batch_size: int) -> tuple[int, int]:
+        """Batch jobs and send them to ``output_format``; returns the number of jobs and of failed batches."""
+        count = 0
+        failed = 0
+        # printed batches are not uploaded, so only uploads are recorded
+        acknowledge = self.dedup.acknowledge if self.dedup and output_format == "upload" else None
+        # retried uploads acknowledge the parts of a batch that made it
+        self._uploaded = acknowledge
+        if output_format == "upload" and self.sizes:
+            batches = self.sizes.batches(jobs)
+            if self.encoder:
+                batches = map(self.encoder.encode, batches)
+        elif output_format == "upload" and self.encoder:
+            batches = self.encoder.batches(jobs, batch_size, self.batch_bytes)
+        else:
+            batches = self.iter_batches(jobs, batch_size)
+        if output_format == "upload" and self.concurrency > 1:
+            # parse the next batch while earlier ones are still uploading
+            with PipelinedUploader(self.back_channel, concurrency=self.concurrency, sizes=self.sizes, bisector=self.bisector) as uploader:
+                for batch in batches:
+                    count += len(batch)
+                    uploader.submit(batch, on_success=acknowledge)
+                    if self.dedup:
+                        self.dedup.commit()
+            failed = uploader.failed_batches
+        else:
+            for batch in batches:
+                count += len(batch)
+                if self.generate_output(batch, output_format) is False:
+                    failed += 1
+                elif acknowledge:
+                    acknowledge(batch)
+        if self.dedup:
+            self.dedup.commit()
+        return count, failed
+
+    def iter_jobs(self, lines) -> Iterator[dict]:
+        """Lazily convert an iterable of sacct lines into job dictionaries.
+
+        The first line is treated as the pipe-delimited header.
+        """
+        if self.verbose:
+            lines = self.echo_lines(lines)
+        return self.convert_rows(split_rows(lines))
+
+    @staticmethod
+    def echo_lines(lines) -> Iterator[str]:
+        for line in lines:
+            click.echo(f"\n{line.strip()}")
+            yield line
+
+    def convert_rows(self, rows) -> Iterator[dict]:
+        """Lazily convert ``(index, parts)`` rows into job dictionaries."""
+        for index, parts in rows:
+            job = self.convert(index, parts)
+            if job:
+                yield job
+
+    @staticmethod
+    def iter_batches(jobs, batch_size: int) -> Iterator[list]:
+        """Group jobs into lists of at most ``batch_size``, yielding each as it fills."""
+        buffer = []
+        for job in jobs:
+            buffer.append(job)
+            if len(buffer) >= batch_size:
+                yield buffer
+                buffer = []
+        if len(buffer) > 0:
+            yield buffer
 
     def get_metadata(self) -> bool:
         """Fetch repository and allocation metadata."""
@@ -631,18 +968,69 @@ class SlurmImporter(GraphQlMixin):
                     v = v * 1073741824
                 self._clusters[name][k] = v
 
+        self.set_metadata(self._allocid, self._clusters)
+
         return True
 
+    def get_metadata_state(self) -> tuple:
+        """The fetched metadata, in a picklable form for ``set_metadata`` in another process."""
+        return self._allocid, self._clusters
+
+    def set_metadata(self, allocid: dict, clusters: dict) -> None:
+        """Use already fetched allocations and clusters, building the lookup tables from them."""
+        self._allocid = allocid
+        self._alloc_index = self.build_alloc_index(allocid)
+        self._clusters = clusters
+        self._capacity = self.build_capacity(clusters)
+
+    def build_capacity(self, clusters: dict) -> dict:
+        """Precompute the capacity record of every (partition, high-memory GB or None) pair."""
+        node_classes = [None] + sorted(set(self.HIGH_MEMORY_NODES.values()))
+        capacity = {}
+        for name, cluster in clusters.items():
+            for mem_gb in node_classes:
+                capacity[(name, mem_gb)] = ClusterCapacity(
+                    name=name,
+                    cpu=cluster.get("cpu"),
+                    gpu=cluster.get("gpu"),
+                    mem=cluster.get("mem") if mem_gb is None else mem_gb * 1073741824,
+                )
+        return capacity
+
+    @staticmethod
+    def build_alloc_index(allocid: dict) -> dict:
+        """Precompute sorted epoch boundaries of every allocation period for bisect lookups."""
+        index = {}
+        for key, time_ranges in allocid.items():
+            periods = sorted((t[0].timestamp(), t[1].timestamp(), _id) for t, _id in time_ranges.items())
+            max_ends = []
+            for start, end, _ in periods:
+                if max_ends and start < max_ends[-1]:
+                    logger.warning(f"{key} has overlapping allocations starting at {start}")
+                max_ends.append(max(end, max_ends[-1]) if max_ends else end)
+            index[key] = AllocationIndex(
+                starts=[p[0] for p in periods],
+                ends=[p[1] for p in periods],
+                max_ends=max_ends,
+                ids=[p[2] for p in periods],
+            )
+        return index
+
     def get_alloc_id(self, facility: str, repo: str, cluster: str, time) -> str:
-        """Get allocation ID for a given facility, repo, cluster and time."""
-        key = (facility, repo, cluster)
-        if key in self._allocid:
-            time_ranges = self._allocid[key]
-            for t, _id in time_ranges.items():
-                logger.trace(f"Matching {t[0].isoformat()} <= {time.in_timezone(_now.timezone).isoformat()} < {t[1].isoformat()}?")
-                if time >= t[0] and time < t[1]:
-                    logger.trace(f"Found match, returning alloc id {_id}")
-                    return _id
+        """Get allocation ID for a given facility, repo, cluster and time.
+
+        ``time`` is an epoch in seconds; DateTime objects are also accepted.
+        """
+        if not isinstance(time, (int, float)):
+            time = time.timestamp()
+        index = self._alloc_index.get((facility, repo, cluster))
+        if index is not None:
+            i = bisect_right(index.starts, time) - 1
+            while i >= 0 and index.max_ends[i] > time:
+                if index.ends[i] > time:
+                    logger.trace("Found match for {} at {}, returning alloc id {}", (facility, repo, cluster), time, index.ids[i])
+                    return index.ids[i]
+                i -= 1
         raise Exception(f"could not determine alloc_id for {facility}:{repo} at {cluster} at timestamp {time}")
 
     def generate_output(self, jobs: list, destination: str):
@@ -656,29 +1044,46 @@ class SlurmImporter(GraphQlMixin):
                 raise NotImplementedError(f"unsupported output {destination}")
         except Exception as e:
             logger.exception(f"generation failed: {e}")
+            return False
 
     def upload_jobs(self, jobs: list) -> bool:
-        """Upload jobs to the GraphQL service."""
-        import_gql = gql("""
-            mutation jobsImport($jobs: [Job!]!) {
-                jobsImport(jobs: $jobs) {
-                    insertedCount
-                    upsertedCount
-                    modifiedCount
-                    deletedCount
-                }
-            }
-        """)
+        """Upload jobs to the GraphQL service.
+
+        With a bisector, a failed batch is retried in halves; returns False
+        if some of its jobs could still not be uploaded.
+        """
+        try:
+            self.upload_batch(jobs)
+        except Exception as e:
+            if self.bisector is None:
+                raise
+            logger.warning(f"upload of {len(jobs)} jobs failed, retrying in halves: {e}")
+            return self.bisector.retry(self.upload_retried, jobs, e)
+        return True
+
+    def upload_retried(self, jobs: list) -> None:
+        self.upload_batch(jobs)
+        if self._uploaded:
+            # a failing callback must not make the bisector upload the jobs again
+            try:
+                self._uploaded(jobs)
+            except Exception as e:
+                logger.exception(f"could not record the upload of {len(jobs)} jobs: {e}")
+
+    def upload_batch(self, jobs: list) -> None:
         logger.trace(f"Uploading {len(jobs)} jobs...")
         s = timer()
-        result = self.back_channel.execute(import_gql, {"jobs": jobs})["jobsImport"]
+        try:
+            result = self.back_channel.execute(JOBS_IMPORT_GQL, {"jobs": jobs}, **execute_args(jobs))["jobsImport"]
+        except Exception:
+            if self.sizes:
+                self.sizes.record(len(jobs), timer() - s, failed=True)
+            raise
         e = timer()
         duration = e - s
-        logger.info(
-            f"imported jobs Inserted={result['insertedCount']}, Upserted={result['upsertedCount']}, "
-            f"Deleted={result['deletedCount']}, Modified={result['modifiedCount']} in {duration:,.02f}s"
-        )
-        return True
+        if self.sizes:
+            self.sizes.record(len(jobs), duration)
+        logger.info(upload_summary(result, duration, jobs))
 
     def output_json(self, jobs: list, indent: int = 2):
         """Output jobs as JSON."""
@@ -703,89 +1108,59 @@ class SlurmImporter(GraphQlMixin):
                 nodes.append(f"{prefix}{int(part):03d}")
         return nodes
 
-    def convert(self, index: dict, parts: list, default_facility: str = "shared", default_repo: str = "default") -> Optional[dict]:
-        """Convert a line of sacct output to a job dictionary."""
-
-        def conv(s, fx, default=None):
-            try:
-                return fx(s)
-            except:
-                return default
-
-        def kilos_to_int(s: str) -> int:
-            m = re.match(r"(^[0-9.]+)([KMG])?", s.upper())
-            if m:
-                mul = 1
-                g = m.group(2)
-                if g:
-                    p = "KMG".find(g)
-                    if p >= 0:
-                        mul = math.pow(2, (p + 1) * 10)
-                    else:
-                        raise Exception("Can't handle multiplier=%s for value=%s" % (g, s))
-                return int(float(m.group(1)) * mul)
-            else:
-                raise Exception("Can't parse %s" % s)
-
-        def calc_resource_hours(startTs, endTs, tres: str, cluster: dict, alloc_nodes: Optional[int], ncpus: Optional[int], nodelist: Optional[str]) -> tuple:
-            elapsed_secs = (endTs - startTs).total_seconds()
-            # min time
-            if elapsed_secs <= 0:
-                elapsed_secs = 1.0
-            # determine maximal amounts
-            # if a single node, then divide all metrics by the number of nodes
-            used = {}
-            if tres != "":
-                for x in tres.split(","):
-                    k, v = x.split("=")
-                    if "gpu" in k:
-                        k = "gpu"
-                    if alloc_nodes > 0:
-                        used[k] = kilos_to_int(v) * 1.0 / alloc_nodes
-
-            # Adjust cluster memory for high-memory nodes
-            adjusted_cluster = cluster.copy()
-            if nodelist:
-                parsed_nodes = self.parse_slurm_nodelist(nodelist)
-                high_mem_nodes = [n for n in parsed_nodes if n in self.HIGH_MEMORY_NODES]
-                if high_mem_nodes:
-                    mem_gb = self.HIGH_MEMORY_NODES[high_mem_nodes[0]]
-                    adjusted_cluster["mem"] = mem_gb * 1073741824
-                    logger.info(f"    Adjusted memory for high-mem node {high_mem_nodes[0]}: {mem_gb}GB")
-
-            # if node is exclusive
-            # max % of cpu, mem or gpu's for servers
-            ratios = {}
-            max_ratio = 0
-            for resource in ("cpu", "gpu", "mem"):
-                if resource in used:
-                    ratios[resource] = used[resource] / adjusted_cluster[resource]
-                    if ratios[resource] > max_ratio:
-                        max_ratio = ratios[resource]
-                    logger.debug(f"    {resource}: used {used[resource]} / {adjusted_cluster[resource]} -> {ratios[resource]:.5}")
+    def high_memory_node(self, nodelist: Optional[str]) -> Optional[str]:
+        """Return the first node of ``nodelist`` listed in HIGH_MEMORY_NODES, if any."""
+        return self._high_memory_hosts.first_member(nodelist) if nodelist else None
+
+    def calc_resource_hours(self, startTs: int, endTs: int, tres: str, cluster: ClusterCapacity, alloc_nodes: Optional[int], ncpus: Optional[int], nodelist: Optional[str]) -> tuple:
+        """Compute the resource hours and elapsed seconds of a job on ``cluster``."""
+        elapsed_secs = float(endTs - startTs)
+        # min time
+        if elapsed_secs <= 0:
+            elapsed_secs = 1.0
+
+        # Use the capacity of high-memory nodes where the job ran on one
+        high_mem_node = self.high_memory_node(nodelist)
+        if high_mem_node:
+            mem_gb = self.HIGH_MEMORY_NODES[high_mem_node]
+            cluster = self._capacity[(cluster.name, mem_gb)]
+            if self.debug:
+                logger.debug(f"    Adjusted memory for high-mem node {high_mem_node}: {mem_gb}GB")
+
+        # determine maximal amounts
+        # if a single node, then divide all metrics by the number of nodes
+        # if node is exclusive
+        # max % of cpu, mem or gpu's for servers
+        max_ratio = 0
+        if alloc_nodes > 0:
+            for resource, amount in zip(("cpu", "gpu", "mem"), parse_alloc_tres(tres)):
+                if amount is not None:
+                    used = amount * 1.0 / alloc_nodes
+                    ratio = used / cluster.get(resource)
+                    if ratio > max_ratio:
+                        max_ratio = ratio
+                    if self.debug:
+                        logger.debug(f"    {resource}: used {used} / {cluster.get(resource)} -> {ratio:.5}")
+        resource_time = elapsed_secs * alloc_nodes * max_ratio * cluster.cpu / 3600.0
+        if self.verbose:
             compute_time = elapsed_secs * ncpus / 3600.0
-            resource_time = elapsed_secs * alloc_nodes * max_ratio * adjusted_cluster["cpu"] / 3600.0
-            if self.verbose:
-                click.echo(f"  calc time: {elapsed_secs}s compute_hours: {resource_time:.5} core_hours: {compute_time:.5}")
-            return resource_time, elapsed_secs
+            click.echo(f"  calc time: {elapsed_secs}s compute_hours: {resource_time:.5} core_hours: {compute_time:.5}")
+        return resource_time, elapsed_secs
 
+    def convert(self, index: dict, parts: list, default_facility: str = "shared", default_repo: str = "default") -> Optional[dict]:
+        """Convert a line of sacct output to a job dictionary."""
         d = {field: parts[idx] for field, idx in index.items()}
-        facility = default_facility
-        repo = default_repo
-        try:
-            facility, repo = d["Account"].split(":")
-        except Exception:
-            logger.warning(f"could not determine facility and repo from {d['Account']}")
 
-        startTs = parse_datetime(int(d["Start"]), force_tz=True)
-        endTs = parse_datetime(int(d["End"]), force_tz=True)
+        # epochs, as sacct is run with SLURM_TIME_FORMAT=%s
+        startTs = int(d["Start"])
+        endTs = int(d["End"])
 
         if d["Partition"] in self._clusters:
             alloc_nodes = kilos_to_int(d["AllocNodes"])
             ncpus = conv(d["NCPUS"], int, 0)
-            resource_hours, elapsed_secs = calc_resource_hours(
+            resource_hours, elapsed_secs = self.calc_resource_hours(
                 startTs=startTs, endTs=endTs, tres=d["AllocTRES"],
-                alloc_nodes=alloc_nodes, ncpus=ncpus, cluster=self._clusters[d["Partition"]],
+                alloc_nodes=alloc_nodes, ncpus=ncpus, cluster=self._capacity[(d["Partition"], None)],
                 nodelist=d.get("NodeList")
             )
         else:
@@ -795,6 +1170,17 @@ class SlurmImporter(GraphQlMixin):
         if resource_hours == 0.0:
             return None
 
+        return self.make_job(d, startTs, endTs, resource_hours, default_facility=default_facility, default_repo=default_repo)
+
+    def make_job(self, d: dict, startTs: int, endTs: int, resource_hours: float, default_facility: str = "shared", default_repo: str = "default") -> Optional[dict]:
+        """Build the jobsImport record for a sacct row with non-zero resource hours."""
+        facility = default_facility
+        repo = default_repo
+        try:
+            facility, repo = d["Account"].split(":")
+        except Exception:
+            logger.warning(f"could not determine facility and repo from {d['Account']}")
+
         allocId = None
         try:
             allocId = self.get_alloc_id(facility, repo, d["Partition"], startTs)
@@ -819,13 +1205,188 @@ class SlurmImporter(GraphQlMixin):
             "username": d["User"],
             "allocationId": allocId,
             "qos": qos,
-            "startTs": str(startTs.in_tz("UTC")).replace(" ", "T").replace("+00:00", ".000Z"),
-            "endTs": str(endTs.in_tz("UTC")).replace(" ", "T").replace("+00:00", ".000Z"),
+            "startTs": format_epoch_utc(startTs),
+            "endTs": format_epoch_utc(endTs),
             "resourceHours": resource_hours,
         }
         return out
 
 
+# ============================================================================
+# SlurmSync Command
+# ============================================================================
+
+@coact.command(name='slurmsync')
+@common_options
+@graphql_options
+@click.option('--date', default=lambda: pdl.now().format('YYYY-MM-DD'), help='Import jobs from this date (default: today)')
+@click.option('--starttime', default='00:00:00', help='Start time of job imports')
+@click.option('--endtime', default='23:59:59', help='End time of job imports')
+@click.option('--sacct', 'sacct_bin_path', default='sacct', help='Path to the sacct binary')
+@sacct_options
+@click.option('--batch', default=150000, type=int, help='Batch upload size')
+@click.option('--concurrency', default=1, type=click.IntRange(min=1), help='Number of upload batches kept in flight (1 uploads synchronously)')
+@click.option('--raw-archive', type=click.Path(dir_okay=False, writable=True), default=None, help='Also write the raw sacct dump to this file')
+@click.option('--remapped-archive', type=click.Path(dir_okay=False, writable=True), default=None, help='Also write the remapped sacct dump to this file')
+@click.option('--state', type=click.Path(dir_okay=False), default=None, help='Incremental state file; only import jobs since the last import recorded in it')
+@click.option('--overlap', default=DEFAULT_OVERLAP, type=click.IntRange(min=0), help='Seconds before the last imported end time to query again in incremental mode')
+@click.option(
+    '--output',
+    type=click.Choice(['json', 'upload']),
+    default='upload',
+    help='Output format'
+)
+@click.option(
+    '--exit-on-error',
+    is_flag=True,
+    default=False,
+    help='Terminate if cannot parse data'
+)
+@dedup_options
+@encoding_options
+@retry_options
+@spool_option
+@click.pass_context
+def slurm_sync(ctx, verbose, username, password_file, date, starttime, endtime, sacct_bin_path, slices, clusters, workers, batch, concurrency, raw_archive, remapped_archive, state, overlap, output, exit_on_error, dedup_store_path, full_resync, dedup_retention_days, compress, batch_bytes, target_latency, dead_letter, spool_path):
+    """Dumps, remaps and imports slurm jobs in a single process."""
+    configure_logging_from_verbose(verbose)
+    ctx.obj['verbose'] = verbose
+
+    importer = SlurmImporter(
+        username=username,
+        password_file=password_file,
+        debug=verbose >= 2,
+        exit_on_error=exit_on_error,
+        concurrency=concurrency,
+        state=IncrementalState(state, date, overlap=overlap) if state else None,
+        dedup=dedup_store(dedup_store_path, full_resync, dedup_retention_days),
+        spool=Spool(spool_path) if spool_path else None,
+        **upload_settings(batch, compress, batch_bytes, target_latency, dead_letter)
+    )
+    sync = SlurmSync(
+        importer=importer,
+        remapper=SlurmRemapper(verbose=verbose > 0),
+        sacct_bin_path=sacct_bin_path,
+        raw_archive=raw_archive,
+        remapped_archive=remapped_archive,
+        sacct_options={'slices': slices, 'clusters': clusters, 'workers': workers}
+    )
+    sync.run(date, starttime, endtime, output, batch)
+    if importer.dedup:
+        importer.dedup.close()
+
+
+class SlurmSync:
+    """
+    Runs slurmdump, slurmremap and slurmimport as generator stages of one process.
+
+    Each sacct line is split once; the remapper and importer share the parsed
+    rows. The raw and remapped dumps that import-jobs.sh tees to disk can
+    optionally be written as side outputs; in incremental mode each run
+    writes its own, suffixed with the time it starts from, since the runs
+    overlap.
+    """
+
+    def __init__(self, importer: SlurmImporter, remapper: SlurmRemapper, sacct_bin_path: str = "sacct", raw_archive: Optional[str] = None, remapped_archive: Optional[str] = None, sacct_options: Optional[dict] = None):
+        self.importer = importer
+        self.remapper = remapper
+        self.sacct_bin_path = sacct_bin_path
+        # slices, clusters and workers passed on to run_sacct
+        self.sacct_options = sacct_options or {}
+        self.raw_archive = raw_archive
+        self.remapped_archive = remapped_archive
+
+    @staticmethod
+    def tee_lines(lines, f) -> Iterator[str]:
+        for line in lines:
+            f.write(line)
+            f.write("\n")
+            yield line
+
+    @staticmethod
+    def tee_rows(rows, f) -> Iterator[tuple[dict, list]]:
+        header = False
+        for index, parts in rows:
+            if not header:
+                f.write("|".join(sorted(index, key=index.get)) + "\n")
+                header = True
+            f.write("|".join(parts).strip() + "\n")
+            yield index, parts
+
+    def jobs(self, lines, raw=None, remapped=None) -> Iterator[dict]:
+        """Chain the split, remap and convert stages over sacct ``lines``."""
+        if raw is not None:
+            lines = self.tee_lines(lines, raw)
+        rows = self.remapper.remap_rows(split_rows(lines))
+        if remapped is not None:
+            rows = self.tee_rows(rows, remapped)
+        return self.importer.convert_rows(rows)
+
+    def run(self, date: str, start_time: str, end_time: str, output_format: str, batch_size: int) -> int:
+        """Import the jobs of ``date`` between ``start_time`` and ``end_time``; returns the number of jobs."""
+        raw_archive, remapped_archive = self.raw_archive, self.remapped_archive
+        if self.importer.state:
+            start_time = self.importer.state.start_time(start_time)
+            logger.info(f"incremental import of {date} from {start_time}")
+            suffix = start_time.replace(":", "")
+            raw_archive = raw_archive and f"{raw_archive}.{suffix}"
+            remapped_archive = remapped_archive and f"{remapped_archive}.{suffix}"
+        self.importer.connect()
+        lines = run_sacct(
+            sacct_bin_path=self.sacct_bin_path,
+            date=date,
+            start_time=start_time,
+            end_time=end_time,
+            verbose=self.remapper.verbose,
+            **self.sacct_options
+        )
+        with ExitStack() as stack:
+            raw = stack.enter_context(open(raw_archive, "w")) if raw_archive else None
+            remapped = stack.enter_context(open(remapped_archive, "w")) if remapped_archive else None
+            return self.importer.output(self.jobs(lines, raw=raw, remapped=remapped), output_format, batch_size)
+
+
+# ============================================================================
+# SlurmDrain Command
+# ============================================================================
+
+@coact.command(name='slurmdrain')
+@common_options
+@graphql_options
+@click.option('--spool', 'spool_path', type=click.Path(exists=True, file_okay=False), required=True, help='Spool directory written by slurmimport or slurmsync --spool')
+@click.option('--batch', default=150000, type=int, help='Batch upload size')
+@click.option('--concurrency', default=1, type=click.IntRange(min=1), help='Number of upload batches kept in flight (1 uploads synchronously)')
+@click.option('--status', is_flag=True, default=False, help='Only print the depth of the spool and the metrics of its last drain')
+@encoding_options
+@retry_options
+@click.pass_context
+def slurm_drain(ctx, verbose, username, password_file, spool_path, batch, concurrency, status, compress, batch_bytes, target_latency, dead_letter):
+    """Uploads the jobs left in a spool, e.g. by an import that failed."""
+    configure_logging_from_verbose(verbose)
+    spool = Spool(spool_path)
+    if status:
+        metrics = {}
+        metrics_path = os.path.join(spool_path, "metrics.json")
+        if os.path.exists(metrics_path):
+            with open(metrics_path) as f:
+                metrics = json.load(f)
+        metrics["depth_records"], metrics["depth_bytes"] = spool.depth()
+        click.echo(json.dumps(metrics, indent=2))
+        return
+
+    importer = SlurmImporter(
+        username=username,
+        password_file=password_file,
+        concurrency=concurrency,
+        **upload_settings(batch, compress, batch_bytes, target_latency, dead_letter)
+    )
+    importer.back_channel = importer.connect_graph_ql(username=username, password_file=password_file, timeout=300)
+    drainer = SpoolDrainer(spool, lambda chunk: importer.send(chunk, "upload", batch)[1], chunk_records=batch * concurrency)
+    failed = drainer.run()
+    if failed:
+        raise Exception(f"{failed} batches failed to upload from {spool_path}")
+
+
 # ============================================================================
 # SlurmRecalculate Command
 # ============================================================================
@@ -847,6 +1408,11 @@ def slurm_recalculate(ctx, date, verbose, username, password_file):
         timeout=300
     )
 
+    recalculate_date(back_channel, date)
+
+
+def recalculate_date(back_channel, date: str) -> float:
+    """Run ``jobsAggregateForDate`` for ``date``; returns the duration in seconds."""
     s = timer()
     result = back_channel.execute(
         gql('mutation update { jobsAggregateForDate(thedate: "' + date + 'T08:00:00.0000Z" ){ status } }')
@@ -855,6 +1421,155 @@ def slurm_recalculate(ctx, date, verbose, username, password_file):
     e = timer()
     duration = e - s
     logger.info(f"recalculated jobs in {duration:,.02f}s")
+    return duration
+
+
+# ============================================================================
+# SlurmBackfill Command
+# ============================================================================
+
+@coact.command(name='slurmbackfill')
+@common_options
+@graphql_options
+@click.option('--from', 'from_date', required=True, help='First date to import (YYYY-MM-DD)')
+@click.option('--to', 'to_date', required=True, help='Last date to import (YYYY-MM-DD)')
+@click.option('--concurrency', default=4, type=click.IntRange(min=1), help='Number of days imported concurrently')
+@click.option('--manifest', type=click.Path(dir_okay=False), default=None, help='File recording finished days, to resume an interrupted backfill (default: slurmbackfill-FROM-TO.json)')
+@click.option('--sacct', 'sacct_bin_path', default='sacct', help='Path to the sacct binary')
+@click.option('--batch', default=150000, type=int, help='Batch upload size')
+@click.option('--raw-archive-dir', type=click.Path(file_okay=False), default=None, help='Also write the raw sacct dump of each day to this directory')
+@click.option('--remapped-archive-dir', type=click.Path(file_okay=False), default=None, help='Also write the remapped sacct dump of each day to this directory')
+@click.option('--no-recalculate', is_flag=True, default=False, help='Do not run jobsAggregateForDate for the imported days')
+@click.pass_context
+def slurm_backfill(ctx, verbose, username, password_file, from_date, to_date, concurrency, manifest, sacct_bin_path, batch, raw_archive_dir, remapped_archive_dir, no_recalculate):
+    """Imports and recalculates the slurm jobs of a range of days."""
+    configure_logging_from_verbose(verbose)
+    ctx.obj['verbose'] = verbose
+
+    start, end = pdl.parse(from_date), pdl.parse(to_date)
+    if end < start:
+        raise click.UsageError(f"--to {to_date} is before --from {from_date}")
+    dates = [d.format('YYYY-MM-DD') for d in pdl.interval(start, end).range('days')]
+    for directory in (raw_archive_dir, remapped_archive_dir):
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    backfill = SlurmBackfill(
+        username=username,
+        password_file=password_file,
+        manifest=manifest or f"slurmbackfill-{from_date}-{to_date}.json",
+        concurrency=concurrency,
+        day_options={
+            'sacct_bin_path': sacct_bin_path,
+            'batch_size': batch,
+            'raw_archive_dir': raw_archive_dir,
+            'remapped_archive_dir': remapped_archive_dir,
+        },
+        recalculate=not no_recalculate
+    )
+    if not backfill.run(dates):
+        ctx.exit(1)
+
+
+def backfill_day(date: str, username: str, password_file: str, sacct_bin_path: str = "sacct", batch_size: int = 150000, raw_archive_dir: Optional[str] = None, remapped_archive_dir: Optional[str] = None) -> int:
+    """Dump, remap and upload the jobs of one day; returns the number of jobs uploaded.
+
+    Runs in a worker process of ``SlurmBackfill``, so only takes picklable arguments.
+    """
+    importer = SlurmImporter(username=username, password_file=password_file)
+    sync = SlurmSync(
+        importer=importer,
+        remapper=SlurmRemapper(),
+        sacct_bin_path=sacct_bin_path,
+        raw_archive=os.path.join(raw_archive_dir, date) if raw_archive_dir else None,
+        remapped_archive=os.path.join(remapped_archive_dir, date) if remapped_archive_dir else None
+    )
+    count = sync.run(date, "00:00:00", "23:59:59", "upload", batch_size)
+    if importer.failed_batches:
+        raise Exception(f"{importer.failed_batches} batches of {date} failed to upload")
+    return count
+
+
+class SlurmBackfill(GraphQlMixin):
+    """
+    Imports a range of days with a pool of worker processes, one day per task.
+
+    Finished days are checkpointed to a JSON manifest::
+
+        {"days": {"2024-01-01": {"jobs": 12345, "duration": 67.8, "recalculated": true}, ...}}
+
+    so that a rerun skips the days already imported, and only recalculates
+    the ones whose ``jobsAggregateForDate`` has not completed yet.
+    """
+
+    def __init__(self, username: str, password_file: str, manifest: str, concurrency: int = 4, day_options: Optional[dict] = None, recalculate: bool = True):
+        self.username = username
+        self.password_file = password_file
+        self.manifest = manifest
+        self.concurrency = concurrency
+        self.day_options = day_options or {}
+        self.recalculate = recalculate
+        self.days = {}
+        if os.path.exists(manifest):
+            with open(manifest) as f:
+                self.days = json.load(f).get("days", {})
+            logger.info(f"resuming backfill from {manifest}: {len(self.days)} days already imported")
+
+    def save(self) -> None:
+        tmp = f"{self.manifest}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"days": self.days}, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.manifest)
+
+    def run(self, dates: Sequence[str]) -> bool:
+        """Import and recalculate ``dates``; returns False if any day failed."""
+        pending = [d for d in dates if d not in self.days]
+        failed = self.import_days(pending)
+        if self.recalculate:
+            self.recalculate_days([d for d in dates if d in self.days and not self.days[d].get("recalculated")])
+        if failed:
+            logger.error(f"backfill of {len(failed)} days failed: {', '.join(sorted(failed))}")
+        return not failed
+
+    def import_days(self, dates: Sequence[str]) -> list[str]:
+        """Import ``dates`` concurrently, checkpointing each finished day; returns the failed dates."""
+        if not dates:
+            return []
+        logger.info(f"backfilling {len(dates)} days with {self.concurrency} workers")
+        failed = []
+        with ProcessPoolExecutor(max_workers=self.concurrency) as pool:
+            started = {}
+            futures = {}
+            for date in dates:
+                started[date] = timer()
+                futures[pool.submit(backfill_day, date, self.username, self.password_file, **self.day_options)] = date
+            for future in as_completed(futures):
+                date = futures[future]
+                try:
+                    count = future.result()
+                except Exception as e:
+                    logger.error(f"backfill of {date} failed: {e}")
+                    failed.append(date)
+                    continue
+                duration = timer() - started[date]
+                self.days[date] = {"jobs": count, "duration": round(duration, 3), "recalculated": False}
+                self.save()
+                logger.info(f"backfilled {count:,} jobs of {date} ({len(self.days)} days done)")
+        return failed
+
+    def recalculate_days(self, dates: Sequence[str]) -> None:
+        """Run ``jobsAggregateForDate`` once per day, in date order."""
+        if not dates:
+            return
+        back_channel = self.connect_graph_ql(
+            username=self.username,
+            password_file=self.password_file,
+            timeout=300
+        )
+        for date in sorted(dates):
+            recalculate_date(back_channel, date)
+            self.days[date]["recalculated"] = True
+            self.save()
 
 
 # ============================================================================
@@ -872,6 +1587,17 @@ def slurm_recalculate(ctx, date, verbose, username, password_file):
 @click.option('--influxdb-username', default=None, help='InfluxDB username')
 @click.option('--influxdb-password', default=None, help='InfluxDB password')
 @click.option('--influxdb-database', default='coact', help='InfluxDB database name (default: coact)')
+@click.option('--daemon', is_flag=True, default=False, help='Keep running, evaluating overages every --interval seconds over one GraphQL session')
+@click.option('--interval', type=click.FloatRange(min=1), default=300, help='Seconds between evaluations with --daemon')
+@click.option('--jitter', type=click.FloatRange(min=0), default=5, help='Delay each evaluation by up to this many random seconds with --daemon')
+@click.option('--metadata-ttl', type=click.FloatRange(min=0), default=3600, help='Seconds to reuse the facility purchases and repo allocations for with --daemon')
+@click.option('--sacctmgr-batch/--no-sacctmgr-batch', default=True, help='Apply the job blocking changes of an evaluation through one sacctmgr instead of one per allocation')
+@click.option('--assoc-cache', 'assoc_cache_path', type=click.Path(dir_okay=False), default=None, help='File caching the hold states of the associations between runs (--daemon caches them in memory regardless)')
+@click.option('--reconcile-interval', type=click.FloatRange(min=0), default=3600, help='Seconds after which the cached hold states are read from sacctmgr again')
+@click.option('--local-windows', is_flag=True, default=False, help='Compute the usage windows from sacct instead of asking coact (requires --local-windows-state)')
+@click.option('--verify-local-windows', is_flag=True, default=False, help='Compute the usage windows from sacct as well, logging where they differ from those of coact, which are used')
+@click.option('--sacct', 'sacct_bin_path', default='sacct', help='Path to the sacct binary, for --local-windows')
+@click.option('--local-windows-state', 'local_state_path', default=None, help='File to keep the local usage windows in; the first run fills it from sacct with every job of the longest window, one query per day')
 @click.pass_context
 def overage(
         ctx,
@@ -885,52 +1611,115 @@ def overage(
         influxdb_url: str,
         influxdb_username: str,
         influxdb_password: str,
-        influxdb_database: str
+        influxdb_database: str,
+        daemon: bool,
+        interval: float,
+        jitter: float,
+        metadata_ttl: float,
+        sacctmgr_batch: bool,
+        assoc_cache_path: Optional[str],
+        reconcile_interval: float,
+        local_windows: bool,
+        verify_local_windows: bool,
+        sacct_bin_path: str,
+        local_state_path: Optional[str]
     ):
     """Recalculate the usage numbers from slurm jobs in Coact."""
     configure_logging_from_verbose(verbose)
     ctx.obj['verbose'] = verbose
 
+    local = None
+    if local_windows or verify_local_windows:
+        # without saved sums every run would query sacct for the whole longest window
+        if not local_state_path:
+            raise click.UsageError("--local-windows and --verify-local-windows require --local-windows-state")
+        from .rolling_usage import LocalUsage
+        local = LocalUsage(SlurmImporter(username=username, password_file=password_file), windows=list(windows), sacct_bin_path=sacct_bin_path, state=local_state_path)
+
     # create data collection object
     usages = FacilityUsage(
         username=username,
         password_file=password_file,
         windows=list(windows),
         threshold=threshold,
-        dry_run=dry_run
+        dry_run=dry_run,
+        metadata_ttl=metadata_ttl if daemon else 0,
+        assoc_cache=AssocStateCache(assoc_cache_path, reconcile_interval) if daemon or assoc_cache_path else None,
+        local=local,
+        verify_local=verify_local_windows
     )
+    influxdb = InfluxWriter(influxdb_url, influxdb_username, influxdb_password, influxdb_database) if influxdb_url is not None else None
 
-    # iterate and collect data, initiate toggle as needed
+    if not daemon:
+        evaluate_overage(usages, date, dry_run, influxdb, batch=sacctmgr_batch)
+        return
+
+    usages.back_channel = PersistentSession(usages.connect_graph_ql(username=username, password_file=password_file, timeout=300))
+    scheduler = Scheduler(interval, jitter=jitter)
+    scheduler.stop_on_signals()
+    logger.info(f"evaluating overages every {interval:,.0f}s")
+    try:
+        scheduler.run(lambda: evaluate_overage(usages, pdl.now().format('YYYY-MM-DD'), dry_run, influxdb, batch=sacctmgr_batch))
+    finally:
+        usages.back_channel.close()
+    logger.info(f"stopped after {scheduler.cycles} evaluations, {scheduler.overruns} overruns and {scheduler.failures} failures")
+
+
+def evaluate_overage(usages: "FacilityUsage", date: str, dry_run: bool, influxdb: Optional["InfluxWriter"] = None, batch: bool = True) -> list:
+    """Collect the overage points, toggle job blocking where the held state needs to change, and record them."""
+    s = timer()
     data = []
+    cache = usages.assoc_cache
+    blocking = JobBlockingBatch(execute=not dry_run, cache=cache) if batch else None
     for point in usages.get(date):
         data.append(point)
         # Toggle job blocking only if held state needs to change
         if point['held'] is not None and point['change']:
-            toggle_job_blocking(execute=not dry_run, point=point)
+            if blocking is not None:
+                blocking.add(point)
+            elif toggle_job_blocking(execute=not dry_run, point=point):
+                if cache is not None and not dry_run:
+                    cache.record(f"{point['facility']}:_regular_@{point['cluster']}", point['over'])
+            elif cache is not None:
+                cache.suspect()
+    if blocking is not None:
+        blocking.apply()
 
     # Bulk send all points to InfluxDB using raw requests
-    if influxdb_url is not None and len(data) > 0:
-
+    if influxdb is not None and len(data) > 0:
+        influxdb.write(data)
+    logger.info(f"evaluated {len(data)} overage points in {timer() - s:,.02f}s")
+    return data
+
+
+class InfluxWriter:
+    """Writes overage points to InfluxDB, keeping the HTTP connection open between writes."""
+
+    def __init__(self, url: str, username: Optional[str] = None, password: Optional[str] = None, database: str = 'coact'):
+        # Parse URL
+        parsed_url = urlparse(url)
+        self.write_url = f"{parsed_url.scheme or 'http'}://{parsed_url.hostname or 'localhost'}:{parsed_url.port or 8086}/write"
+        self.database = database
+        self.session = requests.Session()
+        # Prepare auth
+        if username is not None and password is not None:
+            self.session.auth = (username, password)
+        logger.debug(f"InfluxDB client initialized: {self.write_url}")
+
+    @staticmethod
+    def lines(data: list) -> list[str]:
         lines = []
         for point in data:
             line = f"allocation_usage,facility={point['facility']},cluster={point['cluster']},qos={point['qos']},window_mins={point['window_mins']} "
             line += f"held={str(point['held']).lower()},over={str(point['over']).lower()},change={str(point['change']).lower()},percent_used={float(point['percent_used'])},purchased_nodes={float(point['purchased_nodes']) if point.get('purchased_nodes') is not None else 0.0}"
             lines.append(line)
+        return lines
 
+    def write(self, data: list) -> None:
+        lines = self.lines(data)
         try:
-            # Parse URL
-            parsed_url = urlparse(influxdb_url)
-            write_url = f"{parsed_url.scheme or 'http'}://{parsed_url.hostname or 'localhost'}:{parsed_url.port or 8086}/write"
-
-            # Prepare auth
-            auth = None
-            if influxdb_username is not None and influxdb_password is not None:
-                auth = (influxdb_username, influxdb_password)
-
-            logger.debug(f"InfluxDB client initialized: {write_url}")
-
             # Write data
-            response = requests.post(write_url, params={'db': influxdb_database}, data='\n'.join(lines), auth=auth)
+            response = self.session.post(self.write_url, params={'db': self.database}, data='\n'.join(lines))
             response.raise_for_status()
             logger.info(f"Successfully wrote {len(lines)} points to InfluxDB")
 
@@ -938,8 +1727,8 @@ def overage(
             logger.error(f"Failed to send data to InfluxDB: {e}")
 
 
-def toggle_job_blocking(point: OveragePoint, execute: bool = False) -> bool:
-    """Enable/disable job blocking for overaged allocations."""
+def blocking_command(point: OveragePoint) -> str:
+    """The sacctmgr command setting the node limit of an allocation for its blocking state."""
     template = Template("sacctmgr modify -i account name=$facility:_regular_@$cluster set GrpTRES=node=$nodes")
 
     # Determine node count based on blocking state
@@ -966,9 +1755,14 @@ def toggle_job_blocking(point: OveragePoint, execute: bool = False) -> bool:
         nodes=nodes
     )
 
-    logger.info(f"Job blocking toggle for {facility_usage['facility']}@{facility_usage['cluster']}: nodes={nodes} (over={point['over']}, execute={execute})")
-    cmd = template.safe_substitute(**facility_usage)
-    logger.info(f"Command: {cmd}")
+    logger.info(f"Job blocking toggle for {facility_usage['facility']}@{facility_usage['cluster']}: nodes={nodes} (over={point['over']})")
+    return template.safe_substitute(**facility_usage)
+
+
+def toggle_job_blocking(point: OveragePoint, execute: bool = False) -> bool:
+    """Enable/disable job blocking for overaged allocations."""
+    cmd = blocking_command(point)
+    logger.info(f"Command: {cmd} (execute={execute})")
 
     if execute:
         try:
@@ -983,23 +1777,113 @@ def toggle_job_blocking(point: OveragePoint, execute: bool = False) -> bool:
     return True
 
 
+class JobBlockingBatch:
+    """
+    Job blocking changes collected over an evaluation and applied by one sacctmgr.
+
+    Every ``sacctmgr modify`` is a slurmdbd round trip, so rather than
+    running one per allocation the commands are piped as a script to a
+    single ``sacctmgr -i``. Its output lists the associations it modified
+    (``A = <account>``); the changes missing from it, or all of them when
+    the script fails, are applied one at a time by ``toggle_job_blocking``.
+    The outcome is recorded in the association state ``cache``.
+
+    Example usage:
+        batch = JobBlockingBatch(execute=True)
+        for point in points:
+            batch.add(point)
+        batch.apply()
+    """
+
+    ACCOUNT = re.compile(r"\bA = (\S+)")
+
+    def __init__(self, execute: bool = False, sacctmgr_bin_path: str = "sacctmgr", cache: Optional[AssocStateCache] = None):
+        self.execute = execute
+        self.sacctmgr_bin_path = sacctmgr_bin_path
+        self.cache = cache
+        # the last point per account, as every window yields one
+        self.points: dict[str, OveragePoint] = {}
+
+    def add(self, point: OveragePoint) -> None:
+        self.points[f"{point['facility']}:_regular_@{point['cluster']}"] = point
+
+    def script(self) -> str:
+        """The sacctmgr commands, without the program name and flags, one per line."""
+        lines = []
+        for point in self.points.values():
+            cmd = blocking_command(point).split()
+            lines.append(" ".join(arg for arg in cmd[1:] if arg != "-i"))
+        return "\n".join(lines) + "\nexit\n"
+
+    @classmethod
+    def modified(cls, output: str) -> set[str]:
+        """The accounts that sacctmgr reported as modified."""
+        return {m.group(1) for m in cls.ACCOUNT.finditer(output)}
+
+    def apply(self) -> list[str]:
+        """Apply the collected changes; returns the accounts that could not be changed."""
+        if not self.points:
+            return []
+        script = self.script()
+        logger.info(f"Applying {len(self.points)} job blocking changes in one sacctmgr (execute={self.execute})")
+        for line in script.splitlines():
+            logger.info(f"Command: {line}")
+        if not self.execute:
+            return []
+        remaining = dict(self.points)
+        try:
+            result = subprocess.run([self.sacctmgr_bin_path, "-i"], input=script, capture_output=True, text=True, timeout=300)
+            for line in (result.stdout + result.stderr).splitlines():
+                if line.strip():
+                    logger.debug(f"sacctmgr output: {line.strip()}")
+            for account in self.modified(result.stdout):
+                remaining.pop(account, None)
+        except (OSError, subprocess.SubprocessError) as e:
+            logger.error(f"Failed to run the sacctmgr script: {e}")
+        if remaining:
+            logger.warning(f"{len(remaining)} job blocking changes were not confirmed by sacctmgr; applying them one at a time")
+        failed = [account for account, point in remaining.items() if not toggle_job_blocking(point, execute=True)]
+        if self.cache is not None:
+            for account, point in self.points.items():
+                if account not in failed:
+                    self.cache.record(account, point['over'])
+            if failed:
+                self.cache.suspect()
+        return failed
+
+
+# association accounts of the facility allocations, e.g. lcls:_regular_@ada
+ASSOC_ACCOUNT = re.compile(r"^(?P<f>\S+):(?P<r>\S+)@(?P<c>\S+)$")
+
+
 class FacilityUsage(GraphQlMixin):
     """Handles facility usage calculations and enforcement."""
 
-    def __init__(self, username: str, password_file: str, windows: list, threshold: float, dry_run: bool):
+    def __init__(self, username: str, password_file: str, windows: list, threshold: float, dry_run: bool, metadata_ttl: float = 0, assoc_cache: Optional[AssocStateCache] = None, local: Optional["LocalUsage"] = None, verify_local: bool = False):
         self.username = username
         self.password_file = password_file
         self.windows = windows
         self.threshold = threshold
         self.dry_run = dry_run
+        # seconds for which the facility purchases and repo allocations are reused
+        self.metadata_ttl = metadata_ttl
+        # hold states of the associations, read from sacctmgr when missing
+        self.assoc_cache = assoc_cache
+        # computes the usage windows from sacct instead of asking the server
+        self.local = local
+        # still asks the server, logging where the local windows differ
+        self.verify_local = verify_local
+        self._metadata = None
+        self._metadata_at = None
 
     def get(self, date: str) -> Iterator[OveragePoint]:
         """Run the overage calculation process."""
-        self.back_channel = self.connect_graph_ql(
-            username=self.username,
-            password_file=self.password_file,
-            timeout=300
-        )
+        if self.back_channel is None:
+            self.back_channel = self.connect_graph_ql(
+                username=self.username,
+                password_file=self.password_file,
+                timeout=300
+            )
         logger.debug(f"Fetching usage data for date: {date}")
         data = self.get_data()
         for point in self.overaged(data, threshold=self.threshold):
@@ -1016,24 +1900,54 @@ class FacilityUsage(GraphQlMixin):
             all_windows.append(per_window_template.safe_substitute(minutes=w, key=f"{w:0>6}"))
         logger.trace(f"Window queries: {all_windows}")
 
-        query = "query usage {"
-        query += "\n".join(all_windows) + ",\n"
-        query += "facilities(filter:{}) { name, computepurchases { clustername, purchased } },\n"
-        query += "repos { facility, allocs: currentComputeAllocations { cluster: clustername, start, end } }"
-        query += "\n}"
+        # the metadata changes rarely, so it is only queried again once it expired
+        fetch_metadata = self._metadata is None or timer() - self._metadata_at >= self.metadata_ttl
+        # the local windows replace the server's, unless they are being verified against them
+        query_windows = self.local is None or self.verify_local
+        result = {}
+        if query_windows or fetch_metadata:
+            query = "query usage {"
+            if query_windows:
+                query += "\n".join(all_windows) + ",\n"
+            if fetch_metadata:
+                query += "facilities(filter:{}) { name, computepurchases { clustername, purchased } },\n"
+                query += "repos { facility, allocs: currentComputeAllocations { cluster: clustername, start, end } }"
+            query += "\n}"
+
+            logger.trace(f"GraphQL query: {query}")
+            result = self.back_channel.execute(gql(query))
+            logger.trace(f"GraphQL response: {result}")
+        if fetch_metadata:
+            self._metadata = {"facilities": result.pop("facilities", []), "repos": result.pop("repos")}
+            self._metadata_at = timer()
+            if self.local is not None:
+                self.local.importer.back_channel = self.back_channel
+                self.local.importer.get_metadata()
+        else:
+            logger.debug(f"reusing metadata from {timer() - self._metadata_at:,.0f}s ago")
+        if self.local is not None:
+            self.local.poll()
+            allocations = [(k["facility"].lower(), item["cluster"].lower()) for k in self._metadata["repos"] for item in k["allocs"]]
+            local = self.local.windows(dict.fromkeys(allocations), self.purchased_nodes(self._metadata["facilities"]))
+            if self.verify_local:
+                self.local.verify(local, result)
+            else:
+                result = local
+        return self.format_data({**result, **self._metadata})
 
-        logger.trace(f"GraphQL query: {query}")
-        result = self.back_channel.execute(gql(query))
-        logger.trace(f"GraphQL response: {result}")
-        return self.format_data(result)
+    @staticmethod
+    def purchased_nodes(facilities: list) -> dict:
+        """Purchased nodes per (facility, cluster) from Facility.computepurchases."""
+        fac_purchases = {}
+        for fac in facilities:
+            for cp in fac.get("computepurchases") or []:
+                fac_purchases[(fac["name"].lower(), cp["clustername"].lower())] = cp["purchased"]
+        return fac_purchases
 
     def format_data(self, result: dict) -> dict:
         """Format the raw data for processing."""
         # Build purchased nodes lookup from Facility.computepurchases
-        fac_purchases = {}
-        for fac in result.pop("facilities", []):
-            for cp in fac.get("computepurchases") or []:
-                fac_purchases[(fac["name"].lower(), cp["clustername"].lower())] = cp["purchased"]
+        fac_purchases = self.purchased_nodes(result.pop("facilities", []))
 
         current = {}
         for k in result["repos"]:
@@ -1060,27 +1974,37 @@ class FacilityUsage(GraphQlMixin):
             for c in current[f].keys():
                 list_of_assoc.append(f"{f}:_regular_@{c}")
 
-        cmd = f"sacctmgr show assoc where account={','.join(list_of_assoc)} --noheader -P format=Account,GrpNodes,GrpJobs,MaxJobs"
+        for account, holding in self.hold_states(list_of_assoc).items():
+            m = ASSOC_ACCOUNT.match(account)
+            if m and holding is not None:
+                f, c = m.group("f", "c")
+                if c in current.get(f, {}):
+                    current[f][c]["held"] = holding
+                    logger.trace(f"Set {f}@{c} to {holding}")
+
+        return current
+
+    def hold_states(self, accounts: list) -> dict:
+        """Whether the jobs of each association account are held, from the cache while it is fresh."""
+        if self.assoc_cache is not None and not self.assoc_cache.stale(accounts):
+            logger.debug(f"using cached hold states of {len(accounts)} associations")
+            return {account: self.assoc_cache.held[account] for account in accounts}
+
+        cmd = f"sacctmgr show assoc where account={','.join(accounts)} --noheader -P format=Account,GrpNodes,GrpJobs,MaxJobs"
         logger.trace(f"Getting hold states using '{cmd}'...")
 
+        held = {}
         try:
             for l in subprocess.check_output(cmd.split()).split(b"\n"):
                 this = str(l, encoding="utf-8").strip().split("|")
-                try:
-                    m = re.match(r"^(?P<f>\S+):(?P<r>\S+)@(?P<c>\S+)$", this[0])
-                    holding = True if this[1] == "0" else False
-                    if m:
-                        d = m.groupdict()
-                        f = d["f"]
-                        c = d["c"]
-                        current[f][c]["held"] = holding
-                        logger.trace(f"Set {f}@{c} to {holding}")
-                except Exception:
-                    pass
+                if len(this) > 1 and ASSOC_ACCOUNT.match(this[0]):
+                    held[this[0]] = this[1] == "0"
         except subprocess.CalledProcessError as e:
             logger.warning(f"Failed to get hold states: {e}")
-
-        return current
+            return held
+        if self.assoc_cache is not None:
+            self.assoc_cache.update(accounts, held)
+        return held
 
     def overaged(self, data: dict, threshold: float = 100.0) -> Iterator[OveragePoint]:
         """Check which allocations are over threshold and yield point objects."""
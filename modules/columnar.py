@@ -0,0 +1,154 @@
+"""
+Columnar, NumPy-backed conversion engine for slurmimport.
+
+Instead of computing resource hours row by row, sacct lines are parsed in
+chunks into typed columns (epochs, allocated nodes and the cpu/gpu/mem
+amounts of AllocTRES) and the elapsed time, maximum resource ratio and
+resource hours of the whole chunk are computed with array arithmetic
+against a table of the importer's ``ClusterCapacity`` records.
+
+The arithmetic is performed in the same order as the scalar path in
+``SlurmImporter.convert`` so that results are bit-for-bit identical. Rows
+that the vectorised path cannot represent exactly (unknown partitions,
+unparseable fields, zero allocated nodes or a resource the cluster has no
+capacity for) are handed to the scalar path instead.
+
+NumPy is an optional dependency, see ``available()``.
+"""
+
+from typing import Iterator
+
+from loguru import logger
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - depends on the environment
+    np = None
+
+from .coact import SlurmImporter, kilos_to_int, parse_alloc_tres, split_rows
+
+RESOURCES = ("cpu", "gpu", "mem")
+
+
+def available() -> bool:
+    """True if NumPy could be imported."""
+    return np is not None
+
+
+class ColumnarConverter:
+    """
+    Convert sacct lines to jobs in vectorised chunks.
+
+    Example usage:
+        importer.get_metadata()
+        for job in ColumnarConverter(importer).iter_jobs(lines):
+            ...
+    """
+
+    def __init__(self, importer: SlurmImporter, chunk_size: int = 65536):
+        if not available():
+            raise RuntimeError("the columnar engine requires numpy")
+        self.importer = importer
+        self.chunk_size = chunk_size
+        self.fallbacks = 0
+        self._codes = {}
+        self._capacity = None
+
+    def build_capacity_table(self) -> None:
+        """Build the (code, resource) table of the importer's capacity records, one code per (partition, high-memory GB or None)."""
+        self._codes = {key: code for code, key in enumerate(self.importer._capacity)}
+        self._capacity = np.zeros((len(self._codes), len(RESOURCES)), dtype=np.float64)
+        for key, code in self._codes.items():
+            cluster = self.importer._capacity[key]
+            self._capacity[code] = [cluster.get(resource) or 0 for resource in RESOURCES]
+
+    def iter_jobs(self, lines) -> Iterator[dict]:
+        """Lazily convert an iterable of sacct lines (header first) into job dictionaries."""
+        return self.iter_row_jobs(split_rows(lines))
+
+    def iter_row_jobs(self, rows) -> Iterator[dict]:
+        """Lazily convert ``(index, parts)`` rows into job dictionaries."""
+        self.build_capacity_table()
+        index = None
+        chunk = []
+        for index, parts in rows:
+            chunk.append(parts)
+            if len(chunk) >= self.chunk_size:
+                yield from self.convert_chunk(index, chunk)
+                chunk = []
+        if chunk:
+            yield from self.convert_chunk(index, chunk)
+        if self.fallbacks:
+            logger.debug(f"columnar engine handed {self.fallbacks} rows to the scalar path")
+
+    def parse_chunk(self, index: dict, rows: list) -> tuple:
+        """Parse ``rows`` into typed columns; returns the columns and the rows needing the scalar path."""
+        n = len(rows)
+        i_start, i_end = index["Start"], index["End"]
+        i_partition, i_nodes, i_tres = index["Partition"], index["AllocNodes"], index["AllocTRES"]
+        i_nodelist = index.get("NodeList")
+
+        start = np.zeros(n, dtype=np.int64)
+        end = np.zeros(n, dtype=np.int64)
+        nodes = np.ones(n, dtype=np.float64)
+        partition = np.zeros(n, dtype=np.intp)
+        # NaN marks a resource absent from AllocTRES
+        used = np.full((n, len(RESOURCES)), np.nan, dtype=np.float64)
+        scalar = np.zeros(n, dtype=bool)
+
+        for i, parts in enumerate(rows):
+            node = self.importer.high_memory_node(parts[i_nodelist]) if i_nodelist is not None else None
+            code = self._codes.get((parts[i_partition], self.importer.HIGH_MEMORY_NODES[node] if node else None))
+            try:
+                if code is None:
+                    raise LookupError(parts[i_partition])
+                s, e = int(parts[i_start]), int(parts[i_end])
+                alloc_nodes = kilos_to_int(parts[i_nodes])
+                if alloc_nodes <= 0:
+                    raise ValueError(alloc_nodes)
+                tres = parse_alloc_tres(parts[i_tres])
+            except Exception:
+                scalar[i] = True
+                continue
+            start[i], end[i], nodes[i], partition[i] = s, e, alloc_nodes, code
+            for r, v in enumerate(tres):
+                if v is not None:
+                    used[i, r] = v
+        return start, end, nodes, partition, used, scalar
+
+    def resource_hours(self, start, end, nodes, partition, used, scalar) -> "np.ndarray":
+        """Compute resource hours for a parsed chunk; marks rows that must use the scalar path."""
+        elapsed = (end - start).astype(np.float64)
+        elapsed[elapsed <= 0] = 1.0
+
+        capacity = self._capacity[partition]
+
+        present = ~np.isnan(used)
+        # the scalar path raises on division by a zero capacity; let it do so
+        scalar |= (present & (capacity == 0)).any(axis=1)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratios = used / nodes[:, None] / capacity
+        ratios[~present] = 0.0
+        max_ratio = ratios.max(axis=1)
+        return elapsed * nodes * max_ratio * capacity[:, RESOURCES.index("cpu")] / 3600.0
+
+    def convert_chunk(self, index: dict, rows: list) -> list:
+        """Convert a chunk of split sacct rows, preserving row order."""
+        columns = self.parse_chunk(index, rows)
+        start, end, scalar = columns[0], columns[1], columns[-1]
+        hours = self.resource_hours(*columns)
+
+        jobs = []
+        for i, parts in enumerate(rows):
+            if scalar[i]:
+                self.fallbacks += 1
+                job = self.importer.convert(index, parts)
+            elif hours[i] == 0.0:
+                job = None
+            else:
+                d = {field: parts[idx] for field, idx in index.items()}
+                job = self.importer.make_job(d, int(start[i]), int(end[i]), float(hours[i]))
+            if job:
+                jobs.append(job)
+        return jobs
@@ -0,0 +1,163 @@
+"""
+Content-hash store of uploaded jobs, for skipping unchanged records.
+
+sacct is run with ``--duplicates`` and every import cycle converts the same
+finished jobs again, so without a record of what was sent each cycle
+re-uploads them all through ``jobsImport``. ``DedupStore`` keeps a digest of
+the last record uploaded in a SQLite database, keyed like ``IncrementalState``
+by jobId, allocationId and startTs so that the records of a requeued job do
+not replace each other's digest, and only jobs whose record changed are
+passed on.
+
+Digests are only recorded once the batch holding the job was uploaded:
+``acknowledge`` is called with every batch that made it and takes the
+digests of the records in that batch, and ``commit`` writes them. Jobs of
+failed batches are therefore sent again by the next run, also when another
+record of the same job, such as a requeue kept by ``--duplicates``, was
+uploaded in a batch that made it.
+
+``acknowledge`` is called from the upload threads and ``commit`` from the
+spool drainer as well as the main thread, so the SQLite connection is
+shared between threads (``check_same_thread=False``) and every use of it
+holds ``_db_lock``; the acknowledged digests are guarded by ``_lock``.
+
+Unlike ``IncrementalState``, the store is not reset per date, so reruns of
+earlier days are deduplicated as well. ``close`` prunes the jobs that started
+more than ``retention_days`` before the latest start in the store; rerunning
+days older than that uploads their jobs again.
+
+Stores written before the key included startTs (schema version 1) cannot be
+converted, as they hold no start times; they are emptied, so that each job is
+uploaded once more.
+"""
+
+import sqlite3
+import threading
+from typing import Iterator
+
+from loguru import logger
+
+from .incremental import job_digest, job_key, parse_utc
+
+# jobs looked up in the store per query
+LOOKUP_CHUNK = 500
+
+DEFAULT_RETENTION_DAYS = 90
+
+SCHEMA_VERSION = 2
+
+
+class DedupStore:
+    """
+    Digests of the uploaded job records, keyed by (jobId, allocationId, startTs).
+
+    Example usage:
+        store = DedupStore(path)
+        for batch in batches(store.changed(jobs)):
+            if upload(batch):
+                store.acknowledge(batch)
+        store.commit()
+    """
+
+    def __init__(self, path: str, full_resync: bool = False, retention_days: int = DEFAULT_RETENTION_DAYS):
+        self.path = path
+        # send every job, recording the digests as usual
+        self.full_resync = full_resync
+        self.retention_days = retention_days
+        self.skipped = 0
+        self.recorded = 0
+        self._acknowledged: list[tuple[str, int, str]] = []
+        # acknowledge may be called from the upload thread, and commit from the spool drainer
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self.migrate()
+
+    def migrate(self) -> None:
+        """Create the table, or replace one of an older schema."""
+        version = self._db.execute("PRAGMA user_version").fetchone()[0]
+        tables = {name for name, in self._db.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        if version < SCHEMA_VERSION and "jobs" in tables:
+            count = self._db.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+            logger.warning(f"dedup store {self.path} has schema version {version or 1} without start times; dropping its {count:,} jobs, which are uploaded once more")
+            self._db.execute("DROP TABLE jobs")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "key TEXT NOT NULL PRIMARY KEY, start INTEGER NOT NULL, digest TEXT NOT NULL) WITHOUT ROWID"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_start ON jobs (start)")
+        self._db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self._db.commit()
+
+    def close(self) -> None:
+        self.commit()
+        self.prune()
+        self._db.close()
+
+    def prune(self) -> int:
+        """Delete the jobs started more than ``retention_days`` before the latest start; returns how many."""
+        with self._db_lock:
+            latest = self._db.execute("SELECT MAX(start) FROM jobs").fetchone()[0]
+            if latest is None:
+                return 0
+            pruned = self._db.execute("DELETE FROM jobs WHERE start < ?", (latest - self.retention_days * 86400,)).rowcount
+            self._db.commit()
+        if pruned:
+            logger.info(f"dedup store {self.path}: pruned {pruned:,} jobs started over {self.retention_days} days before the latest")
+        return pruned
+
+    def __enter__(self) -> "DedupStore":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def count(self) -> int:
+        """The number of jobs in the store."""
+        with self._db_lock:
+            return self._db.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+
+    def lookup(self, keys: list) -> dict:
+        """The stored digests of ``keys`` that are in the store."""
+        keys = list(set(keys))
+        query = f"SELECT key, digest FROM jobs WHERE key IN ({','.join('?' * len(keys))})"
+        with self._db_lock:
+            return dict(self._db.execute(query, keys))
+
+    def changed(self, jobs) -> Iterator[dict]:
+        """Yield the jobs whose record differs from the one last uploaded, in order."""
+        chunk = []
+        for job in jobs:
+            chunk.append(job)
+            if len(chunk) >= LOOKUP_CHUNK:
+                yield from self._changed(chunk)
+                chunk = []
+        if chunk:
+            yield from self._changed(chunk)
+        logger.info(f"dedup store {self.path}: {self.skipped:,} unchanged jobs skipped")
+
+    def _changed(self, jobs: list) -> Iterator[dict]:
+        keys = [job_key(job) for job in jobs]
+        stored = {} if self.full_resync else self.lookup(keys)
+        for key, job in zip(keys, jobs):
+            if stored.get(key) == job_digest(job):
+                self.skipped += 1
+                continue
+            yield job
+
+    def acknowledge(self, jobs: list) -> None:
+        """Mark a batch from ``changed`` as uploaded, recording the digests of its own records."""
+        rows = [(job_key(job), parse_utc(job["startTs"]), job_digest(job)) for job in jobs]
+        with self._lock:
+            self._acknowledged.extend(rows)
+
+    def commit(self) -> int:
+        """Write the digests of the acknowledged jobs; returns how many were written."""
+        with self._lock:
+            rows, self._acknowledged = self._acknowledged, []
+        if rows:
+            with self._db_lock:
+                self._db.executemany("INSERT OR REPLACE INTO jobs (key, start, digest) VALUES (?, ?, ?)", rows)
+                self._db.commit()
+            self.recorded += len(rows)
+        return len(rows)
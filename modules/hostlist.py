@@ -0,0 +1,126 @@
+"""
+Slurm hostlist parsing without expansion.
+
+Slurm compresses node lists such as ``sdfmilan[001-300],sdfrome[005,010-012]``.
+Expanding them just to test membership allocates one string per node, so
+``HostSet`` instead keeps the numeric suffixes of its members per prefix and
+checks each bracketed range for an intersection with a bisect, comparing the
+candidates as the zero padded names the range would expand to.
+"""
+
+import re
+from bisect import bisect_left
+from functools import lru_cache
+from typing import Iterable, Iterator, NamedTuple, Optional
+
+HOST_PATTERN = re.compile(r"^(.*?)(\d+)(\D*)$")
+RANGE_PATTERN = re.compile(r"^([^\[\]]*)\[([\d,\-]+)\]([^\[\]]*)$")
+
+
+class HostRange(NamedTuple):
+    """One item of a hostlist: ``prefix[lo-hi,...]suffix``, or a literal name when ``ranges`` is empty."""
+    prefix: str
+    ranges: tuple[tuple[int, int, int], ...]  # (lo, hi, zero padded width)
+    suffix: str = ""
+
+
+def split_hostlist(nodelist: str) -> list[str]:
+    """Split a hostlist on the commas that are not inside brackets."""
+    items = []
+    depth = 0
+    start = 0
+    for i, c in enumerate(nodelist):
+        if c == "[":
+            depth += 1
+        elif c == "]":
+            depth -= 1
+        elif c == "," and depth == 0:
+            items.append(nodelist[start:i])
+            start = i + 1
+    items.append(nodelist[start:])
+    return [i for i in items if i]
+
+
+def parse_hostlist(nodelist: str) -> list[HostRange]:
+    """Parse a hostlist into its items; anything not understood is kept as a literal name."""
+    out = []
+    for item in split_hostlist(nodelist):
+        m = RANGE_PATTERN.match(item)
+        if not m:
+            out.append(HostRange(item, ()))
+            continue
+        ranges = []
+        for part in m.group(2).split(","):
+            lo, sep, hi = part.partition("-")
+            if not lo or (sep and not hi):
+                ranges = None
+                break
+            ranges.append((int(lo), int(hi or lo), len(lo)))
+        if ranges:
+            out.append(HostRange(m.group(1), tuple(ranges), m.group(3)))
+        else:
+            out.append(HostRange(item, ()))
+    return out
+
+
+def expand_hostlist(nodelist: str) -> Iterator[str]:
+    """Yield every node name of a hostlist, keeping the zero padding of each range."""
+    for item in parse_hostlist(nodelist):
+        if not item.ranges:
+            yield item.prefix
+            continue
+        for lo, hi, width in item.ranges:
+            for num in range(lo, hi + 1):
+                yield f"{item.prefix}{num:0{width}d}{item.suffix}"
+
+
+class HostSet:
+    """
+    A set of node names that can be intersected with compressed hostlists.
+
+    Node names match as expanded, with the zero padding of each range, so
+    ``sdfmilan269`` is found in ``sdfmilan[001-300]`` but not in
+    ``sdfmilan[0269]``. Results are cached per hostlist string.
+
+    Example usage:
+        high_memory = HostSet(["sdfmilan269", "sdfmilan270"])
+        high_memory.first_member("sdfmilan[001-300],sdfrome[001-010]")  # -> "sdfmilan269"
+    """
+
+    def __init__(self, names: Iterable[str], cache_size: int = 65536):
+        self.literals = set()
+        # (number, digits, name) of the numbered members per (prefix, suffix)
+        numbers = {}
+        for name in names:
+            self.literals.add(name)
+            m = HOST_PATTERN.match(name)
+            if m:
+                numbers.setdefault((m.group(1), m.group(3)), []).append((int(m.group(2)), m.group(2), name))
+        self._sorted = {key: sorted(nums) for key, nums in numbers.items()}
+        self.first_member = lru_cache(maxsize=cache_size)(self._first_member)
+
+    def __contains__(self, name: str) -> bool:
+        return self.first_member(name) is not None
+
+    def _first_member(self, nodelist: str) -> Optional[str]:
+        """Return the first member of this set in ``nodelist`` order, or None."""
+        if not nodelist:
+            return None
+        if nodelist in self.literals:
+            return nodelist
+        for item in parse_hostlist(nodelist):
+            if not item.ranges:
+                if item.prefix in self.literals:
+                    return item.prefix
+                continue
+            nums = self._sorted.get((item.prefix, item.suffix))
+            if not nums:
+                continue
+            for lo, hi, width in item.ranges:
+                for i in range(bisect_left(nums, (lo,)), len(nums)):
+                    num, digits, name = nums[i]
+                    if num > hi:
+                        break
+                    if f"{num:0{width}d}" == digits:
+                        return name
+        return None
@@ -0,0 +1,265 @@
+"""
+Declarative account remapping rules for slurmremap.
+
+The rules live in ``remap_rules.json`` next to this module. They are grouped
+into eras, and each era applies to the jobs that started before its
+``until`` date (UTC). The last era has no ``until`` and applies to everything
+after, including jobs without a start time. Only the last, current era is
+applied unless ``RemapRules`` is asked to pick the era by start, since the
+jobs imported so far all went through the current rules. An era is a list of
+stages:
+
+- ``first``: only the first rule whose ``when`` matches is applied
+- ``each``: every matching rule is applied in order
+
+A rule is made of a ``when`` condition and one or more actions, applied in
+this order: ``error``, ``warn``, ``drop``, ``set``, ``map``, ``split`` and
+``append``. ``error`` raises and ``warn`` logs its message with the job.
+
+A ``when`` condition maps sacct fields to tests, and every test must hold:
+
+- a list: the field is one of the values (compiled to a frozenset)
+- ``{"not_in": [...]}``, ``{"prefix": s}``, ``{"contains": s}``, ``{"not_contains": s}``
+- ``{"substring_of": s}``: the field occurs in ``s``. This keeps the
+  behaviour of the original ``d[field] in ("name")`` tests, which were
+  string rather than tuple membership tests.
+
+``{"any": [condition, ...]}`` holds if any of its conditions holds.
+
+Each era is compiled into a single Python function, with the frozenset and
+dict lookups inlined. In a ``first`` stage, the rules that require a User
+from a list are dispatched through a dict keyed on the user, so each row
+only evaluates the rules that can apply to it.
+
+The ``@`` split of the current era keeps the part before the first ``@``;
+the original code raised on accounts with more than one.
+"""
+
+import json
+import os
+from calendar import timegm
+from time import strptime
+from typing import Callable, Optional
+
+from loguru import logger
+
+DEFAULT_RULES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "remap_rules.json")
+
+
+class Compiler:
+    """Accumulates generated source lines and the constants they refer to."""
+
+    def __init__(self, columns: Optional[dict] = None):
+        # with columns, the generated code works on a split sacct row instead of a dict
+        self.columns = columns
+        self.namespace = {}
+        self.functions = []
+        self.dispatch = {}
+        self.source = ""
+        self.used = set()
+        self.namespace["_logger"] = logger
+        if columns is not None:
+            self.namespace["_fields"] = sorted(columns, key=columns.get)
+
+    def ref(self, field: str) -> str:
+        if self.columns is None:
+            return f"d[{field!r}]"
+        self.used.add(self.columns[field])
+        return f"d[{self.columns[field]}]"
+
+    def const(self, value) -> str:
+        name = f"_c{len(self.namespace)}"
+        self.namespace[name] = value
+        return name
+
+    def test(self, field: str, test) -> str:
+        value = self.ref(field)
+        if isinstance(test, list):
+            return f"{value} in {self.const(frozenset(test))}"
+        (op, arg), = test.items()
+        if op == "not_in":
+            return f"{value} not in {self.const(frozenset(arg))}"
+        if op == "prefix":
+            return f"{value}.startswith({arg!r})"
+        if op == "contains":
+            return f"{arg!r} in {value}"
+        if op == "not_contains":
+            return f"{arg!r} not in {value}"
+        if op == "substring_of":
+            return f"{value} in {arg!r}"
+        raise ValueError(f"unknown test {op} for {field}")
+
+    def condition(self, when: dict) -> str:
+        tests = []
+        for field, test in when.items():
+            if field == "any":
+                tests.append("(" + " or ".join(f"({self.condition(c)})" for c in test) + ")")
+            else:
+                tests.append(self.test(field, test))
+        return " and ".join(tests) or "True"
+
+    def actions(self, rule: dict, dropped: str) -> list[str]:
+        """Statements applying ``rule``; ``dropped`` is the statement used to drop the job."""
+        lines = []
+        if "error" in rule:
+            # rows may have been split only up to the last column the rules use
+            job = "d" if self.columns is None else "dict(zip(_fields, '|'.join(d).split('|')))"
+            lines.append(f"raise Exception({rule['error']!r} + ' for ' + str({job}))")
+        if "warn" in rule:
+            job = "d" if self.columns is None else "dict(zip(_fields, '|'.join(d).split('|')))"
+            lines.append(f"_logger.warning({rule['warn']!r} + ' for ' + str({job}))")
+        if rule.get("drop"):
+            lines.append(dropped)
+        for field, value in rule.get("set", {}).items():
+            lines.append(f"{self.ref(field)} = {value!r}")
+        for field, mapping in rule.get("map", {}).items():
+            ref = self.ref(field)
+            # most values are not mapped, and a membership test is cheaper than a .get call
+            const = self.const(mapping)
+            lines.extend([f"if {ref} in {const}:", f"    {ref} = {const}[{ref}]"])
+        for field, sep in rule.get("split", {}).items():
+            ref = self.ref(field)
+            lines.append(f"{ref} = {ref}.split({sep!r})[0]")
+        for field, suffix in rule.get("append", {}).items():
+            lines.append(f"{self.ref(field)} += {suffix!r}")
+        return lines or ["pass"]
+
+    def chain(self, rules: list, dropped: str, indent: str) -> list[str]:
+        """An if/elif chain applying the first matching rule."""
+        lines = []
+        for i, rule in enumerate(rules):
+            lines.append(f"{indent}{'if' if i == 0 else 'elif'} {self.condition(rule.get('when', {}))}:")
+            lines.extend(f"{indent}    {a}" for a in self.actions(rule, dropped))
+        return lines
+
+    def stage(self, stage: dict) -> list[str]:
+        """Statements of the era function applying ``stage``."""
+        rules = stage["rules"]
+        if stage.get("mode", "each") != "first":
+            lines = []
+            for rule in rules:
+                if not rule.get("when"):
+                    lines.extend(f"    {a}" for a in self.actions(rule, "return None"))
+                    continue
+                lines.append(f"    if {self.condition(rule['when'])}:")
+                lines.extend(f"        {a}" for a in self.actions(rule, "return None"))
+            return lines
+
+        keyed = [isinstance(r.get("when", {}).get("User"), list) for r in rules]
+        if not any(keyed):
+            return self.chain(rules, "return None", "    ")
+
+        # one function per distinct list of candidate rules, dispatched on the user
+        users = set().union(*(r["when"]["User"] for r, k in zip(rules, keyed) if k))
+        candidates = {}
+        index = {}
+        for user in sorted(users) + [None]:
+            key = tuple(i for i, (r, k) in enumerate(zip(rules, keyed)) if not k or user in r["when"]["User"])
+            if key not in candidates:
+                name = f"_f{len(self.functions)}"
+                body = self.chain([rules[i] for i in key], "return False", "    ") if key else []
+                self.functions.append("\n".join([f"def {name}(d):"] + body + ["    return True"]))
+                candidates[key] = name
+            if user is not None:
+                index[user] = candidates[key]
+        by_user = self.const(None)
+        # filled in with the functions once they are compiled
+        self.dispatch[by_user] = index
+        default = candidates[key]
+        return [f"    if not {by_user}.get({self.ref('User')}, {default})(d):", "        return None"]
+
+    def era(self, stages: list) -> Callable:
+        body = []
+        for stage in stages:
+            body.extend(self.stage(stage))
+        self.functions.append("\n".join(["def remap(d):"] + body + ["    return d"]))
+        source = "\n\n".join(self.functions)
+        code = compile(source, "<remap rules>", "exec")
+        exec(code, self.namespace)
+        for name, index in self.dispatch.items():
+            self.namespace[name] = {user: self.namespace[f] for user, f in index.items()}
+        self.source = source
+        remap = self.namespace["remap"]
+        remap.max_column = max(self.used, default=-1)
+        return remap
+
+
+class Era:
+    """The rules applied to jobs started before ``until``."""
+
+    def __init__(self, spec: dict):
+        self.name = spec["name"]
+        self.until = spec.get("until")
+        self.until_epoch = timegm(strptime(self.until, "%Y-%m-%d")) if self.until else None
+        self.stages = spec["stages"]
+        compiler = Compiler()
+        self.remap = compiler.era(self.stages)
+        self.source = compiler.source
+        self._bound = {}
+
+    def bind(self, index: dict) -> Callable[[list], Optional[list]]:
+        """Compile the rules for split rows with the columns of ``index``.
+
+        The returned function remaps a row in place, returning it, or None
+        if the job is dropped. It only reads and writes the columns the
+        rules refer to; the last of them is its ``max_column``, so rows only
+        need splitting up to it.
+        """
+        key = tuple(sorted(index.items()))
+        if key not in self._bound:
+            self._bound[key] = Compiler(columns=index).era(self.stages)
+        return self._bound[key]
+
+
+class RemapRules:
+    """
+    Remap sacct job dicts with the current era of rules, or with ``by_start`` the era matching their start time.
+
+    Example usage:
+        rules = RemapRules.load()
+        d = rules.remap(d)  # None if the job should be dropped
+    """
+
+    def __init__(self, spec: dict, by_start: bool = False):
+        self.eras = [Era(e) for e in spec["eras"]]
+        self._eras = {e.name: e for e in self.eras}
+        self._current = self.eras[-1]
+        self.by_start = by_start
+
+    @classmethod
+    def load(cls, path: Optional[str] = None, by_start: bool = False) -> "RemapRules":
+        with open(path or DEFAULT_RULES) as f:
+            return cls(json.load(f), by_start=by_start)
+
+    def era(self, name: str) -> Era:
+        return self._eras[name]
+
+    def era_for(self, start: str) -> Era:
+        """The era of a sacct Start value: an epoch, an ISO timestamp, or anything else for the current era."""
+        if not start or not start[0].isdigit():
+            return self._current
+        epoch = start.isdigit()
+        for era in self.eras:
+            if era.until is None:
+                return era
+            if (int(start) < era.until_epoch) if epoch else (start < era.until):
+                return era
+        return self._current
+
+    def remap(self, d: dict) -> Optional[dict]:
+        if not self.by_start:
+            return self._current.remap(d)
+        return self.era_for(d.get("Start", "")).remap(d)
+
+    def bind(self, index: dict) -> Callable[[list], Optional[list]]:
+        """Like ``Era.bind``, with ``by_start`` picking the era of each row from its Start column."""
+        i_start = index.get("Start")
+        if not self.by_start or len(self.eras) == 1 or i_start is None:
+            return self._current.bind(index)
+        bound = {era.name: era.bind(index) for era in self.eras}
+        era_for = self.era_for
+
+        def remap_row(parts: list) -> Optional[list]:
+            return bound[era_for(parts[i_start]).name](parts)
+        remap_row.max_column = max([i_start] + [f.max_column for f in bound.values()])
+        return remap_row
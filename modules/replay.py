@@ -0,0 +1,139 @@
+"""
+Memory-mapped replay of archived sacct text dumps.
+
+Re-importing a day from ``../slurm-job-history`` used to read the whole
+file into a list of lines and split every field of every line.
+``ReplayReader`` memory-maps the dump instead and works through it a block
+of whole lines at a time. Lines are only split up to the last field
+``SlurmImporter.convert`` reads, and rows only hold those fields.
+
+Each block is decoded in one go: decoding the needed fields one by one
+costs more Python calls than decoding the whole block in C.
+
+The rows of a dump can be split into byte ranges aligned to line ends and
+converted in worker processes. Each worker gets a copy of the importer's
+coact metadata, so it needs no GraphQL connection of its own. The jobs come
+back in file order and are uploaded by the parent.
+"""
+
+import mmap
+from concurrent.futures import ProcessPoolExecutor
+from operator import itemgetter
+from typing import Iterator, Optional
+
+from loguru import logger
+
+from .coact import SlurmImporter
+
+# bytes of the dump split and decoded at a time
+BLOCK_SIZE = 1 << 23
+
+# the importer of a worker process, see init_worker
+_importer: Optional[SlurmImporter] = None
+
+
+class ReplayReader:
+    """
+    Rows of a pipe-delimited sacct dump, read through mmap.
+
+    Example usage:
+        reader = ReplayReader(path, fields=SlurmImporter.FIELDS)
+        for start, end in reader.ranges(4):
+            for index, parts in reader.rows(start, end):
+                ...
+    """
+
+    def __init__(self, path: str, fields: Optional[list] = None):
+        self.path = path
+        with open(path, "rb") as f:
+            self.size = f.seek(0, 2)
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b""
+        eol = self._mm.find(b"\n")
+        self.header_end = self.size if eol < 0 else eol + 1
+        self.header = self._mm[:self.header_end].decode().rstrip("\r\n")
+        names = self.header.split("|") if self.header else []
+        columns = {name: idx for idx, name in enumerate(names)}
+        if fields is not None:
+            names = [f for f in fields if f in columns]
+        self.fields = names
+        # index of each decoded field in the rows, and its column in the dump
+        self.index = {name: i for i, name in enumerate(names)}
+        self.columns = [columns[name] for name in names]
+        # only split lines up to the last column read
+        self.maxsplit = max(self.columns, default=-1) + 1
+        if len(self.columns) == 1:
+            column, = self.columns
+            self.project = lambda parts: (parts[column],)
+        else:
+            self.project = itemgetter(*self.columns) if self.columns else lambda parts: ()
+        self.skipped = 0
+
+    def close(self) -> None:
+        if isinstance(self._mm, mmap.mmap):
+            self._mm.close()
+
+    def __enter__(self) -> "ReplayReader":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def line_start(self, pos: int) -> int:
+        """The offset of the first line starting at or after ``pos``."""
+        if pos <= self.header_end:
+            return self.header_end
+        eol = self._mm.find(b"\n", pos - 1)
+        return self.size if eol < 0 else eol + 1
+
+    def ranges(self, count: int) -> list[tuple[int, int]]:
+        """Split the rows into at most ``count`` byte ranges aligned to line starts."""
+        body = self.size - self.header_end
+        bounds = [self.line_start(self.header_end + body * i // count) for i in range(count)] + [self.size]
+        return [(s, e) for s, e in zip(bounds, bounds[1:]) if s < e]
+
+    def rows(self, start: Optional[int] = None, end: Optional[int] = None) -> Iterator[tuple[dict, tuple]]:
+        """Yield ``(index, parts)`` for the lines in ``[start, end)``, as ``split_rows`` does."""
+        start = self.header_end if start is None else start
+        end = self.size if end is None else end
+        index, project, maxsplit, header = self.index, self.project, self.maxsplit, self.header
+        while start < end:
+            block_end = end if end - start <= BLOCK_SIZE else self.line_start(start + BLOCK_SIZE)
+            for line in self._mm[start:block_end].decode().split("\n"):
+                if not line or line == header:
+                    continue
+                try:
+                    yield index, project(line.split("|", maxsplit))
+                except IndexError:
+                    self.skipped += 1
+                    logger.warning(f"skipping row with too few fields: {line}")
+            start = block_end
+
+
+def init_worker(metadata: tuple, engine: str, exit_on_error: bool) -> None:
+    """Set up the importer of a worker process from the parent's metadata."""
+    global _importer
+    _importer = SlurmImporter(username=None, password_file=None, engine=engine, exit_on_error=exit_on_error)
+    _importer.set_metadata(*metadata)
+
+
+def convert_range(path: str, start: int, end: int) -> list:
+    """Convert the rows of ``path`` in ``[start, end)`` with the worker's importer."""
+    with ReplayReader(path, fields=SlurmImporter.FIELDS) as reader:
+        return list(_importer.convert_row_jobs(reader.rows(start, end)))
+
+
+def replay_jobs(importer: SlurmImporter, path: str, workers: int = 1) -> Iterator[dict]:
+    """Convert the jobs of a dump in file order, in ``workers`` processes if more than one."""
+    if workers <= 1:
+        with ReplayReader(path, fields=SlurmImporter.FIELDS) as reader:
+            yield from importer.convert_row_jobs(reader.rows())
+        return
+
+    with ReplayReader(path) as reader:
+        # more ranges than workers, so that a slow range doesn't hold the others up
+        ranges = reader.ranges(workers * 4)
+    logger.info(f"replaying {path} in {len(ranges)} ranges over {workers} processes")
+    initargs = (importer.get_metadata_state(), importer.engine, importer.exit_on_error)
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=initargs) as pool:
+        for jobs in pool.map(convert_range, [path] * len(ranges), *zip(*ranges)):
+            yield from jobs
@@ -0,0 +1,183 @@
+"""
+Local rolling-window usage for the overage evaluation.
+
+``overage`` asks coact for ``facilityRecentComputeUsage`` once per window,
+and the server rescans the jobs of every window on every evaluation.
+``LocalUsage`` instead keeps the usage of every (facility, cluster) in
+``UsageWindows``, whose minute ring covers the longest window, so that every
+window is a difference of two cumulative sums. Every evaluation it remaps
+and converts the jobs that finished since the previous one, as
+``slurmremap | slurmimport`` would, adds them to the allocation they were
+charged to, and answers the windows in the shape of the server's response.
+
+Without usage to start from, the first poll asks sacct for every job of
+the longest window, one query per day: a month of jobs with the default
+windows. With a ``state`` path the sums are saved after every poll, so that
+only the first run pays for that and a restart only asks sacct for the jobs
+since the last poll.
+"""
+
+import json
+import os
+import time
+from typing import Iterable, Optional
+
+import pendulum as pdl
+from loguru import logger
+
+from .coact import SlurmImporter, SlurmRemapper, run_sacct, split_rows
+from .spool import write_json
+from .usage_windows import MINUTE, UsageWindows
+
+# overlap of consecutive sacct polls, for jobs recorded late by slurmdbd
+POLL_OVERLAP = 600
+
+
+class LocalUsage:
+    """
+    ``UsageWindows`` of the jobs reported by sacct, answering the overage windows.
+
+    Example usage:
+        local = LocalUsage(importer, windows=[5, 60, 1440], state="overage-usage")
+        local.poll()
+        result = local.windows(allocations, purchases)
+    """
+
+    def __init__(self, importer: SlurmImporter, windows: list, sacct_bin_path: str = "sacct", state: Optional[str] = None, remapper: Optional[SlurmRemapper] = None):
+        self.importer = importer
+        self.remapper = remapper or SlurmRemapper()
+        self.window_minutes = windows
+        self.sacct_bin_path = sacct_bin_path
+        self.state = state
+        self.usage = UsageWindows(minutes=max(windows))
+        self.polled_to: Optional[int] = None
+        # (JobID, Start) of the jobs already added, with their end
+        self.seen: dict[tuple[str, str], int] = {}
+        self.mismatches = 0
+        # (facility, cluster) per allocation id, for the importer's allocations it was built from
+        self._allocations: dict[str, tuple[str, str]] = {}
+        self._allocations_of = None
+        if state and os.path.exists(state):
+            self.load()
+
+    def load(self) -> None:
+        try:
+            usage = UsageWindows.load(self.state)
+            with open(f"{self.state}.json") as f:
+                polled = json.load(f)
+        except Exception as e:
+            logger.warning(f"ignoring unreadable local usage state {self.state}: {e}")
+            return
+        if usage.span < max(self.window_minutes):
+            logger.warning(f"local usage state {self.state} only covers {usage.span} minutes; starting over")
+            return
+        self.usage = usage
+        self.polled_to = polled["polled_to"]
+        self.seen = {(job, start): end for job, start, end in polled["seen"]}
+
+    def save(self) -> None:
+        self.usage.save(self.state)
+        # only the jobs the next poll can return again are needed
+        horizon = self.polled_to - POLL_OVERLAP
+        seen = [[job, start, end] for (job, start), end in self.seen.items() if end >= horizon]
+        write_json(f"{self.state}.json", {"polled_to": self.polled_to, "seen": seen})
+
+    def sacct_windows(self, start: int, end: int) -> list[tuple[str, str, str]]:
+        """Split ``[start, end]`` into (date, start time, end time) per local day, as sacct is queried per day."""
+        tz = pdl.local_timezone()
+        windows = []
+        day = pdl.from_timestamp(start, tz=tz)
+        last = pdl.from_timestamp(end, tz=tz)
+        while day <= last:
+            day_end = last if day.format("YYYY-MM-DD") == last.format("YYYY-MM-DD") else day.end_of("day")
+            windows.append((day.format("YYYY-MM-DD"), day.format("HH:mm:ss"), day_end.format("HH:mm:ss")))
+            day = day.add(days=1).start_of("day")
+        return windows
+
+    def poll(self, now: Optional[float] = None) -> int:
+        """Add the jobs that finished since the last poll; returns how many were added."""
+        now = int(now if now is not None else time.time())
+        self.usage.advance(now)
+        start = self.usage.oldest() * MINUTE
+        if self.polled_to:
+            start = max(start, self.polled_to - POLL_OVERLAP)
+        added = 0
+        for date, start_time, end_time in self.sacct_windows(start, now):
+            lines = run_sacct(sacct_bin_path=self.sacct_bin_path, date=date, start_time=start_time, end_time=end_time)
+            for index, parts in self.remapper.remap_rows(split_rows(lines)):
+                added += self.add_row(index, parts)
+        self.polled_to = now
+        # jobs that ended before the ring started cannot be returned again
+        horizon = self.usage.oldest() * MINUTE - POLL_OVERLAP
+        self.seen = {key: end for key, end in self.seen.items() if end >= horizon}
+        logger.debug(f"added {added:,} jobs to the local usage windows, {len(self.seen):,} tracked")
+        if self.state:
+            self.save()
+        return added
+
+    def add_row(self, index: dict, parts: list) -> int:
+        end = parts[index["End"]].strip()
+        # running jobs are added once they finished
+        if not end.isdigit():
+            return 0
+        key = (parts[index["JobID"]], parts[index["Start"]])
+        if key in self.seen:
+            return 0
+        try:
+            job = self.importer.convert(index, parts)
+        except Exception as e:
+            logger.warning(f"could not convert {parts[index['JobID']]} for the local usage windows: {e}")
+            return 0
+        self.seen[key] = int(end)
+        if not job:
+            return 0
+        facility, cluster = self.allocation(job["allocationId"])
+        self.usage.add(facility, cluster, int(parts[index["Start"]]), int(end), job["resourceHours"])
+        return 1
+
+    def allocation(self, alloc_id: str) -> tuple[str, str]:
+        """The (facility, cluster) of the importer's allocation ``alloc_id``."""
+        if self._allocations_of is not self.importer._allocid:
+            self._allocations_of = self.importer._allocid
+            self._allocations = {
+                alloc: (facility, cluster)
+                for (facility, _, cluster), allocs in self.importer._allocid.items()
+                for alloc in allocs.values()
+            }
+        return self._allocations[alloc_id]
+
+    def capacity(self, cluster: str, purchased: Optional[float]) -> float:
+        """Resource hours per hour of ``purchased`` nodes of ``cluster``."""
+        cpus = self.importer._clusters.get(cluster, {}).get("cpu") or 0
+        return (purchased or 0) * cpus
+
+    def windows(self, allocations: Iterable[tuple[str, str]], purchases: dict) -> dict:
+        """The usage of ``allocations`` in the shape of the ``facilityRecentComputeUsage`` results."""
+        result = {}
+        for minutes in self.window_minutes:
+            result[f"_{minutes:0>6}"] = [
+                {"facility": f, "cluster": c, "percentUsed": self.usage.percent(f, c, minutes, self.capacity(c, purchases.get((f, c))))}
+                for f, c in allocations
+            ]
+        return result
+
+    def verify(self, local: dict, server: dict, tolerance: float = 1.0) -> int:
+        """Log where the local windows differ from the server's by more than ``tolerance`` percent; returns how many."""
+        mismatches = []
+        compared = 0
+        for alias, values in server.items():
+            if alias not in local:
+                continue
+            ours = {(v["facility"].lower(), v["cluster"].lower()): v["percentUsed"] for v in local[alias]}
+            for v in values:
+                key = (v["facility"].lower(), v["cluster"].lower())
+                if key not in ours:
+                    continue
+                compared += 1
+                if abs(ours[key] - v["percentUsed"]) > tolerance:
+                    mismatches.append((abs(ours[key] - v["percentUsed"]), alias, key, ours[key], v["percentUsed"]))
+        for diff, alias, (f, c), ours, theirs in sorted(mismatches, reverse=True)[:10]:
+            logger.warning(f"local {alias} window of {f}@{c} is {ours:.1f}%, the server reports {theirs:.1f}%")
+        logger.info(f"local usage windows agree with the server on {compared - len(mismatches)} of {compared} values")
+        self.mismatches = len(mismatches)
+        return self.mismatches
@@ -0,0 +1,76 @@
+"""
+Fixed-interval scheduler for long-running daemons.
+
+The shell daemons run a command and then ``sleep``, so the period drifts by
+the run time and every process on a host wakes up in step. ``Scheduler``
+runs a task on a fixed grid of ``interval`` seconds from its start, each
+run delayed by a random jitter, and reports overruns: a run that takes
+longer than the interval skips the ticks it missed rather than queueing
+them up.
+"""
+
+import random
+import signal
+import threading
+import time
+from typing import Callable, Optional
+
+from loguru import logger
+
+
+class Scheduler:
+    """
+    Run a task every ``interval`` seconds until stopped.
+
+    Exceptions raised by the task are logged and the schedule carries on.
+
+    Example usage:
+        scheduler = Scheduler(300, jitter=10)
+        scheduler.stop_on_signals()
+        scheduler.run(evaluate)
+    """
+
+    def __init__(self, interval: float, jitter: float = 0.0, clock: Callable[[], float] = time.monotonic):
+        if interval <= 0:
+            raise ValueError(f"interval must be positive, got {interval}")
+        self.interval = interval
+        self.jitter = min(jitter, interval)
+        self.clock = clock
+        self.cycles = 0
+        self.overruns = 0
+        self.skipped = 0
+        self.failures = 0
+        self._stop = threading.Event()
+
+    def stop(self, *args) -> None:
+        self._stop.set()
+
+    def stop_on_signals(self) -> None:
+        """Finish the current run and return from ``run`` on SIGTERM or SIGINT."""
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, self.stop)
+
+    def run(self, task: Callable[[], None], cycles: Optional[int] = None) -> None:
+        """Run ``task`` on the schedule, ``cycles`` times or until stopped."""
+        start = self.clock()
+        tick = 0
+        while not self._stop.is_set() and (cycles is None or self.cycles < cycles):
+            deadline = start + tick * self.interval + random.uniform(0, self.jitter)
+            if self._stop.wait(max(deadline - self.clock(), 0)):
+                break
+            began = self.clock()
+            try:
+                task()
+            except Exception as e:
+                self.failures += 1
+                logger.exception(f"scheduled run {self.cycles} failed: {e}")
+            duration = self.clock() - began
+            self.cycles += 1
+            logger.debug(f"scheduled run {self.cycles} took {duration:,.02f}s, {began - deadline:,.03f}s late")
+            # the next tick that has not started yet
+            elapsed = int((self.clock() - start) // self.interval) + 1
+            if elapsed > tick + 1:
+                self.overruns += 1
+                self.skipped += elapsed - tick - 1
+                logger.warning(f"scheduled run took {duration:,.02f}s, longer than the {self.interval:,.0f}s interval; skipping {elapsed - tick - 1} runs")
+            tick = max(tick + 1, elapsed)
@@ -0,0 +1,279 @@
+"""
+Durable on-disk spool between converting and uploading jobs.
+
+Without it every converted job only lives in memory until its batch is
+uploaded, so when ``slurmimport`` dies the next run has to dump and convert
+the day again. With a spool the converted jobs are appended to disk first
+and a drainer uploads them from there, acknowledging what was uploaded.
+A run that dies leaves the unacknowledged jobs behind, and they are drained
+by the next run or by ``slurmdrain``.
+
+A spool is a directory of segment files of length-prefixed records::
+
+    <4 byte big-endian length><JSON job>...
+
+Records are fsynced in batches rather than one by one. The writer starts a
+new segment once the current one is large enough, so that drained segments
+can be deleted while the writer carries on. The drain position is kept in
+``ack.json`` and the drain metrics in ``metrics.json``.
+
+Delivery is at least once: a drain interrupted between an upload and its
+acknowledgement uploads those jobs again, which jobsImport upserts.
+"""
+
+import json
+import os
+import struct
+import threading
+import time
+from timeit import default_timer as timer
+from typing import Callable, Optional
+
+from loguru import logger
+
+HEADER = struct.Struct(">I")
+SEGMENT_SUFFIX = ".spool"
+
+
+def write_json(path: str, data: dict) -> None:
+    """Atomically replace ``path`` with ``data``."""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class Spool:
+    """
+    Append-only, length-prefixed job records in segment files under ``path``.
+
+    One process appends while another (or a thread) reads and acknowledges.
+
+    Example usage:
+        spool = Spool(path)
+        for job in jobs:
+            spool.append(job)
+        spool.close()
+
+        records, end = spool.read(spool.acked(), 1000)
+        upload(records)
+        spool.ack(end)
+    """
+
+    def __init__(self, path: str, segment_bytes: int = 64 << 20, sync_records: int = 10000, sync_interval: float = 1.0):
+        self.path = path
+        self.segment_bytes = segment_bytes
+        # fsync after this many records or seconds, whichever comes first
+        self.sync_records = sync_records
+        self.sync_interval = sync_interval
+        self.appended = 0
+        self._file = None
+        self._segment = None
+        self._unsynced = 0
+        self._synced_at = timer()
+        os.makedirs(path, exist_ok=True)
+
+    def segments(self) -> list[int]:
+        return sorted(int(name[:-len(SEGMENT_SUFFIX)]) for name in os.listdir(self.path) if name.endswith(SEGMENT_SUFFIX))
+
+    def segment_path(self, segment: int) -> str:
+        return os.path.join(self.path, f"{segment:012d}{SEGMENT_SUFFIX}")
+
+    # writing
+
+    def open(self) -> None:
+        """Open the last segment for appending, dropping a record left incomplete by a crash."""
+        segments = self.segments()
+        self._segment = segments[-1] if segments else self.acked()[0]
+        path = self.segment_path(self._segment)
+        complete = self.scan(self._segment, 0)[1] if os.path.exists(path) else 0
+        self._file = open(path, "ab")
+        if self._file.tell() > complete:
+            logger.warning(f"dropping {self._file.tell() - complete} bytes of an incomplete record from {path}")
+            self._file.truncate(complete)
+
+    def append(self, job: dict) -> None:
+        if self._file is None:
+            self.open()
+        data = json.dumps(job, separators=(",", ":")).encode()
+        self._file.write(HEADER.pack(len(data)))
+        self._file.write(data)
+        self.appended += 1
+        self._unsynced += 1
+        if self._unsynced >= self.sync_records or timer() - self._synced_at >= self.sync_interval:
+            self.sync()
+
+    def sync(self) -> None:
+        """Make the appended records durable, and start a new segment if the current one is full."""
+        if self._file is None:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._synced_at = timer()
+        if self._file.tell() >= self.segment_bytes:
+            self._file.close()
+            self._segment += 1
+            self._file = open(self.segment_path(self._segment), "ab")
+
+    def close(self) -> None:
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
+
+    def __enter__(self) -> "Spool":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    # reading
+
+    def scan(self, segment: int, offset: int, max_records: Optional[int] = None, load: bool = False) -> tuple[list, int]:
+        """Read the complete records of a segment from ``offset``; returns them (if ``load``) and the offset after them."""
+        records = []
+        count = 0
+        with open(self.segment_path(segment), "rb") as f:
+            f.seek(offset)
+            while max_records is None or count < max_records:
+                header = f.read(HEADER.size)
+                if len(header) < HEADER.size:
+                    break
+                size, = HEADER.unpack(header)
+                if load:
+                    data = f.read(size)
+                    if len(data) < size:
+                        break
+                    records.append(json.loads(data))
+                else:
+                    f.seek(size, 1)
+                    if f.tell() > os.fstat(f.fileno()).st_size:
+                        break
+                offset += HEADER.size + size
+                count += 1
+        return records if load else count, offset
+
+    def read(self, position: tuple[int, int], max_records: int, load: bool = True) -> tuple[list, tuple[int, int]]:
+        """Read up to ``max_records`` jobs from ``position``; returns them (or their count) and the position after them."""
+        segment, offset = position
+        records = []
+        count = 0
+        while count < max_records:
+            segments = [s for s in self.segments() if s >= segment]
+            if not segments:
+                break
+            if segments[0] != segment:
+                segment, offset = segments[0], 0
+            more, offset = self.scan(segment, offset, max_records - count, load=load)
+            if load:
+                records.extend(more)
+                count = len(records)
+            else:
+                count += more
+            # a segment is complete once the writer has moved on to the next one
+            if count < max_records and len(segments) > 1:
+                segment, offset = segments[1], 0
+            else:
+                break
+        return records if load else count, (segment, offset)
+
+    def acked(self) -> tuple[int, int]:
+        """The position up to which the records were uploaded."""
+        path = os.path.join(self.path, "ack.json")
+        if not os.path.exists(path):
+            return 0, 0
+        with open(path) as f:
+            ack = json.load(f)
+        return ack["segment"], ack["offset"]
+
+    def ack(self, position: tuple[int, int]) -> None:
+        """Record the records before ``position`` as uploaded, deleting the drained segments."""
+        write_json(os.path.join(self.path, "ack.json"), {"segment": position[0], "offset": position[1]})
+        for segment in self.segments():
+            if segment < position[0]:
+                os.remove(self.segment_path(segment))
+
+    def depth(self) -> tuple[int, int]:
+        """The number of records and bytes not yet acknowledged."""
+        segment, offset = self.acked()
+        records = 0
+        size = 0
+        for s in self.segments():
+            if s < segment:
+                continue
+            start = offset if s == segment else 0
+            count, end = self.scan(s, start)
+            records += count
+            size += end - start
+        return records, size
+
+
+class SpoolDrainer:
+    """
+    Upload the records of a spool a chunk at a time, acknowledging each chunk once uploaded.
+
+    ``upload`` is called with the jobs of a chunk and returns the number of
+    batches that failed. A chunk with failures is not acknowledged and the
+    drain stops, leaving it for the next one.
+
+    Example usage:
+        drainer = SpoolDrainer(spool, upload)
+        failed = drainer.run()
+    """
+
+    def __init__(self, spool: Spool, upload: Callable[[list], int], chunk_records: int = 150000, poll_interval: float = 0.5):
+        self.spool = spool
+        self.upload = upload
+        self.chunk_records = chunk_records
+        self.poll_interval = poll_interval
+        self.drained = 0
+        self.failed = 0
+        self._started = None
+
+    def run(self, writing: Optional[threading.Event] = None) -> int:
+        """Drain the spool, also waiting for new records while ``writing`` is set; returns the failed batches."""
+        self._started = timer()
+        position = self.spool.acked()
+        while True:
+            # upload full chunks while the writer is still appending
+            if writing is not None and writing.is_set() and self.spool.read(position, self.chunk_records, load=False)[0] < self.chunk_records:
+                time.sleep(self.poll_interval)
+                continue
+            records, end = self.spool.read(position, self.chunk_records)
+            if not records:
+                break
+            self.failed = self.upload(records)
+            if self.failed:
+                logger.warning(f"{self.failed} batches failed; leaving the chunk of {len(records):,} jobs and those after it in the spool {self.spool.path}")
+                break
+            self.spool.ack(end)
+            position = end
+            self.drained += len(records)
+            self.report()
+        if self.failed or not self.drained:
+            self.report()
+        return self.failed
+
+    def metrics(self) -> dict:
+        records, size = self.spool.depth()
+        duration = timer() - self._started if self._started else 0.0
+        return {
+            "depth_records": records,
+            "depth_bytes": size,
+            "drained_records": self.drained,
+            "drain_rate": self.drained / duration if duration else 0.0,
+            "failed_batches": self.failed,
+        }
+
+    def report(self) -> dict:
+        """Log the metrics and write them to ``metrics.json`` in the spool."""
+        metrics = self.metrics()
+        write_json(os.path.join(self.spool.path, "metrics.json"), metrics)
+        logger.info(
+            f"spool {self.spool.path}: {metrics['depth_records']:,} jobs ({metrics['depth_bytes']:,} bytes) queued, "
+            f"{metrics['drained_records']:,} drained at {metrics['drain_rate']:,.0f} jobs/s"
+        )
+        return metrics
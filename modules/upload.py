@@ -0,0 +1,418 @@
+"""
+Pipelined batch uploads to the Coact GraphQL service.
+
+The synchronous ``Client.execute`` path blocks the caller for the full round
+trip of every mutation. ``PipelinedUploader`` instead drives the client's
+``AIOHTTPTransport`` from an asyncio event loop running in a background
+thread, so the caller can keep parsing while up to ``concurrency`` batches
+are in flight. Once every slot is busy ``submit`` blocks, which applies
+backpressure to the producer.
+
+``RequestEncoder`` optionally serializes the ``jobsImport`` request bodies
+itself, gzip-compressing them and sizing the batches by their encoded size
+rather than their number of jobs. Every job repeats the same keys and most
+of its timestamp, so the bodies compress well. The encoded batches are
+posted through the transport's ``extra_args``, which the server has to
+accept with ``Content-Encoding: gzip``.
+
+``AdaptiveBatchSize`` sizes the batches from the observed throughput of the
+mutations, so that they take about a target latency, and halves them on
+failures. ``Bisector`` retries a failed batch in halves until the records
+that fail on their own are isolated and written to a ``DeadLetterFile``.
+"""
+
+import asyncio
+import gzip
+import json
+import threading
+from concurrent.futures import Future
+from timeit import default_timer as timer
+from typing import Awaitable, Callable, Iterator, Optional, TypedDict
+
+from gql import Client, gql
+from graphql import DocumentNode, print_ast
+from loguru import logger
+
+JOBS_IMPORT_GQL = gql("""
+    mutation jobsImport($jobs: [Job!]!) {
+        jobsImport(jobs: $jobs) {
+            insertedCount
+            upsertedCount
+            modifiedCount
+            deletedCount
+        }
+    }
+""")
+
+
+class ImportCounts(TypedDict):
+    insertedCount: int
+    upsertedCount: int
+    modifiedCount: int
+    deletedCount: int
+
+
+def empty_counts() -> ImportCounts:
+    return ImportCounts(insertedCount=0, upsertedCount=0, modifiedCount=0, deletedCount=0)
+
+
+def add_counts(totals: ImportCounts, result: dict) -> ImportCounts:
+    """Accumulate the counts of a single ``jobsImport`` result into ``totals``."""
+    for k in totals:
+        totals[k] += result.get(k) or 0
+    return totals
+
+
+# jobs in the first batch sized by bytes, before the size of a job is known
+FIRST_SIZED_BATCH = 5000
+
+
+class EncodedBatch(list):
+    """A batch of jobs along with its serialized request body."""
+
+    def __init__(self, jobs: list, body: bytes, raw_bytes: int, compressed: bool, encoder: Optional["RequestEncoder"] = None):
+        super().__init__(jobs)
+        self.body = body
+        self.raw_bytes = raw_bytes
+        self.compressed = compressed
+        # used to encode the halves of the batch when it is retried
+        self.encoder = encoder
+
+    @property
+    def ratio(self) -> float:
+        return self.raw_bytes / len(self.body) if self.body else 1.0
+
+    def extra_args(self) -> dict:
+        """Arguments for the aiohttp post sending the body in place of the transport's JSON."""
+        headers = {"Content-Type": "application/json"}
+        if self.compressed:
+            headers["Content-Encoding"] = "gzip"
+        return {"json": None, "data": self.body, "headers": headers}
+
+    def describe(self) -> str:
+        if not self.compressed:
+            return f"{len(self.body):,} bytes"
+        return f"{len(self.body):,} bytes ({self.raw_bytes:,} uncompressed, {self.ratio:.1f}x)"
+
+
+def execute_args(jobs: list) -> dict:
+    """Keyword arguments for ``execute`` uploading ``jobs``, using the body of an ``EncodedBatch``."""
+    if isinstance(jobs, EncodedBatch):
+        return {"extra_args": jobs.extra_args()}
+    return {}
+
+
+def upload_summary(result: dict, duration: float, jobs: list) -> str:
+    wire = f", {jobs.describe()}" if isinstance(jobs, EncodedBatch) else ""
+    return (
+        f"imported jobs Inserted={result['insertedCount']}, Upserted={result['upsertedCount']}, "
+        f"Deleted={result['deletedCount']}, Modified={result['modifiedCount']} in {duration:,.02f}s{wire}"
+    )
+
+
+class RequestEncoder:
+    """
+    Serialize batches of jobs into (optionally gzipped) ``jobsImport`` request bodies.
+
+    Example usage:
+        encoder = RequestEncoder(compress=True)
+        for batch in encoder.batches(jobs, max_jobs=150000, target_bytes=8 << 20):
+            uploader.submit(batch)
+    """
+
+    def __init__(self, document: DocumentNode = JOBS_IMPORT_GQL, compress: bool = True, level: int = 6):
+        self.query = print_ast(document)
+        self.compress = compress
+        self.level = level
+
+    def encode(self, jobs: list) -> EncodedBatch:
+        raw = json.dumps({"query": self.query, "variables": {"jobs": jobs}}, separators=(",", ":")).encode()
+        body = gzip.compress(raw, compresslevel=self.level) if self.compress else raw
+        return EncodedBatch(jobs, body, len(raw), self.compress, self)
+
+    def batches(self, jobs, max_jobs: int, target_bytes: Optional[int] = None) -> Iterator[EncodedBatch]:
+        """Encode ``jobs`` in batches of at most ``max_jobs``, sized to about ``target_bytes`` if given."""
+        size = max_jobs if target_bytes is None else min(max_jobs, FIRST_SIZED_BATCH)
+        buffer = []
+        for job in jobs:
+            buffer.append(job)
+            if len(buffer) >= size:
+                batch = self.encode(buffer)
+                yield batch
+                buffer = []
+                if target_bytes is not None:
+                    size = self.next_size(batch, target_bytes, max_jobs)
+        if buffer:
+            yield self.encode(buffer)
+
+    @staticmethod
+    def next_size(batch: EncodedBatch, target_bytes: int, max_jobs: int) -> int:
+        """The number of jobs expected to encode to ``target_bytes``, from the size of ``batch``."""
+        per_job = len(batch.body) / len(batch)
+        return max(1, min(max_jobs, int(target_bytes / per_job)))
+
+
+class AdaptiveBatchSize:
+    """
+    Batch size adjusted to the latency and failures of the uploads.
+
+    After every upload the size is set to the number of jobs the observed
+    throughput uploads in ``target_latency`` seconds, changing by at most
+    half of the size at a time. A failed upload halves the size.
+
+    Example usage:
+        sizes = AdaptiveBatchSize(150000, target_latency=60)
+        for batch in sizes.batches(jobs):
+            s = timer()
+            ok = upload(batch)
+            sizes.record(len(batch), timer() - s, failed=not ok)
+    """
+
+    def __init__(self, initial: int, target_latency: float = 60.0, minimum: int = 1000, maximum: Optional[int] = None):
+        self.minimum = min(minimum, initial)
+        self.maximum = maximum or initial * 4
+        self.target_latency = target_latency
+        self.size = initial
+        # record is called from the upload thread
+        self._lock = threading.Lock()
+
+    def record(self, jobs: int, latency: float, failed: bool = False) -> int:
+        """Adjust the size after uploading ``jobs`` in ``latency`` seconds; returns the new size."""
+        with self._lock:
+            if failed:
+                size = self.size // 2
+            else:
+                ideal = jobs / max(latency, 1e-3) * self.target_latency
+                size = min(max(ideal, self.size / 2), self.size * 1.5)
+            self.size = int(min(max(size, self.minimum), self.maximum))
+            logger.debug(f"upload of {jobs:,} jobs {'failed' if failed else 'took'} after {latency:,.02f}s, batch size now {self.size:,}")
+            return self.size
+
+    def batches(self, jobs) -> Iterator[list]:
+        """Group jobs into lists of the current size, yielding each as it fills."""
+        buffer = []
+        for job in jobs:
+            buffer.append(job)
+            if len(buffer) >= self.size:
+                yield buffer
+                buffer = []
+        if buffer:
+            yield buffer
+
+
+class DeadLetterFile:
+    """Jobs that could not be uploaded, appended to a file as JSON lines with the error."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def write(self, jobs: list, error: Exception) -> None:
+        with self._lock, open(self.path, "a") as f:
+            for job in jobs:
+                f.write(json.dumps({"error": str(error), "job": job}) + "\n")
+            self.count += len(jobs)
+        logger.error(f"wrote {len(jobs)} jobs that failed to upload to {self.path}: {error}")
+
+
+class Bisector:
+    """
+    Retry a failed batch in halves, down to the jobs that fail on their own.
+
+    ``max_failures`` bounds the failed requests spent on one batch, so that
+    an unavailable server doesn't turn a batch into thousands of requests;
+    once it is spent the jobs still failing go to the dead letters as they
+    are.
+    """
+
+    def __init__(self, dead_letters: DeadLetterFile, max_failures: int = 32):
+        self.dead_letters = dead_letters
+        self.max_failures = max_failures
+
+    @staticmethod
+    def halves(jobs: list) -> list:
+        mid = len(jobs) // 2
+        halves = [jobs[:mid], jobs[mid:]]
+        if isinstance(jobs, EncodedBatch) and jobs.encoder:
+            return [jobs.encoder.encode(h) for h in halves]
+        return halves
+
+    def retry(self, upload: Callable[[list], object], jobs: list, error: Exception) -> bool:
+        """Retry ``jobs`` after their upload failed with ``error``; True if every job was uploaded."""
+        failures = 1
+        failed = [(jobs, error)]
+        uploaded = True
+        while failed:
+            batch, error = failed.pop()
+            if len(batch) == 1 or failures >= self.max_failures:
+                self.dead_letters.write(batch, error)
+                uploaded = False
+                continue
+            for half in reversed(self.halves(batch)):
+                try:
+                    upload(half)
+                except Exception as e:
+                    failures += 1
+                    failed.append((half, e))
+        return uploaded
+
+    async def retry_async(self, upload: Callable[[list], Awaitable], jobs: list, error: Exception) -> bool:
+        """Like ``retry``, with a coroutine function uploading the batches."""
+        failures = 1
+        failed = [(jobs, error)]
+        uploaded = True
+        while failed:
+            batch, error = failed.pop()
+            if len(batch) == 1 or failures >= self.max_failures:
+                self.dead_letters.write(batch, error)
+                uploaded = False
+                continue
+            for half in reversed(self.halves(batch)):
+                try:
+                    await upload(half)
+                except Exception as e:
+                    failures += 1
+                    failed.append((half, e))
+        return uploaded
+
+
+class PipelinedUploader:
+    """
+    Upload job batches with a bounded number of concurrent ``jobsImport`` mutations.
+
+    Example usage:
+        with PipelinedUploader(client, concurrency=4) as uploader:
+            for batch in batches:
+                uploader.submit(batch)
+        logger.info(uploader.totals)
+    """
+
+    def __init__(self, client: Client, concurrency: int = 2, document=JOBS_IMPORT_GQL, sizes: Optional[AdaptiveBatchSize] = None, bisector: Optional[Bisector] = None):
+        if concurrency < 1:
+            raise ValueError(f"concurrency must be at least 1, got {concurrency}")
+        self.client = client
+        self.concurrency = concurrency
+        self.document = document
+        # told about the latency of every upload
+        self.sizes = sizes
+        # retries failed batches in halves
+        self.bisector = bisector
+        self.totals = empty_counts()
+        self.batches = 0
+        self.failed_batches = 0
+        self.failed_jobs = 0
+        self._slots = threading.BoundedSemaphore(concurrency)
+        self._lock = threading.Lock()
+        self._pending: set[Future] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._session = None
+
+    def __enter__(self) -> "PipelinedUploader":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def start(self) -> None:
+        """Start the event loop thread and open the GraphQL session."""
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="jobs-uploader", daemon=True)
+        self._thread.start()
+        self._session = asyncio.run_coroutine_threadsafe(self.client.connect_async(), self._loop).result()
+        logger.debug(f"pipelined uploader started with {self.concurrency} batches in flight")
+
+    def submit(self, jobs: list, on_success: Optional[Callable[[list], None]] = None) -> None:
+        """Queue a batch for upload, blocking while ``concurrency`` batches are already in flight.
+
+        ``on_success`` is called with the batch from the upload thread once it was imported.
+        """
+        waited = timer()
+        self._slots.acquire()
+        waited = timer() - waited
+        if waited > 0.01:
+            logger.trace(f"upload backpressure: waited {waited:,.02f}s for a free slot")
+        future = asyncio.run_coroutine_threadsafe(self._upload(jobs, on_success), self._loop)
+        with self._lock:
+            self._pending.add(future)
+        future.add_done_callback(self._done)
+
+    def _done(self, future: Future) -> None:
+        with self._lock:
+            self._pending.discard(future)
+        self._slots.release()
+
+    async def _upload(self, jobs: list, on_success: Optional[Callable[[list], None]] = None) -> None:
+        uploaded = []
+
+        async def upload(batch: list) -> None:
+            await self._execute(batch)
+            uploaded.append(batch)
+
+        try:
+            await upload(jobs)
+        except Exception as e:
+            if self.bisector is None:
+                logger.exception(f"upload of {len(jobs)} jobs failed: {e}")
+                retried = False
+            else:
+                logger.warning(f"upload of {len(jobs)} jobs failed, retrying in halves: {e}")
+                retried = await self.bisector.retry_async(upload, jobs, e)
+            if not retried:
+                with self._lock:
+                    self.failed_batches += 1
+                    self.failed_jobs += len(jobs)
+        # outside of the upload's error handling, so that a failing callback does not upload the jobs again
+        if on_success:
+            for batch in uploaded:
+                try:
+                    on_success(batch)
+                except Exception as e:
+                    logger.exception(f"could not record the upload of {len(batch)} jobs: {e}")
+
+    async def _execute(self, jobs: list) -> None:
+        s = timer()
+        try:
+            result = (await self._session.execute(self.document, {"jobs": jobs}, **execute_args(jobs)))["jobsImport"]
+        except Exception:
+            if self.sizes:
+                self.sizes.record(len(jobs), timer() - s, failed=True)
+            raise
+        duration = timer() - s
+        if self.sizes:
+            self.sizes.record(len(jobs), duration)
+        with self._lock:
+            self.batches += 1
+            add_counts(self.totals, result)
+        logger.info(upload_summary(result, duration, jobs))
+
+    def join(self) -> None:
+        """Wait for every submitted batch to complete."""
+        while True:
+            with self._lock:
+                pending = list(self._pending)
+            if not pending:
+                return
+            for f in pending:
+                f.result()
+
+    def close(self) -> ImportCounts:
+        """Wait for outstanding uploads, close the session and stop the loop thread."""
+        if self._loop is None:
+            return self.totals
+        try:
+            self.join()
+            asyncio.run_coroutine_threadsafe(self.client.close_async(), self._loop).result()
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+            self._loop = None
+        logger.info(
+            f"uploaded {self.batches} batches: Inserted={self.totals['insertedCount']}, "
+            f"Upserted={self.totals['upsertedCount']}, Deleted={self.totals['deletedCount']}, "
+            f"Modified={self.totals['modifiedCount']} ({self.failed_batches} batches failed)"
+        )
+        return self.totals
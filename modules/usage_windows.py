@@ -0,0 +1,237 @@
+"""
+Multi-window usage of the facility allocations from cumulative sums.
+
+``UsageWindows`` keeps, for every (facility, cluster), the cumulative
+resource hours at the end of each of the last ``minutes`` minutes in a ring
+of doubles, and optionally at the end of each of the last ``hours`` hours in
+a second, coarser ring. The usage of any window is then the difference of
+two entries, so window sums, percentages of the purchase and projections of
+when an allocation runs out take constant time whatever the window.
+
+Windows up to ``minutes`` are exact to the minute. Longer windows take the
+part beyond the minute ring from the hour ring, interpolating linearly
+within the oldest hour. Keeping a year as minutes would take 4 MB per
+allocation; a month of minutes and a year of hours take 420 kB.
+
+Jobs are added as the resource hours they used between their start and end,
+spread evenly over that time. They are only folded into the rings once a
+window is asked for, so adding costs nothing until then and the folding is
+proportional to how far back the added jobs reach.
+
+``save`` and ``load`` keep the rings in a file, for restarting without
+having to ask sacct for the whole span again.
+"""
+
+import json
+import os
+from array import array
+from itertools import accumulate
+from operator import add
+from typing import Optional
+
+from loguru import logger
+
+MINUTE = 60
+HOUR = 3600
+
+FORMAT = 1
+
+
+def zeros(size: int) -> array:
+    return array("d", bytes(8 * size))
+
+
+def advance_ring(values: array, head: int, new_head: int) -> None:
+    """Carry the cumulative value at ``head`` forward to the units after it, up to ``new_head``."""
+    size = len(values)
+    steps = min(new_head - head, size)
+    value = values[head % size]
+    start = (head + 1) % size
+    first = min(steps, size - start)
+    values[start:start + first] = array("d", [value]) * first
+    values[:steps - first] = array("d", [value]) * (steps - first)
+
+
+def fold_ring(values: array, unit: int, head: int, added: list) -> None:
+    """Add ``added`` (start, end, hours per second) to the cumulative values of the units up to ``head``."""
+    size = len(values)
+    lo_limit, hi_limit = (head - size + 1) * unit, (head + 1) * unit
+    clipped = [(max(lo, lo_limit), min(hi, hi_limit), rate) for lo, hi, rate in added]
+    clipped = [(lo, hi, rate) for lo, hi, rate in clipped if hi > lo]
+    if not clipped:
+        return
+    base = min(lo for lo, _, _ in clipped) // unit
+    count = head - base + 1
+    buckets = zeros(count)
+    # per-unit rate changes of the units covered in full
+    rates = zeros(count)
+    for lo, hi, rate in clipped:
+        first, last = lo // unit - base, (hi - 1) // unit - base
+        if first == last:
+            buckets[first] += rate * (hi - lo)
+            continue
+        buckets[first] += rate * ((first + base + 1) * unit - lo)
+        buckets[last] += rate * (hi - (last + base) * unit)
+        if last - first > 1:
+            rates[first + 1] += rate * unit
+            rates[last] -= rate * unit
+    cumulative = array("d", accumulate(map(add, buckets, accumulate(rates))))
+    start = base % size
+    first = min(count, size - start)
+    values[start:start + first] = array("d", map(add, values[start:start + first], cumulative[:first]))
+    values[:count - first] = array("d", map(add, values[:count - first], cumulative[first:]))
+
+
+class UsageWindows:
+    """
+    Resource hours per (facility, cluster) over the last ``minutes`` minutes and ``hours`` hours.
+
+    Example usage:
+        usage = UsageWindows(minutes=43800, hours=8784)
+        usage.advance(now)
+        usage.add("lcls", "milano", start, end, 12.5)
+        usage.window("lcls", "milano", 60)
+        usage.exhaustion("lcls", "milano", 10080, capacity=1200)
+    """
+
+    def __init__(self, minutes: int = 1440, hours: int = 0):
+        if hours and minutes < 60:
+            raise ValueError("an hour ring needs a minute ring of at least an hour")
+        self.minutes = minutes
+        self.hours = hours
+        # the current minute; windows end with it
+        self.head: Optional[int] = None
+        # cumulative hours at the end of the minutes [head - minutes, head] and hours [head hour - hours, head hour]
+        self._minute: dict[tuple[str, str], array] = {}
+        self._hour: dict[tuple[str, str], array] = {}
+        # (start, end, hours per second) of the jobs added since the last fold
+        self._pending: dict[tuple[str, str], list] = {}
+
+    @property
+    def span(self) -> int:
+        """The longest window in minutes."""
+        if self.hours:
+            return max(self.minutes, (self.hours - 1) * 60)
+        return self.minutes
+
+    def keys(self) -> list[tuple[str, str]]:
+        return list(self._minute)
+
+    def oldest(self) -> int:
+        """The first minute of the longest window."""
+        return self.head - self.span + 1
+
+    def advance(self, now: float) -> None:
+        """Move the current minute to that of ``now``."""
+        minute = int(now // MINUTE)
+        if self.head is not None and minute > self.head:
+            for key in self._minute:
+                advance_ring(self._minute[key], self.head, minute)
+                if self.hours:
+                    advance_ring(self._hour[key], self.head // 60, minute // 60)
+        if self.head is None or minute > self.head:
+            self.head = minute
+
+    def add(self, facility: str, cluster: str, start: float, end: float, hours: float) -> None:
+        """Spread ``hours`` evenly over ``[start, end)``, keeping the part within the span."""
+        if self.head is None:
+            raise Exception("advance must be called before adding usage")
+        key = (facility.lower(), cluster.lower())
+        if key not in self._minute:
+            self._minute[key] = zeros(self.minutes + 1)
+            if self.hours:
+                self._hour[key] = zeros(self.hours + 1)
+            self._pending[key] = []
+        if end <= start:
+            start, end = end - 1, end
+        self._pending[key].append((int(start), int(end), hours / (end - start)))
+
+    def fold(self) -> None:
+        """Fold the jobs added since the last fold into the cumulative sums."""
+        for key, added in self._pending.items():
+            if added:
+                fold_ring(self._minute[key], MINUTE, self.head, added)
+                if self.hours:
+                    fold_ring(self._hour[key], HOUR, self.head // 60, added)
+                added.clear()
+
+    def cumulative(self, facility: str, cluster: str, minute: int) -> float:
+        """The cumulative hours at the end of ``minute``, interpolated within the hour beyond the minute ring."""
+        key = (facility.lower(), cluster.lower())
+        if self._pending.get(key):
+            self.fold()
+        values = self._minute.get(key)
+        if values is None:
+            return 0.0
+        if minute >= self.head - self.minutes:
+            return values[minute % len(values)]
+        hours = self._hour[key]
+        # the minute ring holds the same sums from a later origin; align them at the oldest hour end it holds
+        aligned = self.head - self.minutes + 59 - (self.head - self.minutes + 60) % 60
+        offset = values[aligned % len(values)] - hours[(aligned // 60) % len(hours)]
+        hour, within = divmod(minute, 60)
+        before, after = hours[(hour - 1) % len(hours)], hours[hour % len(hours)]
+        return offset + before + (after - before) * (within + 1) / 60
+
+    def window(self, facility: str, cluster: str, minutes: int) -> float:
+        """The resource hours of the last ``minutes`` minutes, including the current one."""
+        if minutes > self.span:
+            raise ValueError(f"window of {minutes} minutes is longer than the {self.span} kept")
+        return self.cumulative(facility, cluster, self.head) - self.cumulative(facility, cluster, self.head - minutes)
+
+    def percent(self, facility: str, cluster: str, minutes: int, capacity: float) -> float:
+        """The window's resource hours as a percentage of ``capacity`` resource hours per hour."""
+        if not capacity:
+            return 0.0
+        return 100.0 * self.window(facility, cluster, minutes) / (capacity * minutes / 60)
+
+    def exhaustion(self, facility: str, cluster: str, minutes: int, capacity: float, threshold: float = 100.0, rate_minutes: int = 60) -> Optional[float]:
+        """
+        Minutes until the window's usage reaches ``threshold`` percent of ``capacity``, or None if it does not grow.
+
+        Projects the usage of the last ``rate_minutes`` minutes forward, while
+        the oldest usage leaves the window at the window's average rate.
+        """
+        if not capacity:
+            return None
+        budget = threshold / 100 * capacity * minutes / 60
+        used = self.window(facility, cluster, minutes)
+        if used >= budget:
+            return 0.0
+        growth = self.window(facility, cluster, rate_minutes) / rate_minutes - used / minutes
+        if growth <= 0:
+            return None
+        return (budget - used) / growth
+
+    def save(self, path: str) -> None:
+        """Write the sums to ``path``, replacing it once complete."""
+        self.fold()
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            header = {"format": FORMAT, "minutes": self.minutes, "hours": self.hours, "head": self.head, "keys": list(self._minute)}
+            f.write(json.dumps(header).encode() + b"\n")
+            for key, values in self._minute.items():
+                values.tofile(f)
+                if self.hours:
+                    self._hour[key].tofile(f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "UsageWindows":
+        """Read the sums written by ``save``."""
+        with open(path, "rb") as f:
+            header = json.loads(f.readline())
+            if header.get("format") != FORMAT:
+                raise Exception(f"{path} has format {header.get('format')}, not {FORMAT}")
+            usage = cls(minutes=header["minutes"], hours=header["hours"])
+            usage.head = header["head"]
+            for facility, cluster in header["keys"]:
+                key = (facility, cluster)
+                usage._minute[key] = array("d")
+                usage._minute[key].fromfile(f, usage.minutes + 1)
+                if usage.hours:
+                    usage._hour[key] = array("d")
+                    usage._hour[key].fromfile(f, usage.hours + 1)
+                usage._pending[key] = []
+        logger.debug(f"loaded the usage of {len(usage._minute)} allocations up to minute {usage.head} from {path}")
+        return usage
@@ -6,12 +6,15 @@ to the Coact GraphQL service.
 """
 
 from os import getenv
+import asyncio
 import logging
 import base64
 from timeit import default_timer as timer
 
 from gql import gql, Client
 from gql.transport.aiohttp import AIOHTTPTransport
+from gql.transport.exceptions import TransportClosed, TransportServerError
+import aiohttp
 from gql.transport.websockets import WebsocketsTransport
 
 from loguru import logger
@@ -25,6 +28,11 @@ websockets_logger.setLevel(logging.WARNING)
 
 SDF_COACT_URI = getenv("SDF_COACT_URI", "coact-dev.slac.stanford.edu:443/graphql-service")
 
+
+def coact_url(scheme: str) -> str:
+    """Return SDF_COACT_URI with ``scheme`` prepended, unless it already carries one."""
+    return SDF_COACT_URI if "://" in SDF_COACT_URI else f"{scheme}://{SDF_COACT_URI}"
+
 REQUEST_COMPLETE_MUTATION = gql('''mutation requestComplete( $Id: String!, $notes: String! ) { requestComplete( id: $Id, notes: $notes ) }''')
 REQUEST_INCOMPLETE_MUTATION = gql('''mutation requestIncomplete( $Id: String!, $notes: String! ) { requestIncomplete( id: $Id, notes: $notes ) }''')
 
@@ -48,7 +56,8 @@ class GraphQlClient:
             headers = {'Authorization': f'Basic {base64.b64encode(mux).decode("ascii")}'}
         return headers
 
-    def connect_graph_ql(self, graphql_uri='https://'+SDF_COACT_URI, get_schema=False, username=None, password_file=None, password=None, timeout=30):
+    def connect_graph_ql(self, graphql_uri=None, get_schema=False, username=None, password_file=None, password=None, timeout=30):
+        graphql_uri = graphql_uri or coact_url('https')
         logger.trace(f"GraphQL connect: uri={graphql_uri}, username={username}, timeout={timeout}s")
         logger.trace(f"GraphQL connect: password_file={password_file}, get_schema={get_schema}")
         if password_file:
@@ -92,13 +101,71 @@ class GraphQlClient:
         return result
 
 
+class PersistentSession:
+    """
+    A GraphQL session kept open across queries, for long-running processes.
+
+    ``Client.execute`` connects the transport for every query, which costs
+    a new HTTP session and TLS handshake each time. This keeps one session
+    open on a private event loop and reconnects once when the connection
+    fails; errors returned by the service are raised as usual.
+    It can stand in for the client as a ``back_channel``.
+
+    Example usage:
+        with PersistentSession(client) as session:
+            while True:
+                session.execute(gql(query))
+    """
+
+    def __init__(self, client: Client):
+        self.client = client
+        self.connects = 0
+        self._loop = asyncio.new_event_loop()
+        self._session = None
+
+    def connect(self) -> None:
+        self._session = self._loop.run_until_complete(self.client.connect_async())
+        self.connects += 1
+        logger.debug(f"GraphQL session opened ({self.connects} so far)")
+
+    def execute(self, document, **kwargs) -> dict:
+        if self._session is None:
+            self.connect()
+        try:
+            return self._loop.run_until_complete(self._session.execute(document, **kwargs))
+        except (TransportClosed, TransportServerError, aiohttp.ClientError, OSError) as e:
+            logger.warning(f"GraphQL connection failed ({e!r}); reconnecting")
+            self.reset()
+            self.connect()
+            return self._loop.run_until_complete(self._session.execute(document, **kwargs))
+
+    def reset(self) -> None:
+        if self._session is not None:
+            try:
+                self._loop.run_until_complete(self.client.close_async())
+            except Exception as e:
+                logger.debug(f"closing the GraphQL session failed: {e}")
+            self._session = None
+
+    def close(self) -> None:
+        self.reset()
+        self._loop.close()
+
+    def __enter__(self) -> "PersistentSession":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
 class GraphQlSubscriber(GraphQlClient):
     """GraphQL subscriber for WebSocket-based subscriptions."""
 
     subscription_transport = None
     subscription_client = None
 
-    def connect_subscriber(self, graphql_uri='wss://'+SDF_COACT_URI, get_schema=False, username=None, password_file=None, password=None, ping_interval=120, pong_timeout=60):
+    def connect_subscriber(self, graphql_uri=None, get_schema=False, username=None, password_file=None, password=None, ping_interval=120, pong_timeout=60):
+        graphql_uri = graphql_uri or coact_url('wss')
         logger.trace(f"GraphQL subscriber connect: uri={graphql_uri}, username={username}")
         logger.trace(f"GraphQL subscriber connect: ping_interval={ping_interval}, pong_timeout={pong_timeout}")
         if password_file:
@@ -0,0 +1,94 @@
+"""
+Local stand-in for the Coact GraphQL service.
+
+Runs an aiohttp server in a background thread that answers ``jobsImport``
+mutations after an injected latency, so that upload paths can be exercised
+and benchmarked without a real server.
+"""
+
+import asyncio
+import threading
+from typing import Callable, Optional, Union
+
+from aiohttp import web
+
+
+def jobs_import_handler(payload: dict) -> dict:
+    """Default handler: report every submitted job as inserted."""
+    jobs = (payload.get("variables") or {}).get("jobs", [])
+    return {"jobsImport": {"insertedCount": len(jobs), "upsertedCount": 0, "modifiedCount": 0, "deletedCount": 0}}
+
+
+class FakeCoactServer:
+    """
+    Minimal GraphQL endpoint on localhost.
+
+    Example usage:
+        with FakeCoactServer(latency=0.5) as server:
+            client = Client(transport=AIOHTTPTransport(url=server.url))
+    """
+
+    def __init__(self, latency: Union[float, Callable[[dict], float]] = 0.0, handler: Optional[Callable[[dict], dict]] = None):
+        # seconds per request, or a function of the request payload
+        self.latency = latency
+        self.handler = handler or jobs_import_handler
+        self.requests = []
+        # Content-Encoding and size on the wire of every request
+        self.encodings = []
+        self.body_bytes = []
+        self.max_in_flight = 0
+        self._in_flight = 0
+        self._loop = None
+        self._thread = None
+        self._runner = None
+        self.port = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/graphql"
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        self._in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self._in_flight)
+        try:
+            self.encodings.append(request.headers.get("Content-Encoding"))
+            self.body_bytes.append(request.content_length)
+            payload = await request.json()
+            self.requests.append(payload)
+            latency = self.latency(payload) if callable(self.latency) else self.latency
+            if latency:
+                await asyncio.sleep(latency)
+            try:
+                return web.json_response({"data": self.handler(payload)})
+            except Exception as e:
+                return web.json_response({"data": None, "errors": [{"message": str(e)}]})
+        finally:
+            self._in_flight -= 1
+
+    async def _start(self):
+        app = web.Application(client_max_size=1024 ** 3)
+        app.router.add_post("/graphql", self._handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    def start(self) -> "FakeCoactServer":
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._start(), self._loop).result()
+        return self
+
+    def stop(self) -> None:
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    def __enter__(self) -> "FakeCoactServer":
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
@@ -0,0 +1,81 @@
+"""
+Stand-in for the sacct binary.
+
+Prints synthetic ``--parsable2`` output for the requested window so that
+``run_sacct`` and the commands built on it can run without slurm. Every day
+is generated from its own seed, so repeated calls for the same window print
+the same jobs. Only jobs that ran inside ``--starttime``/``--endtime`` and
+had finished by its end are printed, as if sacct were queried at
+``--endtime``. Times are interpreted as UTC.
+
+    SLURM_TIME_FORMAT=%s python tests/fake_sacct.py --starttime=2024-01-01T00:00:00 --endtime=2024-01-01T23:59:59 ...
+
+The number of jobs per day is taken from ``FAKE_SACCT_ROWS`` (default 1000).
+``--clusters=a,b`` limits the output to the jobs of those partitions. To
+model slurmdbd answering large queries slowly, ``FAKE_SACCT_LATENCY`` adds
+that many seconds per thousand printed rows (default 0).
+"""
+
+import os
+import sys
+import time
+from calendar import timegm
+from time import strptime
+from typing import Optional
+
+if __package__:
+    from .synthetic import SACCT_HEADER, sacct_lines
+else:
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from synthetic import SACCT_HEADER, sacct_lines
+
+FAKE_SACCT = f"{sys.executable} {os.path.abspath(__file__)}"
+
+INDEX = {field: idx for idx, field in enumerate(SACCT_HEADER.split("|"))}
+
+
+def parse_time(value: str) -> int:
+    return timegm(strptime(value.strip('"'), "%Y-%m-%dT%H:%M:%S"))
+
+
+def parse_args(argv: list) -> dict:
+    args = {}
+    for arg in argv:
+        key, _, value = arg.partition("=")
+        args[key.lstrip("-")] = value
+    return args
+
+
+def window_lines(start: int, end: int, rows: int, clusters: Optional[set] = None) -> list:
+    """Synthetic rows of every day touching ``[start, end]`` for jobs that ran within it and finished by ``end``."""
+    out = []
+    # jobs of the previous day may still be running at the start of the window
+    day = start - start % 86400 - 86400
+    while day <= end:
+        for line in list(sacct_lines(rows, seed=day, day_start=day))[1:]:
+            parts = line.split("|")
+            if clusters and parts[INDEX["Partition"]] not in clusters:
+                continue
+            if start <= int(parts[INDEX["End"]]) <= end:
+                # keep job ids unique across days
+                parts[INDEX["JobID"]] = str(day // 86400 * 1000000 + int(parts[INDEX["JobID"]]))
+                out.append("|".join(parts))
+        day += 86400
+    return out
+
+
+def main(argv: list) -> None:
+    args = parse_args(argv)
+    start, end = parse_time(args["starttime"]), parse_time(args["endtime"])
+    rows = int(os.environ.get("FAKE_SACCT_ROWS", "1000"))
+    clusters = set(args["clusters"].split(",")) if args.get("clusters") else None
+    lines = window_lines(start, end, rows, clusters)
+    time.sleep(float(os.environ.get("FAKE_SACCT_LATENCY", "0")) * len(lines) / 1000)
+    out = sys.stdout
+    out.write(SACCT_HEADER + "\n")
+    for line in lines:
+        out.write(line)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,92 @@
+"""
+Stand-in for the sacctmgr binary.
+
+Keeps the ``GrpTRES=node`` limit of every account in a JSON file named by
+``FAKE_SACCTMGR_STATE`` and answers the commands the overage enforcement
+runs, either from the command line or, with no command, one per line from
+stdin as ``sacctmgr -i`` does::
+
+    modify [-i] account name=<account> set GrpTRES=node=<nodes>
+    show assoc where account=<account>,... --noheader -P format=Account,GrpNodes,GrpJobs,MaxJobs
+
+Modifying an account that is not in the state prints ``Nothing modified``.
+To model slurmdbd, ``FAKE_SACCTMGR_CONNECT`` adds that many seconds per
+sacctmgr run for connecting and authenticating, and ``FAKE_SACCTMGR_LATENCY``
+that many seconds per command (both default 0). Every command is appended to
+``FAKE_SACCTMGR_STATE`` + ``.log``.
+"""
+
+import json
+import os
+import stat
+import sys
+import time
+
+
+def load() -> dict:
+    with open(os.environ["FAKE_SACCTMGR_STATE"]) as f:
+        return json.load(f)
+
+
+def save(state: dict) -> None:
+    with open(os.environ["FAKE_SACCTMGR_STATE"], "w") as f:
+        json.dump(state, f)
+
+
+def command(args: list) -> int:
+    time.sleep(float(os.environ.get("FAKE_SACCTMGR_LATENCY", 0)))
+    with open(os.environ["FAKE_SACCTMGR_STATE"] + ".log", "a") as f:
+        f.write(" ".join(args) + "\n")
+    args = [arg for arg in args if arg != "-i"]
+    state = load()
+    if args[:2] == ["modify", "account"]:
+        name = next(arg.split("=", 1)[1] for arg in args if arg.startswith("name="))
+        nodes = next(arg.rsplit("=", 1)[1] for arg in args if arg.startswith("GrpTRES=node="))
+        if name not in state:
+            print(" Nothing modified")
+            return 1
+        state[name] = int(nodes)
+        save(state)
+        cluster = name.rsplit("@", 1)[1]
+        print(" Modified account associations...")
+        print(f"  C = {cluster:<10} A = {name:<30}")
+        return 0
+    if args[:2] == ["show", "assoc"]:
+        accounts = next((arg.split("=", 1)[1].split(",") for arg in args if arg.startswith("account=")), list(state))
+        for name in accounts:
+            if name in state:
+                nodes = "" if state[name] == -1 else state[name]
+                print(f"{name}|{nodes}||")
+        return 0
+    print(f"sacctmgr: error: unknown command {' '.join(args)}", file=sys.stderr)
+    return 1
+
+
+def install(directory: str, state: dict) -> str:
+    """Write a ``sacctmgr`` executable into ``directory`` backed by ``state``; returns its path."""
+    path = os.path.join(directory, "sacctmgr")
+    state_path = os.path.join(directory, "sacctmgr.json")
+    with open(state_path, "w") as f:
+        json.dump(state, f)
+    with open(path, "w") as f:
+        f.write(f"#!/bin/sh\nFAKE_SACCTMGR_STATE={state_path} exec {sys.executable} {os.path.abspath(__file__)} \"$@\"\n")
+    os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR)
+    return path
+
+
+def main() -> int:
+    time.sleep(float(os.environ.get("FAKE_SACCTMGR_CONNECT", 0)))
+    args = sys.argv[1:]
+    if [arg for arg in args if arg != "-i"]:
+        return command(args)
+    failed = 0
+    for line in sys.stdin:
+        if line.strip() in ("exit", "quit"):
+            break
+        if line.strip():
+            failed |= command(line.split())
+    return failed
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+"""
+Synthetic sacct data for tests and benchmarks.
+
+Generates pipe-delimited rows in the same layout that ``run_sacct`` emits
+(``SLURM_TIME_FORMAT=%s``), along with a matching coact metadata response
+so that ``SlurmImporter`` can convert the rows without a GraphQL server.
+"""
+
+import random
+from typing import Iterator, Optional
+
+SACCT_FIELDS = [
+    "JobID", "User", "UID", "Account", "Partition", "QOS", "Submit", "Start",
+    "End", "Elapsed", "NCPUS", "AllocNodes", "AllocTRES", "CPUTimeRAW",
+    "NodeList", "Reservation", "ReservationId", "State",
+]
+
+SACCT_HEADER = "|".join(SACCT_FIELDS)
+
+# (partition, node prefix, cpus per node, mem GB per node, gpus per node)
+CLUSTERS = [
+    ("milano", "sdfmilan", 120, 480, 0),
+    ("roma", "sdfrome", 120, 480, 0),
+    ("ampere", "sdfampere", 112, 952, 4),
+]
+
+FACILITIES = {
+    "lcls": ["default", "xpp", "mfx", "cxi"],
+    "rubin": ["production", "developers", "commissioning"],
+    "fermi": ["users", "l1"],
+    "neutrino": ["default", "ml-dev"],
+    "supercdms": ["default"],
+}
+
+USERS = [f"user{i:03d}" for i in range(200)]
+
+QOS = ["normal", "normal", "normal", "preemptable", "scavenger"]
+
+# 2024-01-01T00:00:00Z
+DEFAULT_DAY_START = 1704067200
+
+
+def elapsed_str(secs: int) -> str:
+    h, rem = divmod(secs, 3600)
+    m, s = divmod(rem, 60)
+    return f"{h:02d}:{m:02d}:{s:02d}"
+
+
+def sacct_row(rng: random.Random, job_id: int, day_start: int = DEFAULT_DAY_START) -> str:
+    """Build a single synthetic sacct row."""
+    partition, prefix, cpus, mem, gpus = rng.choice(CLUSTERS)
+    facility = rng.choice(list(FACILITIES))
+    repo = rng.choice(FACILITIES[facility])
+    user = rng.choice(USERS)
+    nodes = 1 if rng.random() < 0.85 else rng.randint(2, 16)
+    ncpus = rng.choice((1, 2, 4, 8, 16, 32, cpus)) * nodes
+    mem_gb = rng.choice((4, 8, 16, 32, 64, 128))
+    tres = f"billing={ncpus},cpu={ncpus},mem={mem_gb * nodes}G,node={nodes}"
+    if gpus:
+        tres += f",gres/gpu={rng.randint(1, gpus) * nodes}"
+    submit = day_start + rng.randint(0, 86000)
+    start = submit + rng.randint(0, 300)
+    elapsed = rng.randint(0, 6 * 3600)
+    end = start + elapsed
+    first = rng.randint(1, 300)
+    if nodes == 1:
+        nodelist = f"{prefix}{first:03d}"
+    else:
+        nodelist = f"{prefix}[{first:03d}-{first + nodes - 1:03d}]"
+    return "|".join([
+        str(job_id), user, str(10000 + USERS.index(user)), f"{facility}:{repo}",
+        partition, rng.choice(QOS), str(submit), str(start), str(end),
+        elapsed_str(elapsed), str(ncpus), str(nodes), tres, str(elapsed * ncpus),
+        nodelist, "", "", "COMPLETED",
+    ])
+
+
+def sacct_lines(rows: int, seed: int = 0, day_start: int = DEFAULT_DAY_START) -> Iterator[str]:
+    """Yield the header plus ``rows`` synthetic sacct lines (newline terminated)."""
+    rng = random.Random(seed)
+    yield SACCT_HEADER + "\n"
+    for i in range(rows):
+        yield sacct_row(rng, 1000000 + i, day_start=day_start) + "\n"
+
+
+def write_sacct_file(path: str, rows: int, seed: int = 0, day_start: int = DEFAULT_DAY_START) -> str:
+    """Write a synthetic sacct dump to ``path`` and return the path."""
+    with open(path, "w") as f:
+        for line in sacct_lines(rows, seed=seed, day_start=day_start):
+            f.write(line)
+    return path
+
+
+def metadata_response(day_start: int = DEFAULT_DAY_START, allocations_per_repo: int = 1, period_days: Optional[int] = None) -> dict:
+    """Build a coact ``repos``/``clusters`` response covering the synthetic facilities.
+
+    Each repo gets ``allocations_per_repo`` consecutive allocation periods per
+    cluster; the last one always covers ``day_start``.
+    """
+    import pendulum as pdl
+
+    period = (period_days or 30) * 86400
+    repos = []
+    for facility, names in FACILITIES.items():
+        for name in names:
+            allocs = []
+            for partition, _, _, _, _ in CLUSTERS:
+                for n in range(allocations_per_repo):
+                    start = day_start - (allocations_per_repo - n) * period + period // 2
+                    allocs.append({
+                        "Id": f"{facility}-{name}-{partition}-{n}",
+                        "clustername": partition,
+                        "start": pdl.from_timestamp(start).isoformat(),
+                        "end": pdl.from_timestamp(start + period).isoformat(),
+                    })
+            repos.append({
+                "Id": f"{facility}-{name}",
+                "name": name,
+                "facility": facility,
+                "principal": "nobody",
+                "leaders": [],
+                "users": [],
+                "currentComputeAllocations": allocs,
+            })
+    clusters = []
+    for partition, prefix, cpus, mem, gpus in CLUSTERS:
+        clusters.append({
+            "name": partition,
+            "memberprefixes": [prefix],
+            "cpu": cpus,
+            "gpu": gpus,
+            "mem": mem,
+            "gpumem": 40 if gpus else 0,
+        })
+    return {"repos": repos, "clusters": clusters}
+
+
+class StaticBackChannel:
+    """Minimal stand-in for a gql client that answers every query with the same response."""
+
+    def __init__(self, response: dict):
+        self.response = response
+
+    def execute(self, *args, **kwargs) -> dict:
+        return self.response
@@ -0,0 +1,95 @@
+"""
+Unit tests for the Arrow IPC sacct archives.
+"""
+
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from click.testing import CliRunner
+
+from modules import archive
+from modules.coact import SlurmImporter, slurm_import, slurm_remap, split_rows
+
+from .synthetic import SACCT_HEADER, StaticBackChannel, metadata_response, sacct_lines, write_sacct_file
+from .test_slurm_import import make_importer
+
+
+def write_archive(path, lines, **kwargs) -> archive.ArchiveWriter:
+    with archive.ArchiveWriter(str(path), **kwargs) as writer:
+        for line in lines:
+            writer.write_line(line)
+    return writer
+
+
+class TestArchive:
+
+    def test_round_trip(self, tmp_path):
+        lines = list(sacct_lines(1000, seed=3))
+        writer = write_archive(tmp_path / "day.arrow", lines, batch_rows=128)
+        assert writer.rows == 1000
+        rows = list(archive.read_rows(str(tmp_path / "day.arrow")))
+        expected = list(split_rows(line.rstrip("\n") for line in lines))
+        assert [list(p) for _, p in rows] == [p for _, p in expected]
+        assert rows[0][0] == expected[0][0]
+
+    def test_repeated_headers_and_short_rows_are_skipped(self, tmp_path):
+        lines = list(sacct_lines(10))
+        lines = lines[:5] + [SACCT_HEADER + "\n", "1|2|3\n"] + lines[5:]
+        writer = write_archive(tmp_path / "day.arrow", lines)
+        assert writer.rows == 10 and writer.skipped == 1
+        assert len(list(archive.read_rows(str(tmp_path / "day.arrow")))) == 10
+
+    def test_is_archive(self, tmp_path):
+        write_archive(tmp_path / "day.arrow", sacct_lines(10))
+        text = write_sacct_file(str(tmp_path / "day"), 10)
+        assert archive.is_archive(str(tmp_path / "day.arrow"))
+        assert not archive.is_archive(text)
+
+    def test_archive_is_smaller_than_text(self, tmp_path):
+        text = write_sacct_file(str(tmp_path / "day"), 20000)
+        with open(text) as f:
+            write_archive(tmp_path / "day.arrow", f)
+        assert (tmp_path / "day.arrow").stat().st_size < (tmp_path / "day").stat().st_size / 2
+
+
+class TestArchiveReplay:
+
+    def test_replay_matches_text_import(self, tmp_path):
+        lines = list(sacct_lines(2000, seed=5))
+        write_archive(tmp_path / "day.arrow", lines)
+        importer = make_importer()
+        expected = list(importer.iter_jobs(lines))
+        assert list(importer.convert_rows(archive.read_rows(str(tmp_path / "day.arrow")))) == expected
+
+    def test_replay_projected_columns(self, tmp_path):
+        lines = list(sacct_lines(2000, seed=6))
+        write_archive(tmp_path / "day.arrow", lines)
+        importer = make_importer()
+        rows = list(archive.read_rows(str(tmp_path / "day.arrow"), columns=SlurmImporter.FIELDS))
+        assert list(rows[0][0]) == SlurmImporter.FIELDS
+        assert list(importer.convert_rows(rows)) == list(importer.iter_jobs(lines))
+
+    def test_slurmimport_reads_archives(self, tmp_path, monkeypatch):
+        def connect(self):
+            self.back_channel = StaticBackChannel(metadata_response())
+            self.get_metadata()
+        monkeypatch.setattr(SlurmImporter, "connect", connect)
+
+        text = write_sacct_file(str(tmp_path / "day"), 500)
+        with open(text) as f:
+            write_archive(tmp_path / "day.arrow", f)
+        (tmp_path / "password").write_text("secret")
+        args = ["--username", "u", "--password-file", str(tmp_path / "password"), "--output", "json", "--data"]
+        from_text = CliRunner().invoke(slurm_import, args + [text], obj={})
+        from_archive = CliRunner().invoke(slurm_import, args + [str(tmp_path / "day.arrow")], obj={})
+        assert from_text.exit_code == 0 and from_archive.exit_code == 0
+        assert from_archive.output == from_text.output
+
+    def test_slurmremap_archive_matches_output(self, tmp_path):
+        lines = list(sacct_lines(500, seed=9))
+        path = str(tmp_path / "remapped.arrow")
+        result = CliRunner().invoke(slurm_remap, ["--archive", path], input="".join(lines), obj={})
+        assert result.exit_code == 0
+        expected = list(split_rows(result.output.splitlines()))
+        assert [list(p) for _, p in archive.read_rows(path)] == [p for _, p in expected]
@@ -0,0 +1,126 @@
+"""
+Unit tests for caching the hold states of the slurm associations.
+"""
+
+import json
+import os
+
+import pytest
+
+from modules.assoc_state import AssocStateCache
+from modules.coact import FacilityUsage, evaluate_overage
+
+from .fake_sacctmgr import install
+
+ACCOUNTS = ["fac0:_regular_@ada", "fac1:_regular_@ada"]
+
+
+class FakeTime:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeTime()
+    monkeypatch.setattr("modules.assoc_state.time.time", clock)
+    return clock
+
+
+class TestAssocStateCache:
+
+    def test_fresh_until_the_reconcile_interval(self, clock):
+        cache = AssocStateCache(reconcile_interval=600)
+        assert cache.stale(ACCOUNTS)
+        cache.update(ACCOUNTS, {"fac0:_regular_@ada": True, "fac1:_regular_@ada": False})
+        clock.now += 599
+        assert not cache.stale(ACCOUNTS)
+        clock.now += 1
+        assert cache.stale(ACCOUNTS)
+
+    def test_unknown_accounts_are_read(self, clock):
+        cache = AssocStateCache()
+        cache.update(ACCOUNTS, {"fac0:_regular_@ada": True})
+        assert cache.held["fac1:_regular_@ada"] is None
+        assert not cache.stale(ACCOUNTS)
+        assert cache.stale(ACCOUNTS + ["fac2:_regular_@ada"])
+
+    def test_drift_is_read_again(self, clock):
+        cache = AssocStateCache()
+        cache.update(ACCOUNTS, {})
+        cache.suspect()
+        assert cache.stale(ACCOUNTS)
+        cache.update(ACCOUNTS, {})
+        assert not cache.stale(ACCOUNTS)
+
+    def test_persisted(self, clock, tmp_path):
+        path = str(tmp_path / "assoc.json")
+        cache = AssocStateCache(path)
+        cache.update(ACCOUNTS, {"fac0:_regular_@ada": False, "fac1:_regular_@ada": False})
+        cache.record("fac0:_regular_@ada", True)
+        reloaded = AssocStateCache(path)
+        assert reloaded.held == {"fac0:_regular_@ada": True, "fac1:_regular_@ada": False}
+        assert not reloaded.stale(ACCOUNTS)
+        reloaded.suspect()
+        assert AssocStateCache(path).stale(ACCOUNTS)
+
+
+class UsageBackChannel:
+
+    def __init__(self, percents: dict):
+        self.percents = percents
+
+    def execute(self, document, **kwargs) -> dict:
+        return {
+            "000060": [{"facility": f, "cluster": "ada", "percentUsed": p} for f, p in self.percents.items()],
+            "facilities": [{"name": f, "computepurchases": [{"clustername": "ada", "purchased": 10}]} for f in self.percents],
+            "repos": [{"facility": f, "allocs": [{"cluster": "ada", "start": "2026-01-01", "end": "2027-01-01"}]} for f in self.percents],
+        }
+
+
+class TestCachedEvaluations:
+
+    @pytest.fixture
+    def sacctmgr(self, tmp_path, monkeypatch):
+        install(str(tmp_path), {"fac0:_regular_@ada": 10, "fac1:_regular_@ada": 10})
+        monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+        return tmp_path
+
+    @staticmethod
+    def shows(directory) -> int:
+        with open(directory / "sacctmgr.json.log") as f:
+            return sum(line.startswith("show") for line in f)
+
+    def usages(self, percents: dict, cache=None) -> FacilityUsage:
+        usage = FacilityUsage(username="u", password_file="/dev/null", windows=[60], threshold=100.0, dry_run=False, assoc_cache=cache)
+        usage.back_channel = UsageBackChannel(percents)
+        return usage
+
+    def test_without_a_cache_every_evaluation_reads_sacctmgr(self, sacctmgr):
+        usage = self.usages({"fac0": 50, "fac1": 50})
+        evaluate_overage(usage, "2026-04-15", dry_run=False)
+        evaluate_overage(usage, "2026-04-15", dry_run=False)
+        assert self.shows(sacctmgr) == 2
+
+    def test_own_changes_update_the_cache(self, sacctmgr):
+        usage = self.usages({"fac0": 150, "fac1": 50}, AssocStateCache())
+        points = evaluate_overage(usage, "2026-04-15", dry_run=False)
+        assert [p["change"] for p in points] == [True, False]
+        points = evaluate_overage(usage, "2026-04-15", dry_run=False)
+        assert [(p["held"], p["change"]) for p in points] == [(True, False), (False, False)]
+        assert self.shows(sacctmgr) == 1
+        with open(sacctmgr / "sacctmgr.json") as f:
+            assert json.load(f)["fac0:_regular_@ada"] == 0
+
+    def test_failed_changes_are_reconciled(self, sacctmgr):
+        cache = AssocStateCache()
+        usage = self.usages({"fac0": 150, "fac1": 50}, cache)
+        evaluate_overage(usage, "2026-04-15", dry_run=False)
+        cache.suspect()
+        evaluate_overage(usage, "2026-04-15", dry_run=False)
+        assert self.shows(sacctmgr) == 2
+        assert cache.held == {"fac0:_regular_@ada": True, "fac1:_regular_@ada": False}
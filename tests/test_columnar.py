@@ -0,0 +1,56 @@
+"""
+Unit tests for the NumPy columnar conversion engine.
+"""
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from modules.columnar import ColumnarConverter
+
+from .synthetic import SACCT_HEADER, sacct_lines
+from .test_slurm_import import make_importer
+
+
+def scalar_jobs(importer, lines):
+    return list(importer.iter_jobs(lines))
+
+
+class TestColumnarConverter:
+    """The columnar engine must reproduce the scalar path exactly."""
+
+    def test_matches_scalar_path(self):
+        importer = make_importer()
+        lines = list(sacct_lines(5000, seed=11))
+        expected = scalar_jobs(importer, lines)
+        converter = ColumnarConverter(importer, chunk_size=777)
+        assert list(converter.iter_jobs(lines)) == expected
+        assert converter.fallbacks == 0
+
+    def test_edge_rows_use_scalar_path(self):
+        importer = make_importer()
+        rows = [
+            # unknown partition
+            "1|u|1|lcls:default|nope|normal|0|1704100000|1704103600|01:00:00|4|1|cpu=4,mem=8G|0|sdfmilan001|||COMPLETED",
+            # zero allocated nodes
+            "2|u|1|lcls:default|milano|normal|0|1704100000|1704103600|01:00:00|4|0|cpu=4,mem=8G|0|sdfmilan001|||COMPLETED",
+            # gpu requested on a cluster without gpus, the scalar path raises
+            "3|u|1|lcls:default|milano|normal|0|1704100000|1704103600|01:00:00|4|1|cpu=4,gres/gpu=1|0|sdfmilan001|||COMPLETED",
+        ]
+        lines = [SACCT_HEADER + "\n"] + [r + "\n" for r in rows]
+        converter = ColumnarConverter(importer)
+        with pytest.raises(ZeroDivisionError):
+            list(converter.iter_jobs(lines))
+        assert list(converter.iter_jobs(lines[:3])) == scalar_jobs(importer, lines[:3])
+        assert converter.fallbacks == 5
+
+    def test_high_memory_nodes(self):
+        importer = make_importer()
+        rows = [
+            "1|u|1|lcls:default|milano|normal|0|1704100000|1704103600|01:00:00|4|1|cpu=4,mem=800G|0|sdfmilan270|||COMPLETED",
+            "2|u|1|lcls:default|milano|normal|0|1704100000|1704103600|01:00:00|4|1|cpu=4,mem=800G|0|sdfmilan200|||COMPLETED",
+        ]
+        lines = [SACCT_HEADER + "\n"] + [r + "\n" for r in rows]
+        jobs = list(ColumnarConverter(importer).iter_jobs(lines))
+        assert jobs == scalar_jobs(importer, lines)
+        assert jobs[0]["resourceHours"] < jobs[1]["resourceHours"]
@@ -0,0 +1,168 @@
+"""
+Unit tests for skipping unchanged jobs with the dedup store.
+"""
+
+import sqlite3
+
+from gql import Client
+from gql.transport.aiohttp import AIOHTTPTransport
+
+from modules.dedup import DedupStore
+
+from .fake_coact import FakeCoactServer, jobs_import_handler
+from .synthetic import sacct_lines
+from .test_slurm_import import make_importer
+
+
+def job(job_id: str, alloc: str = "a", hours: float = 1.0, start: str = "2024-01-01T00:00:00.000Z") -> dict:
+    return {"jobId": job_id, "username": "u", "allocationId": alloc, "qos": "normal",
+            "startTs": start, "endTs": "2024-01-01T01:00:00.000Z", "resourceHours": hours}
+
+
+def upload(store: DedupStore, jobs: list) -> list:
+    sent = list(store.changed(jobs))
+    store.acknowledge(sent)
+    store.commit()
+    return sent
+
+
+class TestDedupStore:
+
+    def test_only_changed_jobs(self, tmp_path):
+        path = str(tmp_path / "dedup.sqlite")
+        with DedupStore(path) as store:
+            assert len(upload(store, [job("1"), job("2")])) == 2
+        with DedupStore(path) as store:
+            sent = upload(store, [job("1"), job("2", hours=2.0), job("3")])
+            assert [j["jobId"] for j in sent] == ["2", "3"]
+            assert store.skipped == 1
+            assert store.count() == 3
+
+    def test_keyed_by_allocation(self, tmp_path):
+        with DedupStore(str(tmp_path / "dedup.sqlite")) as store:
+            upload(store, [job("1", alloc="a"), job("1", alloc=None)])
+            assert upload(store, [job("1", alloc="b"), job("1", alloc=None)]) == [job("1", alloc="b")]
+            assert store.count() == 3
+
+    def test_unacknowledged_jobs_are_sent_again(self, tmp_path):
+        with DedupStore(str(tmp_path / "dedup.sqlite")) as store:
+            jobs = [job(str(i)) for i in range(10)]
+            sent = list(store.changed(jobs))
+            store.acknowledge(sent[:4])
+            assert store.commit() == 4
+            assert [j["jobId"] for j in upload(store, jobs)] == [str(i) for i in range(4, 10)]
+
+    def test_a_failed_batch_is_not_recorded_by_another_record_of_the_job(self, tmp_path):
+        with DedupStore(str(tmp_path / "dedup.sqlite")) as store:
+            first, requeued = job("1", hours=1.0), job("1", hours=2.0)
+            sent = list(store.changed([first, requeued]))
+            # the batch with the requeued record made it, the one with the first did not
+            store.acknowledge(sent[1:])
+            store.commit()
+            assert upload(store, [first, requeued]) == [first]
+
+    def test_requeued_records_are_uploaded_once(self, tmp_path):
+        records = [job("1", hours=0.5), job("1", hours=0.3, start="2024-01-01T00:40:00.000Z")]
+        with DedupStore(str(tmp_path / "dedup.sqlite")) as store:
+            assert upload(store, records) == records
+            assert upload(store, records) == []
+            assert store.count() == 2
+
+    def test_old_schema_is_replaced(self, tmp_path):
+        path = str(tmp_path / "dedup.sqlite")
+        db = sqlite3.connect(path)
+        db.execute("CREATE TABLE jobs (job_id TEXT NOT NULL, allocation_id TEXT NOT NULL, digest TEXT NOT NULL, "
+                   "PRIMARY KEY (job_id, allocation_id)) WITHOUT ROWID")
+        db.execute("INSERT INTO jobs VALUES ('1', 'a', 'x')")
+        db.commit()
+        db.close()
+        with DedupStore(path) as store:
+            assert store.count() == 0
+            assert upload(store, [job("1")]) == [job("1")]
+        with DedupStore(path) as store:
+            assert upload(store, [job("1")]) == []
+
+    def test_jobs_beyond_the_retention_are_pruned(self, tmp_path):
+        with DedupStore(str(tmp_path / "dedup.sqlite"), retention_days=30) as store:
+            upload(store, [job("1", start="2024-01-01T00:00:00.000Z"), job("2", start="2024-01-20T00:00:00.000Z")])
+            assert store.prune() == 0
+            upload(store, [job("3", start="2024-02-15T00:00:00.000Z")])
+            assert store.prune() == 1
+            assert upload(store, [job("1", start="2024-01-01T00:00:00.000Z"), job("2", start="2024-01-20T00:00:00.000Z")]) == [job("1")]
+
+    def test_full_resync(self, tmp_path):
+        path = str(tmp_path / "dedup.sqlite")
+        with DedupStore(path) as store:
+            upload(store, [job("1")])
+        with DedupStore(path, full_resync=True) as store:
+            assert upload(store, [job("1"), job("2")]) == [job("1"), job("2")]
+        with DedupStore(path) as store:
+            assert upload(store, [job("1"), job("2")]) == []
+
+    def test_lookups_span_chunks(self, tmp_path, monkeypatch):
+        monkeypatch.setattr("modules.dedup.LOOKUP_CHUNK", 7)
+        with DedupStore(str(tmp_path / "dedup.sqlite")) as store:
+            jobs = [job(str(i)) for i in range(50)]
+            upload(store, jobs)
+            jobs[20] = job("20", hours=3.0)
+            assert upload(store, jobs) == [jobs[20]]
+
+
+class TestImporterDedup:
+
+    def test_steady_state_uploads_nothing(self, tmp_path):
+        lines = list(sacct_lines(1000))
+        path = str(tmp_path / "dedup.sqlite")
+        importer = make_importer()
+        importer.dedup = DedupStore(path)
+        uploaded = []
+        importer.generate_output = lambda batch, output_format: uploaded.extend(batch)
+        assert importer.output(importer.iter_jobs(lines), "upload", 300) == 1000
+        assert importer.output(importer.iter_jobs(lines), "upload", 300) == 0
+        assert len(uploaded) == 1000
+
+    def test_printed_jobs_are_not_recorded(self, tmp_path):
+        lines = list(sacct_lines(100))
+        importer = make_importer()
+        importer.dedup = DedupStore(str(tmp_path / "dedup.sqlite"))
+        importer.generate_output = lambda batch, output_format: None
+        assert importer.output(importer.iter_jobs(lines), "json", 30) == 100
+        assert importer.dedup.count() == 0
+        assert importer.output(importer.iter_jobs(lines), "upload", 30) == 100
+
+    def test_failed_batches_are_retried(self, tmp_path):
+        lines = list(sacct_lines(1000))
+        importer = make_importer()
+        importer.dedup = DedupStore(str(tmp_path / "dedup.sqlite"))
+        calls = []
+
+        def generate_output(batch, output_format):
+            calls.append(len(batch))
+            return len(calls) != 2
+        importer.generate_output = generate_output
+        importer.output(importer.iter_jobs(lines), "upload", 300)
+        assert importer.failed_batches == 1
+        assert importer.output(importer.iter_jobs(lines), "upload", 300) == 300
+
+    def test_pipelined_uploads_are_acknowledged(self, tmp_path):
+        lines = list(sacct_lines(1000))
+        failed = []
+
+        def handler(payload):
+            jobs = payload["variables"]["jobs"]
+            if not failed:
+                failed.extend(jobs)
+                raise RuntimeError("boom")
+            return jobs_import_handler(payload)
+
+        importer = make_importer()
+        importer.concurrency = 2
+        importer.dedup = DedupStore(str(tmp_path / "dedup.sqlite"))
+        with FakeCoactServer(handler=handler) as server:
+            importer.back_channel = Client(transport=AIOHTTPTransport(url=server.url), execute_timeout=30)
+            importer.output(importer.iter_jobs(lines), "upload", 250)
+            assert importer.failed_batches == 1
+            assert importer.dedup.count() == 750
+            importer.output(importer.iter_jobs(lines), "upload", 250)
+            assert len(server.requests) == 5
+            assert [j["jobId"] for j in server.requests[-1]["variables"]["jobs"]] == [j["jobId"] for j in failed]
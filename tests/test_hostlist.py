@@ -0,0 +1,84 @@
+"""
+Unit tests for Slurm hostlist parsing and membership checks.
+"""
+
+from modules.hostlist import HostSet, expand_hostlist, parse_hostlist, split_hostlist
+
+
+class TestHostlistParsing:
+    """Test splitting and expansion of compressed hostlists."""
+
+    def test_split_multi_prefix(self):
+        assert split_hostlist("a[1-3],b[5]") == ["a[1-3]", "b[5]"]
+        assert split_hostlist("sdfmilan[001-002,010],sdfrome003") == ["sdfmilan[001-002,010]", "sdfrome003"]
+        assert split_hostlist("") == []
+
+    def test_parse_ranges(self):
+        (item,) = parse_hostlist("sdfmilan[001-003,010]")
+        assert item.prefix == "sdfmilan"
+        assert item.ranges == ((1, 3, 3), (10, 10, 3))
+
+    def test_unparseable_is_literal(self):
+        (item,) = parse_hostlist("invalid[format")
+        assert item.prefix == "invalid[format"
+        assert item.ranges == ()
+
+    def test_expand(self):
+        assert list(expand_hostlist("a[1-3],b[5]")) == ["a1", "a2", "a3", "b5"]
+        assert list(expand_hostlist("sdfrome[008-010]")) == ["sdfrome008", "sdfrome009", "sdfrome010"]
+        assert list(expand_hostlist("node[1-2]-ib")) == ["node1-ib", "node2-ib"]
+        assert list(expand_hostlist("sdfmilan001")) == ["sdfmilan001"]
+
+
+class TestHostSet:
+    """Test range intersection without expansion."""
+
+    def setup_method(self):
+        self.hosts = HostSet(["sdfmilan269", "sdfmilan270", "sdfmilan271", "sdfmilan272"])
+
+    def test_single_node(self):
+        assert self.hosts.first_member("sdfmilan270") == "sdfmilan270"
+        assert self.hosts.first_member("sdfmilan001") is None
+
+    def test_range_intersection(self):
+        assert self.hosts.first_member("sdfmilan[001-300]") == "sdfmilan269"
+        assert self.hosts.first_member("sdfmilan[271-280]") == "sdfmilan271"
+        assert self.hosts.first_member("sdfmilan[001-268,273-300]") is None
+
+    def test_first_in_list_order(self):
+        assert self.hosts.first_member("sdfmilan[272,269]") == "sdfmilan272"
+
+    def test_multi_prefix(self):
+        assert self.hosts.first_member("sdfrome[001-300],sdfmilan[270]") == "sdfmilan270"
+        assert self.hosts.first_member("sdfrome[269-272]") is None
+        assert self.hosts.first_member("sdfmilan001,sdfmilan271") == "sdfmilan271"
+
+    def test_padding_must_match(self):
+        assert self.hosts.first_member("sdfmilan[0269]") is None
+        assert self.hosts.first_member("sdfmilan0269") is None
+        assert self.hosts.first_member("sdfmilan[0269-0272]") is None
+        padded = HostSet(["sdfmilan0269", "node7", "node0008"])
+        assert padded.first_member("sdfmilan[001-300]") is None
+        assert padded.first_member("sdfmilan[0260-0270]") == "sdfmilan0269"
+        assert padded.first_member("node[1-10]") == "node7"
+        assert padded.first_member("node[01-10]") is None
+        assert padded.first_member("node[0001-0010]") == "node0008"
+
+    def test_empty_and_unparseable(self):
+        assert self.hosts.first_member("") is None
+        assert self.hosts.first_member("None assigned") is None
+        assert self.hosts.first_member("sdfmilan[269") is None
+
+    def test_results_are_cached(self):
+        for _ in range(3):
+            self.hosts.first_member("sdfmilan[001-300]")
+        assert self.hosts.first_member.cache_info().hits == 2
+
+    def test_matches_expansion(self):
+        nodelists = ["sdfmilan[001-300]", "sdfmilan[260-268,273]", "sdfmilan[265-275],sdfrome001", "sdfrome[001-100]",
+                     "sdfmilan[0001-1000]", "sdfmilan[1-9999]", "sdfmilan[00269-00272]"]
+        hosts = HostSet(["sdfmilan269", "sdfmilan0270", "sdfmilan00271", "sdfmilan1000", "sdfrome001"])
+        for nodelist in nodelists:
+            for members in (self.hosts, hosts):
+                expanded = [n for n in expand_hostlist(nodelist) if n in members.literals]
+                assert members.first_member(nodelist) == (expanded[0] if expanded else None), nodelist
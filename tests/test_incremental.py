@@ -0,0 +1,123 @@
+"""
+Unit tests for incremental sacct harvesting.
+"""
+
+import json
+
+import pendulum as pdl
+
+from modules.coact import SlurmRemapper, SlurmSync
+from modules.incremental import IncrementalState
+
+from .fake_sacct import FAKE_SACCT
+from .synthetic import SACCT_HEADER
+from .test_slurm_import import make_importer
+
+DATE = "2024-01-01"
+
+
+def job(job_id: str, end: str = "2024-01-01T01:00:00.000Z", hours: float = 1.0, start: str = "2024-01-01T00:00:00.000Z") -> dict:
+    return {"jobId": job_id, "username": "u", "allocationId": "a", "qos": "normal",
+            "startTs": start, "endTs": end, "resourceHours": hours}
+
+
+class TestIncrementalState:
+
+    def test_full_import_without_state(self, tmp_path):
+        state = IncrementalState(str(tmp_path / "state.json"), DATE)
+        assert state.window_start() is None
+        assert state.start_time("00:00:00") == "00:00:00"
+
+    def test_only_new_or_changed_jobs(self, tmp_path):
+        path = str(tmp_path / "state.json")
+        state = IncrementalState(path, DATE)
+        assert len(list(state.filter([job("1"), job("2")]))) == 2
+        state.commit()
+
+        state = IncrementalState(path, DATE)
+        out = list(state.filter([job("1"), job("2", hours=2.0), job("3", end="2024-01-01T02:00:00.000Z")]))
+        assert [j["jobId"] for j in out] == ["2", "3"]
+        assert state.skipped == 1
+        state.commit()
+        saved = json.load(open(path))
+        assert saved["high_water"] == pdl.datetime(2024, 1, 1, 2).int_timestamp
+        assert {key.split("|")[0] for key in saved["jobs"]} == {"1", "2", "3"}
+
+    def test_requeued_records_are_told_apart(self, tmp_path):
+        path = str(tmp_path / "state.json")
+        records = [job("1", end="2024-01-01T00:30:00.000Z", hours=0.5),
+                   job("1", start="2024-01-01T00:40:00.000Z", end="2024-01-01T01:00:00.000Z", hours=0.3)]
+        state = IncrementalState(path, DATE)
+        assert len(list(state.filter(records))) == 2
+        state.commit()
+        state = IncrementalState(path, DATE)
+        assert list(state.filter(records)) == []
+        assert state.skipped == 2
+
+    def test_uncommitted_run_is_repeated(self, tmp_path):
+        path = str(tmp_path / "state.json")
+        state = IncrementalState(path, DATE)
+        list(state.filter([job("1")]))
+        state = IncrementalState(path, DATE)
+        assert len(list(state.filter([job("1")]))) == 1
+
+    def test_new_date_starts_afresh(self, tmp_path):
+        path = str(tmp_path / "state.json")
+        state = IncrementalState(path, DATE)
+        list(state.filter([job("1")]))
+        state.commit()
+        state = IncrementalState(path, "2024-01-02")
+        assert state.high_water is None and state.jobs == {}
+
+    def test_start_time_includes_overlap(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(pdl, "local_timezone", lambda: pdl.timezone("UTC"))
+        path = str(tmp_path / "state.json")
+        state = IncrementalState(path, DATE, overlap=600)
+        list(state.filter([job("1", end="2024-01-01T12:00:00.000Z")]))
+        state.commit()
+        assert IncrementalState(path, DATE, overlap=600).start_time("00:00:00") == "11:50:00"
+        assert IncrementalState(path, DATE, overlap=600).start_time("13:00:00") == "13:00:00"
+        assert IncrementalState(path, "2024-01-02", overlap=600).start_time("00:00:00") == "00:00:00"
+
+
+class TestIncrementalSync:
+    """Repeated incremental runs should only push jobs once."""
+
+    def run(self, tmp_path, end_time: str, archive: bool = True) -> list:
+        importer = make_importer()
+        importer.connect = lambda: None
+        importer.state = IncrementalState(str(tmp_path / "state.json"), DATE)
+        outputs = []
+        importer.generate_output = lambda batch, output_format: outputs.extend(batch)
+        sync = SlurmSync(importer=importer, remapper=SlurmRemapper(), sacct_bin_path=FAKE_SACCT,
+                         raw_archive=str(tmp_path / "raw") if archive else None)
+        sync.run(DATE, "00:00:00", end_time, "upload", 1000)
+        return outputs
+
+    def test_printed_runs_do_not_advance_the_state(self, tmp_path):
+        importer = make_importer()
+        importer.state = IncrementalState(str(tmp_path / "state.json"), DATE)
+        importer.generate_output = lambda batch, output_format: None
+        importer.output(iter([job("1")]), "json", 10)
+        assert IncrementalState(str(tmp_path / "state.json"), DATE).high_water is None
+
+    def test_repeated_runs(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(pdl, "local_timezone", lambda: pdl.timezone("UTC"))
+        monkeypatch.setenv("FAKE_SACCT_ROWS", "300")
+        (tmp_path / "full").mkdir()
+        (tmp_path / "inc").mkdir()
+        full = self.run(tmp_path / "full", "23:59:59", archive=False)
+
+        first = self.run(tmp_path / "inc", "12:00:00")
+        second = self.run(tmp_path / "inc", "23:59:59")
+        third = self.run(tmp_path / "inc", "23:59:59")
+
+        assert third == []
+        ids = [j["jobId"] for j in first + second]
+        assert len(ids) == len(set(ids))
+        assert {j["jobId"] for j in full} == set(ids)
+        # each run writes its own archive, named after the time it starts from
+        archives = sorted(p.name for p in (tmp_path / "inc").glob("raw.*"))
+        assert archives == ["raw.000000", "raw.114847", "raw.234959"]
+        for name in archives:
+            assert (tmp_path / "inc" / name).read_text().splitlines()[0] == SACCT_HEADER
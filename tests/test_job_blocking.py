@@ -0,0 +1,82 @@
+"""
+Unit tests for applying the job blocking changes of an evaluation through one sacctmgr.
+"""
+
+import json
+import os
+
+import pytest
+
+from modules.coact import JobBlockingBatch, OveragePoint
+
+from .fake_sacctmgr import install
+
+
+def point(facility: str, cluster: str, over: bool, nodes: int = 10, window: int = 60) -> OveragePoint:
+    return OveragePoint(facility=facility, cluster=cluster, qos="regular", window_mins=window, percentages=[], percent_used=0,
+                        held=not over, over=over, change=True, purchased_nodes=nodes)
+
+
+@pytest.fixture
+def sacctmgr(tmp_path, monkeypatch):
+    state = {f"fac{i}:_regular_@ada": 10 for i in range(5)}
+    install(str(tmp_path), state)
+    monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+    return tmp_path
+
+
+def accounts(directory) -> dict:
+    with open(directory / "sacctmgr.json") as f:
+        return json.load(f)
+
+
+def commands(directory) -> list:
+    with open(directory / "sacctmgr.json.log") as f:
+        return f.read().splitlines()
+
+
+class TestJobBlockingBatch:
+
+    def test_one_sacctmgr_applies_every_change(self, sacctmgr):
+        batch = JobBlockingBatch(execute=True)
+        for i in range(4):
+            batch.add(point(f"fac{i}", "ada", over=i % 2 == 0, nodes=20))
+        assert batch.apply() == []
+        assert accounts(sacctmgr) == {"fac0:_regular_@ada": 0, "fac1:_regular_@ada": 20, "fac2:_regular_@ada": 0, "fac3:_regular_@ada": 20, "fac4:_regular_@ada": 10}
+        assert commands(sacctmgr) == [
+            "modify account name=fac0:_regular_@ada set GrpTRES=node=0",
+            "modify account name=fac1:_regular_@ada set GrpTRES=node=20",
+            "modify account name=fac2:_regular_@ada set GrpTRES=node=0",
+            "modify account name=fac3:_regular_@ada set GrpTRES=node=20",
+        ]
+
+    def test_one_change_per_allocation(self):
+        batch = JobBlockingBatch()
+        for window in (15, 60, 1440):
+            batch.add(point("fac0", "ada", over=True, window=window))
+        assert batch.script() == "modify account name=fac0:_regular_@ada set GrpTRES=node=0\nexit\n"
+
+    def test_unconfirmed_changes_fall_back_to_single_commands(self, sacctmgr):
+        batch = JobBlockingBatch(execute=True)
+        batch.add(point("fac0", "ada", over=True))
+        batch.add(point("missing", "ada", over=True))
+        assert batch.apply() == ["missing:_regular_@ada"]
+        assert commands(sacctmgr)[-1] == "modify -i account name=missing:_regular_@ada set GrpTRES=node=0"
+        assert accounts(sacctmgr)["fac0:_regular_@ada"] == 0
+
+    def test_failed_script_falls_back_to_single_commands(self, sacctmgr):
+        batch = JobBlockingBatch(execute=True, sacctmgr_bin_path=str(sacctmgr / "no-such-sacctmgr"))
+        batch.add(point("fac1", "ada", over=True))
+        assert batch.apply() == []
+        assert commands(sacctmgr) == ["modify -i account name=fac1:_regular_@ada set GrpTRES=node=0"]
+        assert accounts(sacctmgr)["fac1:_regular_@ada"] == 0
+
+    def test_dry_run_changes_nothing(self, sacctmgr):
+        batch = JobBlockingBatch(execute=False)
+        batch.add(point("fac0", "ada", over=True))
+        assert batch.apply() == []
+        assert not (sacctmgr / "sacctmgr.json.log").exists()
+
+    def test_modified_accounts_are_parsed(self):
+        output = " Modified account associations...\n  C = ada        A = fac0:_regular_@ada      \n  C = roma       A = fac1:_regular_@roma\n"
+        assert JobBlockingBatch.modified(output) == {"fac0:_regular_@ada", "fac1:_regular_@roma"}
@@ -0,0 +1,133 @@
+"""
+Unit tests for the long-running overage evaluation.
+"""
+
+import itertools
+
+import pytest
+from gql import Client, gql
+from gql.transport.aiohttp import AIOHTTPTransport
+
+from modules.coact import FacilityUsage, evaluate_overage
+from modules.scheduler import Scheduler
+from modules.utils.graphql import PersistentSession
+
+from .fake_coact import FakeCoactServer
+
+METADATA = {
+    "repos": [{"facility": "LCLS", "allocs": [{"cluster": "ada", "start": "2026-04-01", "end": "2026-05-01"}]}],
+    "facilities": [{"name": "LCLS", "computepurchases": [{"clustername": "ada", "purchased": 10}]}],
+}
+
+
+class CountingBackChannel:
+    """Answers the usage query, with the metadata only when it was asked for."""
+
+    def __init__(self, percent: float = 50.0):
+        self.percent = percent
+        self.queries = []
+
+    def execute(self, document, **kwargs) -> dict:
+        query = document.loc.source.body
+        self.queries.append(query)
+        result = {"000060": [{"facility": "LCLS", "cluster": "ada", "percentUsed": self.percent}]}
+        if "facilities" in query:
+            result.update(METADATA)
+        return result
+
+
+def usages(ttl: float) -> FacilityUsage:
+    usage = FacilityUsage(username="u", password_file="/dev/null", windows=[60], threshold=100.0, dry_run=True, metadata_ttl=ttl)
+    usage.back_channel = CountingBackChannel()
+    return usage
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def no_sacctmgr(monkeypatch):
+    monkeypatch.setattr("modules.coact.subprocess.check_output", lambda cmd: b"lcls:_regular_@ada|10||\n")
+
+
+@pytest.mark.usefixtures("no_sacctmgr")
+class TestMetadataCache:
+
+    def test_metadata_is_reused_until_it_expires(self, monkeypatch):
+        clock = FakeClock()
+        monkeypatch.setattr("modules.coact.timer", clock)
+        usage = usages(ttl=600)
+        for now in (0, 300, 599, 600, 700):
+            clock.now = now
+            points = evaluate_overage(usage, "2026-04-15", dry_run=True)
+            assert points[0]["purchased_nodes"] == 10
+        assert ["facilities" in query for query in usage.back_channel.queries] == [True, False, False, True, False]
+
+    def test_without_ttl_every_query_fetches_metadata(self):
+        usage = usages(ttl=0)
+        evaluate_overage(usage, "2026-04-15", dry_run=True)
+        evaluate_overage(usage, "2026-04-15", dry_run=True)
+        assert all("facilities" in query for query in usage.back_channel.queries)
+
+
+class TestScheduler:
+
+    def test_runs_on_the_interval(self):
+        runs = []
+        scheduler = Scheduler(0.05)
+        scheduler.run(lambda: runs.append(scheduler.clock()), cycles=4)
+        assert len(runs) == 4
+        assert runs[-1] - runs[0] >= 0.14
+        assert scheduler.overruns == 0
+
+    def test_overruns_skip_missed_runs(self):
+        clock = FakeClock()
+        durations = iter([1, 25, 1, 1])
+
+        def task():
+            clock.now += next(durations)
+        scheduler = Scheduler(10, clock=clock)
+        scheduler._stop.wait = lambda timeout: clock.__setattr__("now", clock.now + timeout)
+        starts = []
+        scheduler.run(lambda: starts.append(clock.now) or task(), cycles=4)
+        assert starts == [0, 10, 40, 50]
+        assert scheduler.overruns == 1
+        assert scheduler.skipped == 2
+
+    def test_failures_do_not_stop_the_schedule(self):
+        calls = itertools.count()
+
+        def task():
+            if next(calls) == 0:
+                raise RuntimeError("boom")
+        scheduler = Scheduler(0.01)
+        scheduler.run(task, cycles=3)
+        assert scheduler.failures == 1
+        assert scheduler.cycles == 3
+
+
+class TestPersistentSession:
+
+    def test_queries_share_one_session(self):
+        with FakeCoactServer(handler=lambda payload: {"ok": True}) as server:
+            client = Client(transport=AIOHTTPTransport(url=server.url), execute_timeout=30)
+            with PersistentSession(client) as session:
+                for _ in range(5):
+                    assert session.execute(gql("query { ok }")) == {"ok": True}
+                assert session.connects == 1
+        assert len(server.requests) == 5
+
+    def test_reconnects_when_the_connection_closed(self):
+        with FakeCoactServer(handler=lambda payload: {"ok": True}) as server:
+            client = Client(transport=AIOHTTPTransport(url=server.url), execute_timeout=30)
+            with PersistentSession(client) as session:
+                session.execute(gql("query { ok }"))
+                session._loop.run_until_complete(client.transport.close())
+                assert session.execute(gql("query { ok }")) == {"ok": True}
+                assert session.connects == 2
@@ -0,0 +1,453 @@
+"""
+Unit tests for the rule-table remapper.
+
+The legacy functions below are frozen copies of ``SlurmRemapper.remap_job``
+and ``remap_job_pre2024`` from before the rules moved to remap_rules.json;
+the rule engine must reproduce them exactly.
+"""
+
+import ast
+import inspect
+import random
+from typing import Optional
+
+import pytest
+from click.testing import CliRunner
+from loguru import logger
+
+from modules.coact import SlurmRemapper, slurm_remap
+from modules.remap import RemapRules
+
+from .synthetic import SACCT_FIELDS, sacct_lines
+
+
+def legacy_remap_job(d) -> Optional[dict]:
+    """Remap job data to fix account info."""
+    if (
+        d["Account"] in ("shared", "shared:default")
+        or d["Account"].startswith("shared")
+        or d["User"] in ("jonl", "vanilla", "yemi", "yangw", "pav", "root", "reranna", "ppascual", "renata",)
+        or d["Partition"] in ("fermi-transfer")
+    ):
+        return None
+
+    if "," in d["Partition"]:
+        a = d["Partition"].split(",")[0]
+        d["Partition"] = a
+
+    if "@" in d["Account"]:
+        d["Account"], _ = d["Account"].split("@")
+
+    if d["QOS"] in ("Unknown",):
+        d["QOS"] = "normal"
+
+    return d
+
+def legacy_remap_job_pre2024(d):
+    """deal with old jobs with wrong account info"""
+    # self.logger.info(f"in: {d}")
+    if d["User"] in ("lsstsvc1") and d["Account"] in ("rubin", "shared", ""):
+        d["Account"] = "rubin:production"
+    elif d["Account"] in ("shared", "shared:default") or d["User"] in (
+        "jonl",
+        "vanilla",
+        "yemi",
+        "yangw",
+        "pav",
+        "root",
+        "reranna",
+        "ppascual",
+        "renata",
+    ):
+        return None
+    elif d["User"] in (
+        "csaunder",
+        "elhoward",
+        "mrawls",
+        "brycek",
+        "mfl",
+        "digel",
+        "wguan",
+        "laurenma",
+        "smau",
+        "bos",
+        "erykoff",
+        "ebellm",
+        "mccarthy",
+        "yesw",
+        "abrought",
+        "shuang92",
+        "aconnoll",
+        "daues",
+        "aheinze",
+        "zhaoyu",
+        "dagoret",
+        "kannawad",
+        "kherner",
+        "eske",
+        "cslater",
+        "sierrav",
+        "jmeyers3",
+        "lskelvin",
+        "jchiang",
+        "yanny",
+        "ktl",
+        "jneveu",
+        "hchiang2",
+        "snyder18",
+        "fred3m",
+        "brycek",
+        "eiger",
+        "esteves",
+        "mxk",
+        "yusra",
+        "mrabus",
+        "ryczano",
+        "mgower",
+        "yoachim",
+        "scichris",
+        "jcheval",
+        "richard",
+        "tguillem",
+    ) and d["Account"] in ("", "milano", "roma", "rubin"):
+        d["Account"] = "rubin:developers"
+        if d["Partition"] == "ampere":
+            d["Partition"] = "milano"
+    elif d["User"] == "kocevski" or (
+        d["User"]
+        in (
+            "burnett",
+            "horner",
+            "mdimauro",
+            "burnett",
+            "laviron",
+            "omodei",
+            "tyrelj",
+            "echarles",
+            "bruel",
+        )
+        and d["Account"] in ("", "latba", "ligo", "repository", "burnett")
+    ):
+        d["Account"] = "fermi:users"
+    elif d["User"] in ("glastraw",):
+        d["Account"] = "fermi:l1"
+    elif d["User"] in ("vossj",):
+        d["Partition"] = "roma"
+    elif d["User"] in (
+        "dcesar",
+        "jytang",
+        "rafimah",
+    ):
+        d["Account"] = "ad:beamphysics"
+    elif d["User"] in (
+        "kterao",
+        "kvtsang",
+        "anoronyo",
+        "bkroul",
+        "zhulcher",
+        "koh0207",
+        "drielsma",
+        "lkashur",
+        "dcarber",
+        "amogan",
+        "cyifan",
+        "yjwa",
+        "aj14",
+        "jdyer",
+        "sindhuk",
+        "justinjm",
+        "mrmooney",
+        "bearc",
+        "fuhaoji",
+        "sfogarty",
+        "carsmith",
+        "yuntse",
+    ) and not d["Account"] in (
+        "neutrino:ml-dev",
+        "neutrino:icarus-ml",
+        "neutrino:slacube",
+        "neutrino:dune-ml",
+    ):
+        d["Account"] = "neutrino:default"
+        d["Partition"] = "ampere"
+    elif d["User"] in (
+        "dougl215",
+        "zhezhang",
+    ):  # and d['Account'] in ('ampere:default',):
+        # self.logger.error("HERE")
+        d["Account"] = "mli:default"
+        d["Account"] = "neutrino:default"
+        d["Partition"] = "ampere"
+    elif d["User"] in (
+        "dougl215",
+        "zhezhang",
+    ):  # and d['Account'] in ('ampere:default',):
+        # self.logger.error("HERE")
+        d["Account"] = "mli:default"
+    elif d["User"] in (
+        "jfkern",
+        "taisgork",
+        "valmar",
+        "tgrant",
+        "arijit01",
+        "mmdoyle",
+        "fpoitevi",
+        "ashojaei",
+        "monarin",
+        "claussen",
+        "batyuk",
+        "kevinkgu",
+        "tfujit27",
+        "haoyuan",
+        "aliang",
+        "jshenoy",
+        "dorlhiac",
+        "xjql",
+    ):  # and d['Account'] in ('','milano', 'roma'):
+        d["Account"] = "lcls:default"
+    elif d["User"] in (
+        "psdatmgr",
+        "xiangli",
+        "sachsm",
+        "hekstra",
+        "snelson",
+        "cwang31",
+        "espov",
+        "thorsten",
+        "wilko",
+        "snelson",
+        "melchior",
+        "cpo",
+        "wilko",
+        "mshankar",
+    ) and d["Account"] in (
+        "",
+        "lcls:xpp",
+        "lcls:psmfx",
+        "lcls:data",
+        "ampere",
+        "roma",
+        "rubin",
+        "lcls-xpp1234",
+        "lcls:xpptut15",
+        "lcls:xpptut16",
+        "s3dfadmin",
+    ):
+        d["Account"] = "lcls:default"
+    elif d["User"] in ("lsstccs", "rubinmgr"):
+        d["Account"] = "rubin:commissioning"
+    elif d["User"] in (
+        "majernik",
+        "knetsch",
+    ):
+        d["Account"] = "facet:default"
+    elif d["User"] in ("jberger",):
+        d["Account"] = "epptheory:default"
+    elif d["User"] in ("tabel",):
+        d["Account"] = "kipac:kipac"
+    elif d["User"] in (
+        "vnovati",
+        "owwen",
+        "melwan",
+        "zatschls",
+        "yanliu",
+        "cartaro",
+        "aditi",
+        "emichiel",
+    ):
+        d["Account"] = "supercdms:default"
+
+    if d["Account"] == "":
+        raise Exception(f"could not determine account for {d}")
+
+    if "," in d["Partition"]:
+        a = d["Partition"].split(",")[0]
+        d["Partition"] = a
+    elif d["Partition"] in ("testweka",):
+        return None
+
+    if not ":" in d["Account"]:
+        d["Account"] = d["Account"] + ":default"
+
+    if d["QOS"] in ("Unknown",):
+        d["QOS"] = "preemptable"
+    elif d["QOS"] in ("expedite",):
+        d["QOS"] = "normal"
+
+    # self.logger.info(f"out: {d}")
+    return d
+
+
+
+def legacy_users() -> list:
+    """Every user named by the legacy rules."""
+    users = set()
+    for fx in (legacy_remap_job, legacy_remap_job_pre2024):
+        for node in ast.walk(ast.parse(inspect.getsource(fx))):
+            if isinstance(node, ast.Constant) and isinstance(node.value, str):
+                users.add(node.value)
+    return sorted(users)
+
+
+ACCOUNTS = [
+    "", "shared", "shared:default", "shared-gpu", "rubin", "milano", "roma", "ampere", "latba", "ligo",
+    "repository", "burnett", "neutrino:ml-dev", "neutrino:dune-ml", "lcls:xpp", "lcls:data", "s3dfadmin",
+    "lcls:default", "lcls@sdf", "rubin:developers", "fermi", "kipac",
+]
+PARTITIONS = ["milano", "roma", "ampere", "milano,roma", "ampere,milano", "testweka", "fermi-transfer", "fermi", "transfer", ""]
+QOS = ["normal", "Unknown", "expedite", "preemptable", "scavenger", "normal^lcls@milano"]
+STARTS = ["1703980000", "1704067199", "1704067200", "1710000000", "2023-12-31T23:59:59", "2024-01-01T00:00:00", "Unknown", "None", ""]
+
+
+def recorded_jobs(n: int, seed: int = 0) -> list:
+    """Synthetic jobs drawn from the users, accounts and partitions the rules test for."""
+    rng = random.Random(seed)
+    users = legacy_users() + ["someone", "user001"]
+    return [
+        {"User": rng.choice(users), "Account": rng.choice(ACCOUNTS), "Partition": rng.choice(PARTITIONS),
+         "QOS": rng.choice(QOS), "Start": rng.choice(STARTS), "JobID": str(i)}
+        for i in range(n)
+    ]
+
+
+def outcome(fx, d):
+    try:
+        return fx(type(d)(d))
+    except Exception as e:
+        return type(e), str(e)
+
+
+@pytest.fixture(scope="module")
+def rules() -> RemapRules:
+    return RemapRules.load(by_start=True)
+
+
+class TestRemapRules:
+    """The rule table must match the legacy if/elif chains."""
+
+    def test_current_era_parity(self, rules):
+        era = rules.era("current")
+        for d in recorded_jobs(20000):
+            assert outcome(era.remap, d) == outcome(legacy_remap_job, d), d
+
+    def test_pre2024_era_parity(self, rules):
+        era = rules.era("pre2024")
+        for d in recorded_jobs(20000, seed=1):
+            expected = outcome(legacy_remap_job_pre2024, d)
+            # jobs the legacy function raised on for their empty account are skipped
+            if isinstance(expected, tuple) and expected[1].startswith("could not determine account"):
+                expected = None
+            assert outcome(era.remap, d) == expected, d
+
+    def test_old_jobs_without_an_account_are_skipped(self, rules):
+        remapper = SlurmRemapper(rules=rules)
+        d = {"User": "someone", "Account": "", "Partition": "milano", "QOS": "normal", "Start": "2023-06-01T00:00:00"}
+        warnings = []
+        sink = logger.add(warnings.append, level="WARNING")
+        try:
+            assert remapper.remap_job(dict(d)) is None
+        finally:
+            logger.remove(sink)
+        assert len(warnings) == 1 and "could not determine account" in warnings[0]
+
+    def test_sacct_dump_parity(self):
+        rules = RemapRules.load()
+        lines = list(sacct_lines(5000, seed=3))
+        for line in lines[1:]:
+            d = dict(zip(SACCT_FIELDS, line.rstrip("\n").split("|")))
+            assert outcome(rules.remap, d) == outcome(legacy_remap_job, d)
+
+    def test_current_rules_by_default(self):
+        # jobs started in 2023 keep the accounts the current rules gave them
+        rules = RemapRules.load()
+        for d in recorded_jobs(5000, seed=4):
+            assert outcome(rules.remap, d) == outcome(legacy_remap_job, d), d
+        d = {"User": "glastraw", "Account": "fermi:users", "Partition": "milano", "QOS": "normal", "Start": "1703030400"}
+        assert rules.remap(dict(d))["Account"] == "fermi:users"
+        assert RemapRules.load(by_start=True).remap(dict(d))["Account"] == "fermi:l1"
+        index = {field: i for i, field in enumerate(d)}
+        assert rules.bind(index)(list(d.values()))[index["Account"]] == "fermi:users"
+
+    def test_era_by_start(self, rules):
+        assert rules.era_for("1704067199").name == "pre2024"
+        assert rules.era_for("1704067200").name == "current"
+        assert rules.era_for("2023-12-31T23:59:59").name == "pre2024"
+        assert rules.era_for("2024-01-01T00:00:00").name == "current"
+        for start in ("Unknown", "None", ""):
+            assert rules.era_for(start).name == "current"
+
+    def test_substring_quirks(self, rules):
+        # "in ('lsstsvc1')" matched any substring of the name
+        d = {"User": "lsst", "Account": "", "Partition": "milano", "QOS": "normal"}
+        assert rules.era("pre2024").remap(d)["Account"] == "rubin:production"
+        # "in ('fermi-transfer')" dropped partitions that are substrings of it
+        d = {"User": "u", "Account": "lcls:default", "Partition": "fermi", "QOS": "normal"}
+        assert rules.era("current").remap(d) is None
+
+    def test_remapper_uses_rules(self, rules):
+        d = {"User": "glastraw", "Account": "", "Partition": "milano", "QOS": "Unknown", "Start": "1700000000"}
+        assert SlurmRemapper().remap_job(dict(d)) == dict(d, QOS="normal")
+        remapper = SlurmRemapper(rules=rules)
+        assert remapper.remap_job(dict(d)) == dict(d, Account="fermi:l1", QOS="preemptable")
+        assert remapper.remap_job(dict(d, Start="1710000000")) == dict(d, Start="1710000000", QOS="normal")
+
+    def test_era_by_start_flag(self):
+        line = "JobID|User|Account|Partition|QOS|Start\n1|glastraw|fermi:users|milano|normal|1703030400\n"
+        result = CliRunner().invoke(slurm_remap, input=line, obj={})
+        assert result.output.splitlines()[1] == "1|glastraw|fermi:users|milano|normal|1703030400"
+        result = CliRunner().invoke(slurm_remap, ["--era-by-start"], input=line, obj={})
+        assert result.output.splitlines()[1] == "1|glastraw|fermi:l1|milano|normal|1703030400"
+
+
+class TestBoundRemapper:
+    """Rules bound to column positions must match the dict path."""
+
+    def test_rows_match_dicts(self, rules):
+        jobs = recorded_jobs(20000, seed=2)
+        index = {field: i for i, field in enumerate(jobs[0])}
+        remap_row = rules.bind(index)
+        for d in jobs:
+            expected = outcome(rules.remap, d)
+            got = outcome(remap_row, list(d.values()))
+            if isinstance(expected, dict):
+                expected = list(expected.values())
+            assert got == expected, d
+
+    def test_only_rule_columns_are_read(self, rules):
+        index = {"JobID": 0, "User": 1, "Account": 2, "Partition": 3, "QOS": 4, "Start": 5, "NodeList": 6}
+        row = ["1", "glastraw", "", "milano,roma", "Unknown", "1700000000", object()]
+        assert rules.bind(index)(row)[:6] == ["1", "glastraw", "fermi:l1", "milano", "preemptable", "1700000000"]
+
+    def test_run_matches_legacy_output(self):
+        lines = list(sacct_lines(3000, seed=5))
+        expected = [lines[0].strip()]
+        index = {f: i for i, f in enumerate(lines[0].split("|"))}
+        for line in lines[1:]:
+            parts = line.split("|")
+            d = legacy_remap_job({f: parts[i] for f, i in index.items()})
+            if d:
+                expected.append("|".join(d.values()).strip())
+
+        result = CliRunner().invoke(slurm_remap, input="".join(lines), obj={})
+        assert result.exit_code == 0, result.output
+        assert result.output.splitlines() == expected
+        assert len(expected) > 1
+
+    def test_partially_split_rows(self, rules):
+        lines = list(sacct_lines(2000, seed=6))
+        index = {f: i for i, f in enumerate(lines[0].rstrip("\n").split("|"))}
+        remap_row = rules.bind(index)
+        assert remap_row.max_column == index["Start"]
+        for line in lines[1:]:
+            full = remap_row(line.split("|"))
+            partial = remap_row(line.split("|", remap_row.max_column + 1))
+            assert (full and "|".join(full)) == (partial and "|".join(partial))
+
+        row = "1|someone|1|||normal|0|1700000000|1700003600|rest".split("|", remap_row.max_column + 1)
+        warnings = []
+        sink = logger.add(warnings.append, level="WARNING")
+        try:
+            assert remap_row(row) is None
+        finally:
+            logger.remove(sink)
+        assert "'End': '1700003600'" in warnings[0]
@@ -0,0 +1,90 @@
+"""
+Unit tests for the memory-mapped replay of sacct dumps.
+"""
+
+import json
+
+from click.testing import CliRunner
+
+from modules.coact import SlurmImporter, slurm_import, split_rows
+from modules.replay import ReplayReader, replay_jobs
+
+from .synthetic import SACCT_HEADER, StaticBackChannel, metadata_response, sacct_lines, write_sacct_file
+from .test_slurm_import import make_importer
+
+
+def projected(lines, fields) -> list:
+    rows = split_rows(line.rstrip("\n") for line in lines)
+    return [tuple(parts[index[f]] for f in fields) for index, parts in rows]
+
+
+class TestReplayReader:
+
+    def test_rows_match_split_rows(self, tmp_path):
+        path = write_sacct_file(str(tmp_path / "day"), 1000, seed=2)
+        with open(path) as f:
+            expected = projected(f, SlurmImporter.FIELDS)
+        with ReplayReader(path, fields=SlurmImporter.FIELDS) as reader:
+            rows = list(reader.rows())
+        assert list(rows[0][0]) == SlurmImporter.FIELDS
+        assert [parts for _, parts in rows] == expected
+
+    def test_ranges_cover_every_row_once(self, tmp_path):
+        path = write_sacct_file(str(tmp_path / "day"), 997)
+        with ReplayReader(path) as reader:
+            everything = list(reader.rows())
+            for count in (1, 2, 3, 16, 5000):
+                ranges = reader.ranges(count)
+                assert ranges[0][0] == reader.header_end and ranges[-1][1] == reader.size
+                assert all(a[1] == b[0] for a, b in zip(ranges, ranges[1:]))
+                assert [r for s, e in ranges for r in reader.rows(s, e)] == everything
+
+    def test_blocks_are_aligned(self, tmp_path, monkeypatch):
+        monkeypatch.setattr("modules.replay.BLOCK_SIZE", 1000)
+        path = write_sacct_file(str(tmp_path / "day"), 500)
+        with open(path) as f:
+            expected = projected(f, SACCT_HEADER.split("|"))
+        with ReplayReader(path) as reader:
+            assert [parts for _, parts in reader.rows()] == expected
+
+    def test_repeated_headers_and_short_rows_are_skipped(self, tmp_path):
+        lines = list(sacct_lines(10))
+        path = tmp_path / "day"
+        path.write_text("".join(lines[:5] + [SACCT_HEADER + "\n", "1|2|3\n", "\n"] + lines[5:]))
+        with ReplayReader(str(path)) as reader:
+            assert len(list(reader.rows())) == 10
+            assert reader.skipped == 1
+
+    def test_empty_file(self, tmp_path):
+        path = tmp_path / "day"
+        path.write_text("")
+        with ReplayReader(str(path)) as reader:
+            assert list(reader.rows()) == [] and reader.ranges(4) == []
+
+
+class TestReplayJobs:
+
+    def test_matches_text_import(self, tmp_path):
+        lines = list(sacct_lines(3000, seed=4))
+        path = tmp_path / "day"
+        path.write_text("".join(lines))
+        importer = make_importer()
+        expected = list(importer.iter_jobs(lines))
+        assert list(replay_jobs(importer, str(path))) == expected
+        assert list(replay_jobs(importer, str(path), workers=2)) == expected
+
+    def test_slurmimport_workers(self, tmp_path, monkeypatch):
+        def connect(self):
+            self.back_channel = StaticBackChannel(metadata_response())
+            self.get_metadata()
+        monkeypatch.setattr(SlurmImporter, "connect", connect)
+
+        path = write_sacct_file(str(tmp_path / "day"), 2000)
+        (tmp_path / "password").write_text("secret")
+        args = ["--username", "u", "--password-file", str(tmp_path / "password"), "--output", "json", "--batch", "500"]
+        with open(path) as f:
+            from_stdin = CliRunner().invoke(slurm_import, args, input=f.read(), obj={})
+        from_file = CliRunner().invoke(slurm_import, args + ["--data", path, "--workers", "2"], obj={})
+        assert from_stdin.exit_code == 0 and from_file.exit_code == 0
+        assert from_file.output == from_stdin.output
+        assert len(json.loads(from_file.output.split("\n]\n")[0] + "\n]")) == 500
@@ -0,0 +1,183 @@
+"""
+Unit tests for the local rolling-window usage of the overage evaluation.
+"""
+
+import os
+import random
+import stat
+
+import pendulum as pdl
+import pytest
+from click.testing import CliRunner
+from loguru import logger
+
+from modules.coact import FacilityUsage, SlurmRemapper, coact, split_rows
+from modules.rolling_usage import LocalUsage
+from modules.usage_windows import MINUTE
+
+from .fake_sacct import FAKE_SACCT, INDEX, window_lines
+from .synthetic import DEFAULT_DAY_START, SACCT_HEADER, metadata_response, sacct_row
+from .test_slurm_import import make_importer
+from .test_usage_windows import expected
+
+# 2024-01-02T06:00:00Z, a day and a quarter into the synthetic jobs
+NOW = DEFAULT_DAY_START + 86400 + 6 * 3600
+
+
+@pytest.fixture
+def utc(monkeypatch):
+    # the fake sacct interprets its times as UTC
+    monkeypatch.setattr(pdl, "local_timezone", lambda: pdl.timezone("UTC"))
+
+
+def sacct_jobs(start: int, end: int) -> dict:
+    """Resource hours per (facility, cluster) of the jobs the fake sacct reports for ``[start, end]``."""
+    importer = make_importer()
+    jobs = {}
+    for index, parts in SlurmRemapper().remap_rows(split_rows([SACCT_HEADER] + window_lines(start, end, 1000))):
+        job = importer.convert(index, parts)
+        key = (parts[index["Account"]].split(":")[0], parts[index["Partition"]])
+        jobs.setdefault(key, []).append((int(parts[index["Start"]]), int(parts[index["End"]]), job["resourceHours"]))
+    return jobs
+
+
+@pytest.mark.usefixtures("utc")
+class TestLocalUsage:
+
+    def test_sacct_windows_are_split_per_day(self):
+        local = LocalUsage(make_importer(), windows=[60])
+        assert local.sacct_windows(NOW - 7 * 3600, NOW) == [
+            ("2024-01-01", "23:00:00", "23:59:59"),
+            ("2024-01-02", "00:00:00", "06:00:00"),
+        ]
+
+    def test_windows_match_the_jobs_reported_by_sacct(self):
+        local = LocalUsage(make_importer(), windows=[60, 1440], sacct_bin_path=FAKE_SACCT)
+        assert local.poll(NOW) > 0
+        jobs = sacct_jobs(NOW - 1440 * MINUTE, NOW)
+        for (f, c), values in jobs.items():
+            for minutes in (60, 1440):
+                assert local.usage.window(f, c, minutes) == pytest.approx(expected(values, NOW // MINUTE, minutes))
+
+    def test_repeated_polls_add_every_job_once(self):
+        local = LocalUsage(make_importer(), windows=[60, 1440], sacct_bin_path=FAKE_SACCT)
+        for now in range(NOW - 3600, NOW + 1, 900):
+            local.poll(now)
+        fresh = LocalUsage(make_importer(), windows=[60, 1440], sacct_bin_path=FAKE_SACCT)
+        fresh.poll(NOW)
+        for f, c in fresh.usage.keys():
+            for minutes in (60, 1440):
+                assert local.usage.window(f, c, minutes) == pytest.approx(fresh.usage.window(f, c, minutes))
+
+    def test_jobs_are_remapped(self, tmp_path):
+        rows = []
+        for n, (account, partition) in enumerate([("lcls:xpp@milano", "milano,roma"), ("shared:default", "milano"), ("lcls:xpp", "milano")]):
+            parts = sacct_row(random.Random(n), n, day_start=NOW - 86400).split("|")
+            parts[INDEX["Account"]], parts[INDEX["Partition"]] = account, partition
+            parts[INDEX["Start"]], parts[INDEX["End"]] = str(NOW - 3600 + n), str(NOW - 60)
+            rows.append("|".join(parts))
+        dump = tmp_path / "dump"
+        dump.write_text("\n".join([SACCT_HEADER] + rows) + "\n")
+        sacct = tmp_path / "sacct"
+        sacct.write_text(f"#!/bin/sh\ncat {dump}\n")
+        os.chmod(sacct, os.stat(sacct).st_mode | stat.S_IXUSR)
+
+        warnings = []
+        sink = logger.add(warnings.append, level="WARNING")
+        try:
+            local = LocalUsage(make_importer(), windows=[60], sacct_bin_path=str(sacct))
+            assert local.poll(NOW) == 2
+        finally:
+            logger.remove(sink)
+        assert local.usage.keys() == [("lcls", "milano")]
+        assert warnings == []
+
+    def test_restart_resumes_from_the_saved_state(self, tmp_path):
+        state = str(tmp_path / "usage")
+        local = LocalUsage(make_importer(), windows=[60, 1440], sacct_bin_path=FAKE_SACCT, state=state)
+        local.poll(NOW - 1800)
+        restarted = LocalUsage(make_importer(), windows=[60, 1440], sacct_bin_path=FAKE_SACCT, state=state)
+        assert restarted.polled_to == NOW - 1800
+        restarted.poll(NOW)
+        fresh = LocalUsage(make_importer(), windows=[60, 1440], sacct_bin_path=FAKE_SACCT)
+        fresh.poll(NOW)
+        for f, c in fresh.usage.keys():
+            for minutes in (60, 1440):
+                assert restarted.usage.window(f, c, minutes) == pytest.approx(fresh.usage.window(f, c, minutes))
+
+    def test_state_for_shorter_windows_is_ignored(self, tmp_path):
+        state = str(tmp_path / "usage")
+        LocalUsage(make_importer(), windows=[60], sacct_bin_path=FAKE_SACCT, state=state).poll(NOW)
+        assert LocalUsage(make_importer(), windows=[60, 1440], state=state).polled_to is None
+
+    def test_windows_in_the_shape_of_the_server_response(self):
+        local = LocalUsage(make_importer(), windows=[60], sacct_bin_path=FAKE_SACCT)
+        local.poll(NOW)
+        result = local.windows([("lcls", "milano"), ("lcls", "nowhere")], {("lcls", "milano"): 10})
+        used = local.usage.window("lcls", "milano", 60)
+        assert result == {"_000060": [
+            {"facility": "lcls", "cluster": "milano", "percentUsed": pytest.approx(100 * used / (10 * 120))},
+            {"facility": "lcls", "cluster": "nowhere", "percentUsed": 0.0},
+        ]}
+
+    def test_verify_counts_the_mismatches(self):
+        local = LocalUsage(make_importer(), windows=[60])
+        ours = {"_000060": [{"facility": "lcls", "cluster": "milano", "percentUsed": 50.0},
+                            {"facility": "rubin", "cluster": "milano", "percentUsed": 10.0}]}
+        theirs = {"_000060": [{"facility": "LCLS", "cluster": "milano", "percentUsed": 50.5},
+                              {"facility": "rubin", "cluster": "milano", "percentUsed": 30.0}]}
+        assert local.verify(ours, theirs) == 1
+
+
+class UsageBackChannel:
+    """Answers the overage query and the importer's metadata query alike."""
+
+    def __init__(self, percent: float):
+        self.percent = percent
+        self.queries = []
+
+    def execute(self, document, **kwargs) -> dict:
+        query = document.loc.source.body
+        self.queries.append(query)
+        metadata = metadata_response()
+        if "clusters" in query:
+            return metadata
+        result = {"repos": [{"facility": r["facility"], "allocs": [{"cluster": a["clustername"]} for a in r["currentComputeAllocations"]]} for r in metadata["repos"]]}
+        if "facilityRecentComputeUsage" in query:
+            result["_000060"] = [{"facility": "lcls", "cluster": "milano", "percentUsed": self.percent}]
+        result["facilities"] = [{"name": "lcls", "computepurchases": [{"clustername": "milano", "purchased": 10}]}]
+        return result
+
+
+@pytest.mark.usefixtures("utc")
+class TestLocalOverage:
+
+    @pytest.fixture(autouse=True)
+    def no_sacctmgr(self, monkeypatch):
+        monkeypatch.setattr("modules.coact.subprocess.check_output", lambda cmd: b"")
+        monkeypatch.setattr("modules.rolling_usage.time.time", lambda: NOW)
+
+    def usages(self, verify: bool) -> FacilityUsage:
+        local = LocalUsage(make_importer(), windows=[60], sacct_bin_path=FAKE_SACCT)
+        usage = FacilityUsage(username="u", password_file="/dev/null", windows=[60], threshold=100.0, dry_run=True, local=local, verify_local=verify)
+        usage.back_channel = UsageBackChannel(percent=200.0)
+        return usage
+
+    def test_local_windows_replace_the_server_windows(self):
+        usage = self.usages(verify=False)
+        current = usage.get_data()
+        local = usage.local.usage.percent("lcls", "milano", 60, 10 * 120)
+        assert current["lcls"]["milano"]["percentUsed"] == [int(local)]
+        assert "facilityRecentComputeUsage" not in usage.back_channel.queries[0]
+
+    def test_verify_uses_the_server_windows(self):
+        usage = self.usages(verify=True)
+        current = usage.get_data()
+        assert current["lcls"]["milano"]["percentUsed"] == [200]
+        assert usage.local.mismatches == 1
+        assert "facilityRecentComputeUsage" in usage.back_channel.queries[0]
+
+    def test_local_windows_require_a_state_file(self):
+        result = CliRunner().invoke(coact, ["overage", "--local-windows", "--password-file", "/dev/null"])
+        assert result.exit_code == 2
+        assert "--local-windows-state" in result.output
@@ -0,0 +1,89 @@
+"""
+Unit tests for the multi-day slurmbackfill command.
+"""
+
+import json
+
+import pytest
+
+from modules.coact import SlurmBackfill
+from modules.utils import graphql
+
+from .fake_coact import FakeCoactServer, jobs_import_handler
+from .fake_sacct import FAKE_SACCT
+from .synthetic import metadata_response
+
+DATES = ["2024-01-01", "2024-01-02", "2024-01-03"]
+
+
+def handler(payload: dict) -> dict:
+    if "jobsImport" in payload["query"]:
+        return jobs_import_handler(payload)
+    if "jobsAggregateForDate" in payload["query"]:
+        return {"jobsAggregateForDate": {"status": True}}
+    return metadata_response()
+
+
+@pytest.fixture
+def server(monkeypatch):
+    with FakeCoactServer(handler=handler) as server:
+        # worker processes read the URI from the environment or inherit it when forked
+        monkeypatch.setenv("SDF_COACT_URI", server.url)
+        monkeypatch.setattr(graphql, "SDF_COACT_URI", server.url)
+        monkeypatch.setenv("FAKE_SACCT_ROWS", "200")
+        yield server
+
+
+def make_backfill(tmp_path, **kwargs) -> SlurmBackfill:
+    password_file = tmp_path / "password"
+    password_file.write_text("test")
+    return SlurmBackfill(
+        username="test",
+        password_file=str(password_file),
+        manifest=str(tmp_path / "manifest.json"),
+        concurrency=2,
+        day_options={"sacct_bin_path": FAKE_SACCT, "raw_archive_dir": str(tmp_path)},
+        **kwargs
+    )
+
+
+def queries(server, name: str) -> list:
+    return [r for r in server.requests if name in r["query"]]
+
+
+class TestSlurmBackfill:
+
+    def test_imports_and_recalculates_each_day(self, server, tmp_path):
+        assert make_backfill(tmp_path).run(DATES)
+
+        manifest = json.load(open(tmp_path / "manifest.json"))["days"]
+        assert sorted(manifest) == DATES
+        assert all(day["jobs"] > 0 and day["recalculated"] for day in manifest.values())
+        uploaded = sum(len(r["variables"]["jobs"]) for r in queries(server, "jobsImport"))
+        assert uploaded == sum(day["jobs"] for day in manifest.values())
+        recalculated = [r["query"] for r in queries(server, "jobsAggregateForDate")]
+        assert [next(d for d in DATES if d in q) for q in recalculated] == DATES
+        assert all((tmp_path / d).exists() for d in DATES)
+
+    def test_resumes_from_manifest(self, server, tmp_path):
+        (tmp_path / "manifest.json").write_text(json.dumps({"days": {
+            DATES[0]: {"jobs": 1, "duration": 1.0, "recalculated": True},
+            DATES[1]: {"jobs": 1, "duration": 1.0, "recalculated": False},
+        }}))
+        assert make_backfill(tmp_path).run(DATES)
+
+        assert not (tmp_path / DATES[0]).exists() and not (tmp_path / DATES[1]).exists()
+        assert (tmp_path / DATES[2]).exists()
+        recalculated = [r["query"] for r in queries(server, "jobsAggregateForDate")]
+        assert len(recalculated) == 2 and DATES[1] in recalculated[0] and DATES[2] in recalculated[1]
+
+        before = len(server.requests)
+        assert make_backfill(tmp_path).run(DATES)
+        assert len(server.requests) == before
+
+    def test_failed_day_is_not_checkpointed(self, server, tmp_path):
+        backfill = make_backfill(tmp_path)
+        backfill.day_options["sacct_bin_path"] = "/nonexistent/sacct"
+        assert not backfill.run(DATES[:1])
+        assert not (tmp_path / "manifest.json").exists()
+        assert queries(server, "jobsAggregateForDate") == []
@@ -0,0 +1,164 @@
+"""
+Unit tests for the slurmimport conversion pipeline.
+"""
+
+import hashlib
+import itertools
+import json
+import random
+
+import pendulum as pdl
+import pytest
+
+from modules.coact import SlurmImporter, format_epoch_utc, kilos_to_int, parse_alloc_tres
+
+from .synthetic import StaticBackChannel, metadata_response, sacct_lines
+
+
+def make_importer() -> SlurmImporter:
+    importer = SlurmImporter(username="test", password_file="test", verbose=False, exit_on_error=False)
+    importer.back_channel = StaticBackChannel(metadata_response())
+    importer.get_metadata()
+    return importer
+
+
+class TestStreamingImport:
+    """The importer should consume its input lazily."""
+
+    def test_iter_jobs_is_lazy(self):
+        importer = make_importer()
+        consumed = []
+
+        def lines():
+            for line in sacct_lines(1000):
+                consumed.append(line)
+                yield line
+
+        first = list(itertools.islice(importer.iter_jobs(lines()), 5))
+        assert len(first) == 5
+        # header plus only as many rows as needed to produce five jobs
+        assert len(consumed) < 50
+
+    def test_iter_batches_sizes(self):
+        batches = list(SlurmImporter.iter_batches(iter(range(10)), 4))
+        assert [len(b) for b in batches] == [4, 4, 2]
+        assert list(itertools.chain.from_iterable(batches)) == list(range(10))
+
+    def test_iter_batches_empty(self):
+        assert list(SlurmImporter.iter_batches(iter([]), 4)) == []
+
+    def test_streaming_matches_readlines(self):
+        importer = make_importer()
+        lines = list(sacct_lines(500))
+        streamed = list(importer.iter_jobs(iter(lines)))
+        index = {f: i for i, f in enumerate(lines[0].split("|"))}
+        expected = [j for j in (importer.convert(index, l.split("|")) for l in lines[1:]) if j]
+        assert streamed == expected
+        assert len(streamed) > 0
+
+
+class TestConvertOutput:
+    """Converted jobs must stay byte-identical to the original pendulum-based implementation."""
+
+    # sha256 of json.dumps() of the jobs converted from sacct_lines(3000, seed=7),
+    # captured before the per-job hot path was optimised
+    EXPECTED_DIGEST = "c97cd54d93fdf6f1eff115ad57d8fdc9ee375c225c0945f884ed44d7ce9c4d9e"
+
+    def test_convert_output_is_stable(self):
+        importer = make_importer()
+        jobs = list(importer.iter_jobs(sacct_lines(3000, seed=7)))
+        assert len(jobs) == 3000
+        assert hashlib.sha256(json.dumps(jobs).encode()).hexdigest() == self.EXPECTED_DIGEST
+
+    def test_format_epoch_utc_matches_pendulum(self):
+        rng = random.Random(3)
+        epochs = [0, 86399, 86400, 951782400, 1709164800, 1710054000, 1730624400, 4102444799]
+        epochs += [rng.randint(0, 4102444799) for _ in range(2000)]
+        for epoch in epochs:
+            dt = pdl.from_timestamp(epoch, tz=pdl.now().timezone)
+            expected = str(dt.in_tz("UTC")).replace(" ", "T").replace("+00:00", ".000Z")
+            assert format_epoch_utc(epoch) == expected
+
+
+class TestTresParsing:
+    """Test the cached AllocTRES parser."""
+
+    def test_kilos_to_int(self):
+        assert kilos_to_int("4") == 4
+        assert kilos_to_int("16G") == 16 * 1024 ** 3
+        assert kilos_to_int("512m") == 512 * 1024 ** 2
+        assert kilos_to_int("1.5K") == 1536
+        with pytest.raises(Exception, match="Can't parse"):
+            kilos_to_int("G")
+
+    def test_parse_alloc_tres(self):
+        assert parse_alloc_tres("") == (None, None, None)
+        assert parse_alloc_tres("billing=4,cpu=4,mem=16G,node=1") == (4, None, 16 * 1024 ** 3)
+        # any gpu flavoured component counts as gpu, the last one wins
+        assert parse_alloc_tres("cpu=8,gres/gpu=2,gres/gpu:a100=3,node=1") == (8, 3, None)
+        with pytest.raises(ValueError):
+            parse_alloc_tres("cpu")
+
+    def test_parse_alloc_tres_is_cached(self):
+        parse_alloc_tres.cache_clear()
+        for _ in range(10):
+            parse_alloc_tres("cpu=2,mem=4G,node=1")
+        info = parse_alloc_tres.cache_info()
+        assert (info.hits, info.misses) == (9, 1)
+
+
+class TestAllocationIndex:
+    """Test bisect lookups of allocation periods."""
+
+    def setup_method(self):
+        self.importer = SlurmImporter(username="test", password_file="test")
+        self.importer._allocid = {
+            ("lcls", "default", "milano"): {
+                (pdl.datetime(2024, 1, 1), pdl.datetime(2024, 2, 1)): "jan",
+                (pdl.datetime(2024, 3, 1), pdl.datetime(2024, 4, 1)): "mar",
+                (pdl.datetime(2024, 2, 1), pdl.datetime(2024, 3, 1)): "feb",
+            },
+            ("lcls", "default", "roma"): {
+                (pdl.datetime(2024, 1, 1), pdl.datetime(2024, 12, 1)): "year",
+                (pdl.datetime(2024, 2, 1), pdl.datetime(2024, 3, 1)): "feb",
+            },
+        }
+        self.importer._alloc_index = SlurmImporter.build_alloc_index(self.importer._allocid)
+
+    def lookup(self, cluster, epoch):
+        return self.importer.get_alloc_id("lcls", "default", cluster, epoch)
+
+    def test_boundaries(self):
+        feb = int(pdl.datetime(2024, 2, 1).timestamp())
+        assert self.lookup("milano", feb - 1) == "jan"
+        assert self.lookup("milano", feb) == "feb"
+        assert self.lookup("milano", int(pdl.datetime(2024, 3, 31, 23).timestamp())) == "mar"
+
+    def test_outside_periods(self):
+        with pytest.raises(Exception, match="could not determine alloc_id"):
+            self.lookup("milano", int(pdl.datetime(2023, 12, 31).timestamp()))
+        with pytest.raises(Exception, match="could not determine alloc_id"):
+            self.lookup("milano", int(pdl.datetime(2024, 4, 1).timestamp()))
+        with pytest.raises(Exception, match="could not determine alloc_id"):
+            self.importer.get_alloc_id("lcls", "other", "milano", 0)
+
+    def test_overlapping_periods(self):
+        assert self.lookup("roma", int(pdl.datetime(2024, 2, 15).timestamp())) == "feb"
+        # after the nested period ends the enclosing one must still be found
+        assert self.lookup("roma", int(pdl.datetime(2024, 6, 1).timestamp())) == "year"
+
+    def test_datetime_argument(self):
+        assert self.lookup("milano", pdl.datetime(2024, 1, 15)) == "jan"
+
+    def test_matches_linear_scan(self):
+        rng = random.Random(1)
+        for _ in range(500):
+            epoch = rng.randint(int(pdl.datetime(2023, 12, 1).timestamp()), int(pdl.datetime(2024, 5, 1).timestamp()))
+            time = pdl.from_timestamp(epoch)
+            expected = next((_id for t, _id in self.importer._allocid[("lcls", "default", "milano")].items()
+                             if time >= t[0] and time < t[1]), None)
+            try:
+                found = self.lookup("milano", epoch)
+            except Exception:
+                found = None
+            assert found == expected
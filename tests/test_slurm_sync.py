@@ -0,0 +1,173 @@
+"""
+Unit tests for the single-process slurmsync pipeline.
+"""
+
+import json
+import sys
+from timeit import default_timer as timer
+
+import pendulum as pdl
+from click.testing import CliRunner
+
+from modules.coact import SlurmRemapper, SlurmSync, run_sacct, slurm_remap, split_rows, time_slices
+
+from .fake_sacct import FAKE_SACCT
+from .synthetic import CLUSTERS, SACCT_HEADER
+from .test_slurm_import import make_importer
+
+DATE = "2024-01-01"
+
+
+def sacct(monkeypatch, rows: int = 300) -> list:
+    monkeypatch.setenv("FAKE_SACCT_ROWS", str(rows))
+    return list(run_sacct(sacct_bin_path=FAKE_SACCT, date=DATE))
+
+
+SCRIPTED_SACCT = """\
+import json, sys, time
+args = dict(a.lstrip("-").partition("=")[::2] for a in sys.argv[1:])
+key = args["starttime"].strip('"')[-8:] + "|" + args.get("clusters", "")
+for line in json.load(open({path!r})).get(key, []):
+    if line == "sleep":
+        time.sleep(2)
+    else:
+        print(line, flush=True)
+"""
+
+
+def scripted_sacct(tmp_path, outputs: dict) -> str:
+    """A sacct printing ``outputs["HH:MM:SS|cluster"]`` for the query starting then; "sleep" pauses 2s."""
+    with open(tmp_path / "outputs.json", "w") as f:
+        json.dump(outputs, f)
+    path = tmp_path / "sacct.py"
+    path.write_text(SCRIPTED_SACCT.format(path=str(tmp_path / "outputs.json")))
+    return f"{sys.executable} {path}"
+
+
+def row(job: str, start: str, end: str, partition: str = "milano", **values) -> str:
+    fields = dict.fromkeys(SACCT_HEADER.split("|"), "x")
+    fields.update(JobID=job, Start=start, End=end, Partition=partition, **values)
+    return "|".join(fields.values())
+
+
+def make_sync(**kwargs) -> SlurmSync:
+    importer = make_importer()
+    importer.connect = lambda: None
+    return SlurmSync(importer=importer, remapper=SlurmRemapper(), sacct_bin_path=FAKE_SACCT, **kwargs)
+
+
+class TestSplitRows:
+
+    def test_shares_header_index(self):
+        rows = list(split_rows(["a|b", "", "1|2", "3|4"]))
+        assert [parts for _, parts in rows] == [["1", "2"], ["3", "4"]]
+        assert rows[0][0] is rows[1][0]
+        assert rows[0][0] == {"a": 0, "b": 1}
+
+
+class TestSlurmSync:
+    """slurmsync must produce the same jobs and archives as the shell pipeline."""
+
+    def test_matches_shell_pipeline(self, monkeypatch):
+        raw = sacct(monkeypatch)
+        result = CliRunner().invoke(slurm_remap, input="\n".join(raw) + "\n", obj={})
+        assert result.exit_code == 0, result.output
+        importer = make_importer()
+        expected = list(importer.iter_jobs(result.output.splitlines()))
+
+        sync = make_sync()
+        assert list(sync.jobs(iter(raw))) == expected
+        assert len(expected) > 0
+
+    def test_archives(self, monkeypatch, tmp_path):
+        raw = sacct(monkeypatch)
+        remapped = CliRunner().invoke(slurm_remap, input="\n".join(raw) + "\n", obj={}).output
+
+        sync = make_sync(raw_archive=str(tmp_path / "raw"), remapped_archive=str(tmp_path / "remapped"))
+        outputs = []
+        sync.importer.output = lambda jobs, output_format, batch_size: outputs.extend(jobs) or len(outputs)
+        count = sync.run(DATE, "00:00:00", "23:59:59", "json", 100)
+
+        assert count == len(outputs) > 0
+        assert (tmp_path / "raw").read_text() == "\n".join(raw) + "\n"
+        assert (tmp_path / "remapped").read_text() == remapped
+        assert remapped.splitlines()[0] == SACCT_HEADER
+
+    def test_fake_sacct_window(self, monkeypatch):
+        monkeypatch.setenv("FAKE_SACCT_ROWS", "200")
+        full = list(run_sacct(sacct_bin_path=FAKE_SACCT, date=DATE))
+        morning = list(run_sacct(sacct_bin_path=FAKE_SACCT, date=DATE, end_time="06:00:00"))
+        assert full[0] == morning[0] == SACCT_HEADER
+        assert 1 < len(morning) < len(full)
+        assert set(morning) <= set(full)
+
+
+class TestParallelSacct:
+    """Sliced and per-cluster queries must return the jobs of a single query."""
+
+    def test_time_slices(self):
+        assert time_slices("00:00:00", "23:59:59", 1) == [("00:00:00", "23:59:59")]
+        slices = time_slices("00:00:00", "23:59:59", 4)
+        assert len(slices) == 4
+        assert slices[0][0] == "00:00:00" and slices[-1][1] == "23:59:59"
+        assert all(a[1] == b[0] for a, b in zip(slices, slices[1:]))
+        assert len(time_slices("10:00:00", "10:00:02", 8)) == 2
+
+    def test_slices_match_single_query(self, monkeypatch):
+        single = sacct(monkeypatch)
+        monkeypatch.setenv("FAKE_SACCT_ROWS", "300")
+        sliced = list(run_sacct(sacct_bin_path=FAKE_SACCT, date=DATE, slices=6, workers=3))
+        assert sliced[0] == SACCT_HEADER
+        assert len(sliced) == len(set(sliced))
+        assert sorted(sliced) == sorted(single)
+
+    def test_clusters_match_all_clusters(self, monkeypatch):
+        single = sacct(monkeypatch)
+        monkeypatch.setenv("FAKE_SACCT_ROWS", "300")
+        clusters = [c[0] for c in CLUSTERS]
+        split = list(run_sacct(sacct_bin_path=FAKE_SACCT, date=DATE, slices=2, clusters=clusters))
+        assert sorted(split) == sorted(single)
+
+    def test_only_jobs_running_across_a_boundary_are_deduplicated(self, monkeypatch, tmp_path):
+        monkeypatch.setattr("modules.coact.pdl.local_timezone", lambda: pdl.timezone("UTC"))
+        noon = "1704110400"
+        running = row("1", "1704070000", "Unknown")
+        sacct = scripted_sacct(tmp_path, {
+            # the same JobID and Start on two clusters, and a record repeated within one slice
+            "00:00:00|milano": [SACCT_HEADER, row("2", "1704070000", "1704080000"), row("2", "1704070000", "1704080000"), running, row("3", "1704100000", noon)],
+            "00:00:00|roma": [SACCT_HEADER, row("2", "1704070000", "1704080000", "roma")],
+            "11:59:59|milano": [SACCT_HEADER, running, row("3", "1704100000", noon), row("4", "1704120000", "1704130000")],
+            "11:59:59|roma": [SACCT_HEADER],
+        })
+        lines = list(run_sacct(sacct_bin_path=sacct, date=DATE, slices=2, clusters=["milano", "roma"]))
+        # rows running at the end of a slice are held back until the next slice has returned its own
+        assert lines == [
+            SACCT_HEADER, row("2", "1704070000", "1704080000"), row("2", "1704070000", "1704080000"),
+            row("2", "1704070000", "1704080000", "roma"), row("3", "1704100000", noon), row("4", "1704120000", "1704130000"), running,
+        ]
+
+    def test_the_latest_record_of_a_running_job_is_kept(self, monkeypatch, tmp_path):
+        monkeypatch.setattr("modules.coact.pdl.local_timezone", lambda: pdl.timezone("UTC"))
+        sacct = scripted_sacct(tmp_path, {
+            # the later query sees a longer Elapsed; a requeue of the job has its own Start
+            "00:00:00|milano": [SACCT_HEADER, row("1", "1704070000", "Unknown", Elapsed="11:00:00", State="RUNNING"),
+                                row("1", "1704060000", "1704065000", State="REQUEUED")],
+            "07:59:59|milano": [SACCT_HEADER, row("1", "1704070000", "Unknown", Elapsed="11:20:00", State="RUNNING")],
+            "15:59:59|milano": [SACCT_HEADER, row("1", "1704070000", "1704140000", Elapsed="19:26:40", State="COMPLETED")],
+        })
+        lines = list(run_sacct(sacct_bin_path=sacct, date=DATE, slices=3, clusters=["milano"], workers=1))
+        assert lines == [
+            SACCT_HEADER, row("1", "1704060000", "1704065000", State="REQUEUED"),
+            row("1", "1704070000", "1704140000", Elapsed="19:26:40", State="COMPLETED"),
+        ]
+
+    def test_slices_are_streamed(self, tmp_path):
+        sacct = scripted_sacct(tmp_path, {
+            "00:00:00|milano": [SACCT_HEADER, row("1", "1704070000", "1704080000"), "sleep", row("2", "1704070000", "1704080000")],
+        })
+        s = timer()
+        lines = run_sacct(sacct_bin_path=sacct, date=DATE, slices=2, clusters=["milano"])
+        assert next(lines) == SACCT_HEADER
+        assert next(lines) == row("1", "1704070000", "1704080000")
+        assert timer() - s < 1.5
+        lines.close()
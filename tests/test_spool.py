@@ -0,0 +1,127 @@
+"""
+Unit tests for the durable spool between converting and uploading jobs.
+"""
+
+import json
+import os
+
+from gql import Client
+from gql.transport.aiohttp import AIOHTTPTransport
+
+from modules.spool import Spool, SpoolDrainer
+
+from .fake_coact import FakeCoactServer, jobs_import_handler
+from .synthetic import sacct_lines
+from .test_slurm_import import make_importer
+
+
+def jobs(count: int, start: int = 0) -> list:
+    return [{"jobId": str(i), "resourceHours": 1.0} for i in range(start, start + count)]
+
+
+def spool_with(path, records: list, **kwargs) -> Spool:
+    with Spool(str(path), **kwargs) as spool:
+        for job in records:
+            spool.append(job)
+    return spool
+
+
+class TestSpool:
+
+    def test_round_trip(self, tmp_path):
+        spool = spool_with(tmp_path, jobs(10))
+        records, end = spool.read(spool.acked(), 4)
+        assert records == jobs(4)
+        records, end = spool.read(end, 100)
+        assert records == jobs(6, start=4)
+        assert spool.read(end, 100)[0] == []
+
+    def test_acknowledged_records_are_not_read_again(self, tmp_path):
+        spool = spool_with(tmp_path, jobs(10))
+        end = spool.read(spool.acked(), 4)[1]
+        spool.ack(end)
+        reopened = Spool(str(tmp_path))
+        assert reopened.read(reopened.acked(), 100)[0] == jobs(6, start=4)
+        assert reopened.depth()[0] == 6
+
+    def test_incomplete_record_is_dropped(self, tmp_path):
+        spool = spool_with(tmp_path, jobs(3))
+        with open(spool.segment_path(0), "ab") as f:
+            f.write(b"\x00\x00\x01\x00{\"jobId\"")
+        assert spool.read((0, 0), 100)[0] == jobs(3)
+        spool_with(tmp_path, jobs(2, start=3))
+        assert spool.read((0, 0), 100)[0] == jobs(5)
+
+    def test_segments_roll_and_are_deleted(self, tmp_path):
+        spool = spool_with(tmp_path, jobs(100), segment_bytes=200, sync_records=5)
+        assert len(spool.segments()) > 5
+        records, end = spool.read((0, 0), 60)
+        assert records == jobs(60)
+        spool.ack(end)
+        assert spool.segments()[0] == end[0]
+        assert spool.read(end, 100)[0] == jobs(40, start=60)
+        assert spool.depth()[0] == 40
+
+
+class TestSpoolDrainer:
+
+    def test_drains_and_reports(self, tmp_path):
+        spool = spool_with(tmp_path, jobs(25))
+        uploaded = []
+        drainer = SpoolDrainer(spool, lambda chunk: uploaded.append(chunk) or 0, chunk_records=10)
+        assert drainer.run() == 0
+        assert [len(chunk) for chunk in uploaded] == [10, 10, 5]
+        with open(os.path.join(str(tmp_path), "metrics.json")) as f:
+            metrics = json.load(f)
+        assert metrics["depth_records"] == 0
+        assert metrics["drained_records"] == 25
+
+    def test_failed_chunk_stays_in_the_spool(self, tmp_path):
+        spool = spool_with(tmp_path, jobs(25))
+        calls = []
+
+        def upload(chunk):
+            calls.append(chunk)
+            return 1 if len(calls) == 2 else 0
+        assert SpoolDrainer(spool, upload, chunk_records=10).run() == 1
+        assert spool.depth()[0] == 15
+        uploaded = []
+        SpoolDrainer(spool, lambda chunk: uploaded.extend(chunk) or 0, chunk_records=10).run()
+        assert uploaded == jobs(15, start=10)
+
+
+class TestImporterSpool:
+
+    def test_spooled_upload(self, tmp_path):
+        lines = list(sacct_lines(1000))
+        importer = make_importer()
+        importer.spool = Spool(str(tmp_path / "spool"), sync_records=100)
+        with FakeCoactServer() as server:
+            importer.back_channel = Client(transport=AIOHTTPTransport(url=server.url), execute_timeout=30)
+            assert importer.output(importer.iter_jobs(lines), "upload", 250) == 1000
+            uploaded = [job for request in server.requests for job in request["variables"]["jobs"]]
+        assert uploaded == list(make_importer().iter_jobs(lines))
+        assert importer.spool.depth() == (0, 0)
+
+    def test_failed_run_is_resumed(self, tmp_path):
+        lines = list(sacct_lines(1000))
+        failures = []
+
+        def handler(payload):
+            if not failures:
+                failures.append(payload)
+                raise RuntimeError("boom")
+            return jobs_import_handler(payload)
+
+        importer = make_importer()
+        importer.spool = Spool(str(tmp_path / "spool"))
+        with FakeCoactServer(handler=handler) as server:
+            importer.back_channel = Client(transport=AIOHTTPTransport(url=server.url), execute_timeout=30)
+            importer.output(importer.iter_jobs(lines), "upload", 250)
+            assert importer.failed_batches == 1
+            assert importer.spool.depth()[0] == 1000
+            importer.output(iter([]), "upload", 250)
+            assert importer.failed_batches == 0
+            uploaded = [job["jobId"] for request in server.requests[1:] for job in request["variables"]["jobs"]]
+        assert len(uploaded) == 1000
+        assert importer.spool.depth() == (0, 0)
@@ -0,0 +1,251 @@
+"""
+Unit tests for pipelined jobsImport uploads.
+"""
+
+from gql import Client
+from gql.transport.aiohttp import AIOHTTPTransport
+
+import pytest
+
+import json
+
+from modules.dedup import DedupStore
+from modules.upload import (AdaptiveBatchSize, Bisector, DeadLetterFile, EncodedBatch, PipelinedUploader,
+                            RequestEncoder, add_counts, empty_counts)
+
+from .fake_coact import jobs_import_handler
+
+from .fake_coact import FakeCoactServer
+from .synthetic import sacct_lines
+from .test_slurm_import import make_importer
+
+
+def make_client(server: FakeCoactServer) -> Client:
+    return Client(transport=AIOHTTPTransport(url=server.url), execute_timeout=30)
+
+
+class TestPipelinedUploader:
+    """Test concurrency, backpressure and result aggregation."""
+
+    def test_counts_are_aggregated(self):
+        with FakeCoactServer() as server:
+            with PipelinedUploader(make_client(server), concurrency=3) as uploader:
+                for n in (5, 7, 11):
+                    uploader.submit([{"jobId": str(i)} for i in range(n)])
+            assert uploader.totals["insertedCount"] == 23
+            assert uploader.batches == 3
+            assert uploader.failed_batches == 0
+            assert len(server.requests) == 3
+
+    def test_in_flight_is_bounded(self):
+        with FakeCoactServer(latency=0.1) as server:
+            with PipelinedUploader(make_client(server), concurrency=2) as uploader:
+                for _ in range(6):
+                    uploader.submit([{"jobId": "1"}])
+            assert server.max_in_flight == 2
+            assert uploader.totals["insertedCount"] == 6
+
+    def test_failed_batch_is_counted(self):
+        def handler(payload):
+            raise RuntimeError("boom")
+
+        with FakeCoactServer(handler=handler) as server:
+            with PipelinedUploader(make_client(server), concurrency=2) as uploader:
+                uploader.submit([{"jobId": "1"}, {"jobId": "2"}])
+            assert uploader.failed_batches == 1
+            assert uploader.failed_jobs == 2
+            assert uploader.totals["insertedCount"] == 0
+
+    def test_failing_callback_does_not_upload_again(self, tmp_path):
+        def acknowledge(batch):
+            raise RuntimeError("bookkeeping failed")
+
+        bisector = Bisector(DeadLetterFile(str(tmp_path / "dead.jsonl")))
+        with FakeCoactServer() as server:
+            with PipelinedUploader(make_client(server), concurrency=2, bisector=bisector) as uploader:
+                uploader.submit([{"jobId": "1"}, {"jobId": "2"}], on_success=acknowledge)
+            assert len(server.requests) == 1
+            assert uploader.failed_batches == 0
+            assert uploader.totals["insertedCount"] == 2
+        assert not (tmp_path / "dead.jsonl").exists()
+
+    def test_invalid_concurrency(self):
+        with pytest.raises(ValueError):
+            PipelinedUploader(None, concurrency=0)
+
+
+class TestRequestEncoder:
+    """Compressed, byte-sized upload batches."""
+
+    def jobs(self, n: int = 3000) -> list:
+        return list(make_importer().iter_jobs(sacct_lines(n)))
+
+    def test_compressed_upload(self):
+        jobs = self.jobs()
+        batches = list(RequestEncoder().batches(jobs, max_jobs=1000))
+        assert [len(b) for b in batches] == [1000, 1000, 1000]
+        assert all(b.ratio > 4 for b in batches)
+        with FakeCoactServer() as server:
+            with PipelinedUploader(make_client(server), concurrency=2) as uploader:
+                for batch in batches:
+                    uploader.submit(batch)
+            assert uploader.totals["insertedCount"] == 3000
+            assert server.encodings == ["gzip"] * 3
+            assert sorted(server.body_bytes) == sorted(len(b.body) for b in batches)
+            received = sorted((j for r in server.requests for j in r["variables"]["jobs"]), key=lambda j: j["jobId"])
+            assert received == sorted(jobs, key=lambda j: j["jobId"])
+
+    def test_synchronous_upload(self):
+        importer = make_importer()
+        importer.encoder = RequestEncoder()
+        with FakeCoactServer() as server:
+            importer.back_channel = make_client(server)
+            assert importer.output(importer.iter_jobs(sacct_lines(500)), "upload", 200) == 500
+            assert server.encodings == ["gzip"] * 3
+            assert [len(r["variables"]["jobs"]) for r in server.requests] == [200, 200, 100]
+
+    def test_batches_are_sized_by_bytes(self):
+        jobs = self.jobs(20000)
+        target = 20000
+        batches = list(RequestEncoder().batches(jobs, max_jobs=150000, target_bytes=target))
+        assert sum(len(b) for b in batches) == len(jobs)
+        assert all(abs(len(b.body) - target) < target * 0.2 for b in batches[1:-1])
+        assert [j for b in batches for j in b] == jobs
+
+    def test_uncompressed_sized_batches(self):
+        batches = list(RequestEncoder(compress=False).batches(self.jobs(2000), max_jobs=500, target_bytes=10 ** 9))
+        assert [len(b) for b in batches] == [500] * 4
+        assert all(not b.compressed and len(b.body) == b.raw_bytes for b in batches)
+        assert "Content-Encoding" not in batches[0].extra_args()["headers"]
+
+    def test_encoded_batch_is_a_list(self):
+        batch = RequestEncoder().encode([{"jobId": "1"}])
+        assert isinstance(batch, EncodedBatch) and batch == [{"jobId": "1"}]
+
+
+class TestAdaptiveBatchSize:
+
+    def test_grows_towards_target_latency(self):
+        sizes = AdaptiveBatchSize(10000, target_latency=10, maximum=100000)
+        assert sizes.record(10000, 2.0) == 15000
+        assert sizes.record(15000, 3.0) == 22500
+        # 10k jobs/s * 10s is within reach
+        assert sizes.record(22500, 2.25) == 33750
+
+    def test_shrinks_when_slow_or_failing(self):
+        sizes = AdaptiveBatchSize(100000, target_latency=10)
+        assert sizes.record(100000, 15.0) == 66666
+        assert sizes.record(66666, 100.0) == 33333
+        assert sizes.record(33333, 1.0, failed=True) == 16666
+
+    def test_bounds(self):
+        sizes = AdaptiveBatchSize(2000, target_latency=10, minimum=1000)
+        for _ in range(10):
+            sizes.record(sizes.size, 100.0, failed=True)
+        assert sizes.size == 1000
+        for _ in range(20):
+            sizes.record(sizes.size, 0.01)
+        assert sizes.size == 8000
+
+    def test_batches_follow_size(self):
+        sizes = AdaptiveBatchSize(4, minimum=1)
+        batches = []
+        for batch in sizes.batches(range(20)):
+            batches.append(batch)
+            sizes.size = 3
+        assert [len(b) for b in batches] == [4, 3, 3, 3, 3, 3, 1]
+
+
+def rejecting(bad: set):
+    """A jobsImport handler failing every request holding one of the ``bad`` job ids."""
+    def handler(payload):
+        jobs = payload["variables"]["jobs"]
+        if any(j["jobId"] in bad for j in jobs):
+            raise RuntimeError("invalid job")
+        return jobs_import_handler(payload)
+    return handler
+
+
+class TestBisector:
+
+    def test_isolates_bad_jobs(self, tmp_path):
+        dead = DeadLetterFile(str(tmp_path / "dead"))
+        uploaded = []
+
+        def upload(jobs):
+            if 37 in jobs or 80 in jobs:
+                raise RuntimeError("invalid job")
+            uploaded.extend(jobs)
+
+        assert not Bisector(dead).retry(upload, list(range(100)), RuntimeError("invalid job"))
+        assert sorted(uploaded) == [i for i in range(100) if i not in (37, 80)]
+        lines = [json.loads(l) for l in open(dead.path)]
+        assert sorted(l["job"] for l in lines) == [37, 80]
+        assert lines[0]["error"] == "invalid job"
+
+    def test_failures_are_bounded(self, tmp_path):
+        dead = DeadLetterFile(str(tmp_path / "dead"))
+        calls = []
+
+        def upload(jobs):
+            calls.append(len(jobs))
+            raise RuntimeError("unavailable")
+
+        assert not Bisector(dead, max_failures=8).retry(upload, list(range(100000)), RuntimeError("unavailable"))
+        assert len(calls) < 16
+        assert dead.count == 100000
+
+    def test_encoded_halves(self):
+        batch = RequestEncoder().encode([{"jobId": str(i)} for i in range(5)])
+        halves = Bisector(None).halves(batch)
+        assert all(isinstance(h, EncodedBatch) for h in halves)
+        assert halves[0] + halves[1] == batch
+
+
+class TestRetriedUploads:
+
+    def test_synchronous_upload_isolates_bad_jobs(self, tmp_path):
+        importer = make_importer()
+        importer.bisector = Bisector(DeadLetterFile(str(tmp_path / "dead")))
+        importer.dedup = DedupStore(str(tmp_path / "dedup.sqlite"))
+        jobs = list(importer.iter_jobs(sacct_lines(1000)))
+        bad = {jobs[10]["jobId"], jobs[700]["jobId"]}
+        with FakeCoactServer(handler=rejecting(bad)) as server:
+            importer.back_channel = make_client(server)
+            importer.output(iter(jobs), "upload", 500)
+            assert importer.failed_batches == 2
+            assert importer.bisector.dead_letters.count == 2
+            # everything else was uploaded, and only the bad jobs are sent again
+            assert importer.dedup.count() == 998
+            assert importer.output(iter(jobs), "upload", 500) == 2
+
+    def test_pipelined_upload_isolates_bad_jobs(self, tmp_path):
+        importer = make_importer()
+        importer.concurrency = 2
+        importer.bisector = Bisector(DeadLetterFile(str(tmp_path / "dead")))
+        importer.encoder = RequestEncoder()
+        jobs = list(importer.iter_jobs(sacct_lines(1000)))
+        with FakeCoactServer(handler=rejecting({jobs[123]["jobId"]})) as server:
+            importer.back_channel = make_client(server)
+            importer.output(iter(jobs), "upload", 250)
+            received = [j for r in server.requests for j in r["variables"]["jobs"]]
+        assert importer.failed_batches == 1
+        assert [json.loads(l)["job"] for l in open(tmp_path / "dead")] == [jobs[123]]
+        inserted = {j["jobId"] for j in received} - {jobs[123]["jobId"]}
+        assert inserted == {j["jobId"] for j in jobs} - {jobs[123]["jobId"]}
+
+    def test_adaptive_batches(self, tmp_path):
+        importer = make_importer()
+        importer.sizes = AdaptiveBatchSize(100, target_latency=1, minimum=10)
+        with FakeCoactServer(latency=0.2) as server:
+            importer.back_channel = make_client(server)
+            assert importer.output(importer.iter_jobs(sacct_lines(3000)), "upload", 100) == 3000
+            sizes = [len(r["variables"]["jobs"]) for r in server.requests]
+        assert sizes[:3] == [100, 150, 225]
+        assert sum(sizes) == 3000
+
+
+def test_add_counts():
+    totals = add_counts(empty_counts(), {"insertedCount": 1, "upsertedCount": 2, "modifiedCount": 3, "deletedCount": None})
+    add_counts(totals, {"insertedCount": 1, "upsertedCount": 0, "modifiedCount": 0, "deletedCount": 4})
+    assert totals == {"insertedCount": 2, "upsertedCount": 2, "modifiedCount": 3, "deletedCount": 4}
@@ -0,0 +1,116 @@
+"""
+Unit tests for the cumulative multi-window usage store.
+"""
+
+import random
+
+import pytest
+
+from modules.usage_windows import MINUTE, UsageWindows
+
+# a minute well into an hour, so that the hour ring has to interpolate
+NOW = 1_000_000 * MINUTE + 17 * MINUTE + 5
+
+
+def expected(jobs: list, head: int, minutes: int) -> float:
+    """Brute-force sum of the hours of ``jobs`` within the ``minutes`` minutes up to and including ``head``."""
+    lo, hi = (head - minutes + 1) * MINUTE, (head + 1) * MINUTE
+    total = 0.0
+    for start, end, hours in jobs:
+        overlap = min(end, hi) - max(start, lo)
+        if overlap > 0:
+            total += hours * overlap / (end - start)
+    return total
+
+
+def replay(usage: UsageWindows, minutes: int, seed: int = 1) -> list:
+    """Add random jobs as they finish over ``minutes`` minutes up to ``NOW``, folding now and then."""
+    rng = random.Random(seed)
+    jobs = []
+    for step in range(0, minutes + 1, 37):
+        now = NOW - (minutes - step) * MINUTE
+        usage.advance(now)
+        for _ in range(5):
+            end = now - rng.randint(0, 100 * MINUTE)
+            start = end - rng.randint(1, 300 * MINUTE)
+            jobs.append((start, end, rng.uniform(0, 10)))
+            usage.add("LCLS", "Ada", *jobs[-1])
+        if step % 111 == 0:
+            usage.fold()
+    usage.advance(NOW)
+    return jobs
+
+
+class TestUsageWindows:
+
+    def test_windows_match_a_brute_force_sum(self):
+        usage = UsageWindows(minutes=240)
+        jobs = replay(usage, 1000)
+        for minutes in (1, 5, 60, 239, 240):
+            assert usage.window("lcls", "ada", minutes) == pytest.approx(expected(jobs, NOW // MINUTE, minutes))
+
+    def test_longer_windows_come_from_the_hour_ring(self):
+        usage = UsageWindows(minutes=240, hours=48)
+        jobs = replay(usage, 3000)
+        assert usage.span == 47 * 60
+        for minutes in (60, 240):
+            assert usage.window("lcls", "ada", minutes) == pytest.approx(expected(jobs, NOW // MINUTE, minutes))
+        # interpolated within an hour, whose usage is about 40 hours
+        for minutes in (241, 1000, usage.span):
+            assert usage.window("lcls", "ada", minutes) == pytest.approx(expected(jobs, NOW // MINUTE, minutes), abs=20)
+        with pytest.raises(ValueError):
+            usage.window("lcls", "ada", usage.span + 1)
+
+    def test_advance_drops_the_oldest_minutes(self):
+        usage = UsageWindows(minutes=60)
+        usage.advance(NOW)
+        jobs = [(NOW - 50 * MINUTE, NOW - 10 * MINUTE, 40.0), (NOW - 5 * MINUTE, NOW, 5.0)]
+        for job in jobs:
+            usage.add("lcls", "ada", *job)
+        assert usage.window("lcls", "ada", 60) == pytest.approx(45.0)
+        usage.advance(NOW + 20 * MINUTE)
+        assert usage.window("lcls", "ada", 60) == pytest.approx(expected(jobs, NOW // MINUTE + 20, 60))
+        usage.advance(NOW + 120 * MINUTE)
+        assert usage.window("lcls", "ada", 60) == 0.0
+
+    def test_jobs_outside_the_span_are_clipped(self):
+        usage = UsageWindows(minutes=10)
+        usage.advance(NOW)
+        head = NOW // MINUTE * MINUTE
+        usage.add("lcls", "ada", head - 20 * MINUTE, head + MINUTE, 21.0)
+        assert usage.window("lcls", "ada", 10) == pytest.approx(10.0)
+        assert usage.window("rubin", "ada", 10) == 0.0
+
+    def test_percent_of_capacity(self):
+        usage = UsageWindows(minutes=60)
+        usage.advance(NOW)
+        head = NOW // MINUTE * MINUTE
+        usage.add("lcls", "ada", head - 59 * MINUTE, head + MINUTE, 120.0)
+        assert usage.percent("lcls", "ada", 60, 240) == pytest.approx(50.0)
+        assert usage.percent("lcls", "ada", 60, 0) == 0.0
+
+    def test_exhaustion(self):
+        usage = UsageWindows(minutes=120)
+        usage.advance(NOW)
+        head = NOW // MINUTE * MINUTE
+        # 60 hours an hour over the last hour, nothing the hour before
+        usage.add("lcls", "ada", head - 59 * MINUTE, head + MINUTE, 60.0)
+        # a budget of 200 hours over two hours, 60 used, growing by 1 - 0.5 hours a minute
+        assert usage.exhaustion("lcls", "ada", 120, capacity=100) == pytest.approx(280.0)
+        assert usage.exhaustion("lcls", "ada", 120, capacity=20) == 0.0
+        assert usage.exhaustion("lcls", "ada", 120, capacity=100, rate_minutes=120) is None
+        assert usage.exhaustion("lcls", "ada", 120, capacity=0) is None
+
+    def test_saved_and_loaded(self, tmp_path):
+        usage = UsageWindows(minutes=240, hours=48)
+        replay(usage, 3000)
+        path = str(tmp_path / "usage")
+        usage.save(path)
+        loaded = UsageWindows.load(path)
+        assert (loaded.minutes, loaded.hours, loaded.head, loaded.keys()) == (240, 48, usage.head, usage.keys())
+        for minutes in (1, 240, 1000, usage.span):
+            assert loaded.window("lcls", "ada", minutes) == usage.window("lcls", "ada", minutes)
+        head = (NOW // MINUTE + 5) * MINUTE
+        loaded.advance(head)
+        loaded.add("lcls", "ada", head - 4 * MINUTE, head + MINUTE, 1.0)
+        assert loaded.window("lcls", "ada", 5) == pytest.approx(1.0)